@@ -0,0 +1,167 @@
+from sqlalchemy import select, or_, case
+from sqlalchemy.orm import Session, joinedload
+from models import Player, WhatsAppUser, Club, Tournament
+from match_engine import registrar_resultado, ErrorResultado
+from enrollments import inscribir, jugadores_sembrados
+from brackets import planificar_eliminacion, planificar_grupos, crear_partidos
+from scheduler import Sede, reprogramar, columnas_sede
+from database import empezar_escritura
+import events
+
+# --- LAS MANOS DE ALEJANDRO ---
+# Todo lo que toca la BD al procesar un mensaje vive aquí. Son funciones
+# síncronas: el worker de la cola las ejecuta en un hilo para no bloquear
+# el event loop de FastAPI. Después de cada commit se publica el evento
+# correspondiente en el bus (events.py) para que los cachés se enteren.
+
+# 1. ¿De qué club es este teléfono?
+# Una sola consulta: el club que administra, si no el de su primer jugador
+def identificar_club(db: Session, telefono):
+    club_de_sus_jugadores = (select(Player.club_id)
+                             .join(WhatsAppUser, Player.owner_id == WhatsAppUser.id)
+                             .where(WhatsAppUser.phone_number == telefono)
+                             .order_by(Player.id).limit(1).scalar_subquery())
+    club_usuario = (db.query(Club)
+                    .filter(or_(Club.admin_phone == telefono, Club.id == club_de_sus_jugadores))
+                    .order_by(case((Club.admin_phone == telefono, 0), else_=1)).first())
+    if not club_usuario:
+        club_usuario = db.query(Club).filter(Club.id == 1).first()
+    return club_usuario
+
+# 2. Ejecutar la decisión de la IA
+# Devuelve (respuesta_texto, hubo_cambios, avisos). Si hubo cambios, quien
+# llama avisa a las TVs del club; avisos es una lista de (telefono, mensaje)
+# para la cola de envíos masivos.
+def ejecutar_accion(db: Session, club_id: int, telefono, decision):
+    respuesta_texto = decision.get('respuesta_whatsapp', "Procesado.")
+    accion = decision.get('accion')
+    datos = decision.get('datos', {}) or {}
+    hubo_cambios = False
+    avisos = []
+
+    if accion == 'crear_jugador':
+        nombre = datos.get('nombre')
+        categoria = datos.get('categoria', 'General')
+        existe = db.query(Player).filter(Player.name == nombre, Player.club_id == club_id).first()
+        if not existe:
+            padrino = db.query(WhatsAppUser).filter_by(phone_number=telefono).first()
+            if not padrino:
+                padrino = WhatsAppUser(phone_number=telefono)
+                db.add(padrino); db.commit()
+            nuevo = Player(name=nombre, category=categoria, owner_id=padrino.id, club_id=club_id)
+            db.add(nuevo); db.flush()
+            # Armar el evento antes del commit (después, leer nuevo.* es otro SELECT)
+            evento = dict(player_id=nuevo.id, nombre=nuevo.name, elo=nuevo.elo, categoria=nuevo.category)
+            db.commit()
+            hubo_cambios = True
+            events.publicar(club_id, events.JUGADOR_CREADO, telefono=telefono, **evento)
+
+    elif accion == 'crear_torneo':
+        anteriores = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status != "finished").all()
+        for t in anteriores: t.status = "finished"
+
+        categoria = datos.get('categoria', 'General')
+        nuevo_torneo = Tournament(
+            name=datos.get('nombre'),
+            category=categoria,
+            club_id=club_id,
+            status="inscription",
+            smart_data={}
+        )
+        db.add(nuevo_torneo); db.commit()
+        hubo_cambios = True
+        events.publicar(club_id, events.TORNEO_CREADO, torneo_id=nuevo_torneo.id, nombre=nuevo_torneo.name,
+                        categoria=nuevo_torneo.category, status=nuevo_torneo.status)
+
+    elif accion == 'inscribir_en_torneo':
+        # Lecturas e INSERT en la misma transacción de escritura (ver con_reintentos)
+        empezar_escritura(db)
+        nombre_jugador = datos.get('nombre_jugador') or datos.get('nombre')
+        jugador = db.query(Player).filter(Player.name == nombre_jugador, Player.club_id == club_id).first()
+        torneo = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status == "inscription").first()
+
+        if jugador and torneo:
+            evento = dict(torneo_id=torneo.id, player_id=jugador.id, nombre=jugador.name,
+                          elo=jugador.elo, categoria=jugador.category)
+            nombre_torneo = torneo.name
+            # Un INSERT idempotente: dos inscripciones a la vez no se pisan
+            if inscribir(db, evento["torneo_id"], evento["player_id"]):
+                hubo_cambios = True
+                events.publicar(club_id, events.INSCRIPCION, **evento)
+                respuesta_texto = f"✅ {nombre_jugador} inscrito en {nombre_torneo}."
+            else:
+                respuesta_texto = f"⚠️ {nombre_jugador} ya estaba inscrito."
+        else:
+            respuesta_texto = "❌ No se pudo inscribir."
+
+    elif accion == 'generar_cuadros':
+        torneo = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status == "inscription").first()
+        if torneo:
+            jugadores = jugadores_sembrados(db, torneo, joinedload(Player.owner))
+            if len(jugadores) >= 2:
+                torneo_id, nombre_torneo = torneo.id, torneo.name
+                ids = [j.id for j in jugadores]
+                # Cuadro completo en memoria (brackets.py) y guardado en un INSERT + un UPDATE
+                if datos.get('formato') == 'grupos':
+                    plan = planificar_grupos(ids)
+                else:
+                    plan = planificar_eliminacion(ids, consolacion=datos.get('consolacion', True) is not False)
+                creados = crear_partidos(db, torneo_id, plan)
+                torneo.status = "playing"
+                reprogramar(db, club_id)   # cancha y hora de cada partido (scheduler.py)
+                # Avisos y nombres antes del commit (después, leer jugadores.* es otro SELECT por jugador).
+                # Solo se avisa a quien ya tiene rival: con bye, el rival sale de otro partido.
+                por_id = {j.id: j for j in jugadores}
+                for _, p1, p2, *_ in creados:
+                    if p1 and p2:
+                        avisos += avisos_de_partido(por_id[p1], por_id[p2], nombre_torneo)
+                nombres = {j.id: j.name for j in jugadores}
+                db.commit()
+                hubo_cambios = True
+                events.publicar(club_id, events.CUADROS_GENERADOS, torneo_id=torneo_id, partidos=creados,
+                                nombres=nombres)
+                events.publicar(club_id, events.TORNEO_ESTADO, torneo_id=torneo_id, status="playing")
+                respuesta_texto = f"⚔️ ¡Cuadros generados! El torneo {nombre_torneo} ha comenzado."
+            else:
+                respuesta_texto = "⚠️ Necesitas al menos 2 jugadores."
+        else:
+            respuesta_texto = "❌ No hay torneo en inscripción."
+
+    elif accion == 'configurar_sede':
+        # Canchas, horario, duración y descanso del club: se reprograma lo pendiente
+        try:
+            columnas = columnas_sede(datos)
+        except ValueError:
+            columnas = None
+        club = db.query(Club).filter(Club.id == club_id).first()
+        if club and columnas:
+            for columna, valor in columnas.items():
+                setattr(club, columna, valor)
+            reprogramar(db, club_id)
+            respuesta_texto = f"🏟️ Sede actualizada: {Sede.del_club(club).texto()}. Programación recalculada."
+            db.commit()
+        else:
+            respuesta_texto = "❌ No entendí la configuración (ej: 4 canchas, de 07:00 a 22:00, partidos de 45 min)."
+
+    elif accion == 'registrar_partido':
+        try:
+            r = registrar_resultado(db, club_id, datos.get('ganador'), datos.get('perdedor'), datos.get('score', ''))
+            if r["estado"] == "registrado":
+                hubo_cambios = True
+                respuesta_texto = (f"📝 {r['ganador']} le ganó a {r['perdedor']}. "
+                                   f"+{r['puntos']} pts ({r['elo_ganador']}) / -{r['puntos']} pts ({r['elo_perdedor']}).")
+            else:
+                respuesta_texto = "👌 Ese resultado ya estaba registrado."
+        except ErrorResultado as e:
+            respuesta_texto = f"❌ {e}"
+
+    return respuesta_texto, hubo_cambios, avisos
+
+# 3. Mensajes para los dueños de cada jugador de un partido
+def avisos_de_partido(p1, p2, nombre_torneo):
+    avisos = []
+    for jugador, rival in ((p1, p2), (p2, p1)):
+        if jugador.owner and jugador.owner.phone_number:
+            avisos.append((jugador.owner.phone_number,
+                           f"⚔️ {nombre_torneo}: {jugador.name} juega contra {rival.name}."))
+    return avisos
@@ -1,47 +1,67 @@
 import os
 import json
-from openai import OpenAI
+import time
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
-from models import Player, Tournament
+from club_context import contextos, parte_del_club
 from prompts import obtener_system_prompt
+from intent_classifier import clasificar_con_stats, stats as stats_fast_path
+from decision_cache import cache as cache_decisiones, es_personal
+import http_transport
+from observability import tramo, registrar_uso_openai
 
 # Cargar configuración
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+# OPENAI_BASE_URL permite usar fake_servers.py sin internet
+# Los reintentos los maneja http_transport (max_retries=0 en el SDK)
+client = AsyncOpenAI(
+    api_key=api_key,
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    http_client=http_transport.cliente("openai"),
+    max_retries=0,
+)
 
 # 1. Función para leer la mente del club (Contexto)
-def generar_contexto_club(db: Session, club_id: int):
-    # Buscar torneo activo
-    torneo = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status != "finished").first()
-    info_torneo = "No hay torneos activos."
-    
-    if torneo:
-        datos = torneo.smart_data if torneo.smart_data else {}
-        inscritos = len(datos.get("inscritos", []))
-        cat = torneo.category if hasattr(torneo, 'category') else "General"
-        info_torneo = f"TORNEO ACTIVO: '{torneo.name}' ({cat}). Estado: {torneo.status}. Inscritos: {inscritos}."
-    
-    # Top 3 Ranking
-    top = db.query(Player).filter(Player.club_id == club_id).order_by(Player.elo.desc()).limit(3).all()
-    ranking_txt = ", ".join([f"{p.name} ({p.elo})" for p in top])
-    
-    return f"CLUB ID {club_id}:\n- {info_torneo}\n- Top 3: {ranking_txt}"
+# Sale de la foto en memoria del club (club_context); no consulta la BD
+# salvo la primera vez. Con telefono, agrega los jugadores de ese celular.
+def generar_contexto_club(db: Session, club_id: int, telefono=None):
+    return contextos.texto(db, club_id, telefono)
 
 # 2. Función para preguntar a la IA
-def consultar_alejandro(texto_usuario, contexto, telefono_usuario):
+async def consultar_alejandro(texto_usuario, contexto, rol_usuario):
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-1106", # Modelo rápido
-            messages=[
-                {"role": "system", "content": obtener_system_prompt(contexto, telefono_usuario)},
-                {"role": "user", "content": texto_usuario}
-            ],
-            response_format={ "type": "json_object" }
-        )
+        with tramo("llm"):
+            response = await http_transport.con_reintentos("openai", lambda: client.chat.completions.create(
+                model="gpt-3.5-turbo-1106", # Modelo rápido
+                messages=[
+                    {"role": "system", "content": obtener_system_prompt(contexto, rol_usuario)},
+                    {"role": "user", "content": texto_usuario}
+                ],
+                response_format={ "type": "json_object" }
+            ))
+        registrar_uso_openai(response.usage)   # tokens y costo para /metrics
         return json.loads(response.choices[0].message.content)
     except Exception as e:
+        registrar_uso_openai(None, error=True)
         print(f"❌ Error en IA: {e}")
-        # Respuesta de emergencia si la IA falla
-        return {"accion": "chat", "respuesta_whatsapp": "Estoy procesando mucha info, intenta de nuevo."}
\ No newline at end of file
+        # Respuesta de emergencia si la IA falla (no se cachea)
+        return {"accion": "chat", "respuesta_whatsapp": "Estoy procesando mucha info, intenta de nuevo.", "error_ia": True}
+
+# 3. Decidir: primero la vía rápida (reglas), luego el caché, y si no, la IA
+async def decidir(texto_usuario, contexto, rol_usuario, inscripcion_abierta=False, club_id=None):
+    decision = clasificar_con_stats(texto_usuario, rol_usuario, inscripcion_abierta)
+    if decision is not None:
+        return decision
+
+    async def llamar_ia():
+        t0 = time.perf_counter()
+        resultado = await consultar_alejandro(texto_usuario, contexto, rol_usuario)
+        stats_fast_path.registrar_llm(time.perf_counter() - t0)
+        return resultado
+
+    # Solo la parte del club entra a la clave, salvo que el mensaje hable de quien escribe
+    contexto_clave = contexto if es_personal(texto_usuario) else parte_del_club(contexto or "")
+    clave = await cache_decisiones.clave(texto_usuario, contexto_clave, rol_usuario, club_id)
+    return await cache_decisiones.obtener_o_calcular(clave, llamar_ia, cacheable=lambda d: not d.get("error_ia"))
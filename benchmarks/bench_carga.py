@@ -0,0 +1,433 @@
+"""
+Prueba de carga sin internet: tráfico de WhatsApp simulado contra POST /webhook con miles de TVs conectadas.
+
+    python benchmarks/bench_carga.py --clubes 20 --rps 200 --segundos 20 --tvs 2000
+    python benchmarks/bench_carga.py --comparar benchmarks/resultados/bench_carga-20260301-101500.json
+
+1. Siembra una SQLite temporal: --clubes clubes con --jugadores jugadores,
+   cada uno con su celular (así identificar_club los reparte entre clubes).
+2. Levanta main:app en otro proceso (uvicorn) con consultar_alejandro y
+   enviar_whatsapp cambiados por falsos locales que tardan lo que se les
+   diga (--ia-ms y --envio-ms, con cola lognormal). Ese proceso también
+   cuenta las sentencias de la BD y mide el lag del event loop.
+3. Abre --tvs WebSockets /ws/{club_id} repartidos entre los clubes y los
+   mantiene abiertos durante toda la prueba.
+4. Manda payloads de Meta a --rps durante --segundos, a ritmo fijo (lazo
+   abierto: si el servidor se atrasa, la latencia se mide desde la hora en
+   que TOCABA mandar, sin esconder la espera). Mezcla resultados (vía
+   rápida + escritura + deltas a las TVs), saludos y preguntas para la IA.
+5. Espera a que la cola se vacíe y reporta: latencia del 200 del webhook y
+   de punta a punta (hasta la respuesta por WhatsApp) en p50/p95/p99,
+   throughput, sentencias por mensaje, lag del event loop y deltas
+   entregados a las TVs.
+Guarda todo en JSON (--salida) y lo compara con la corrida anterior del
+mismo escenario (o con --comparar). Sale con código 1 si hubo errores o,
+con --fallar-si-empeora, si alguna métrica empeoró más que --tolerancia.
+"""
+import os
+import re
+import sys
+import json
+import time
+import math
+import glob
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import utils  # agrega la raíz del repo al sys.path
+from utils import percentil
+
+
+SENTENCIA = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+PREGUNTAS = ["¿cómo va el torneo?", "¿a qué hora juego?", "¿quién va primero?", "cuéntame las reglas",
+             "¿cuántos partidos llevo?", "¿hay torneo este mes?"]
+# Métrica -> True si más alto es mejor (para comparar corridas)
+COMPARABLES = {"webhook_ms.p50": False, "webhook_ms.p99": False, "punta_a_punta_ms.p50": False,
+               "punta_a_punta_ms.p99": False, "throughput_msg_s": True, "sentencias_por_mensaje": False,
+               "lag_loop_ms.p99": False}
+
+
+# --- 1. EL SERVIDOR (SUBPROCESO) ---
+def _lognormal(azar, mediana_ms):
+    # Mediana = mediana_ms, p99 ~ 3x: como una API externa real
+    return azar.lognormvariate(math.log(max(mediana_ms, 0.01)), 0.47) / 1000 if mediana_ms else 0
+
+def servidor(puerto, ia_ms, envio_ms):
+    import uvicorn
+    import main
+    import ai_service
+    import whatsapp_service
+    from sqlalchemy import event
+    from database import engine, engine_lectura
+    azar = random.Random(7)
+    medidas = {"sentencias": 0, "lag": [], "punta_a_punta": [], "ia": 0, "envios": 0}
+
+    # 1. Falsos con latencia: la IA contesta chat, WhatsApp solo "envía"
+    async def consultar_alejandro_falso(texto_usuario, contexto, rol_usuario):
+        await asyncio.sleep(_lognormal(azar, ia_ms))
+        medidas["ia"] += 1
+        return {"accion": "chat", "datos": {}, "respuesta_whatsapp": f"Te cuento: {texto_usuario}"}
+
+    async def enviar_whatsapp_falso(telefono_destino, mensaje):
+        await asyncio.sleep(_lognormal(azar, envio_ms))
+        medidas["envios"] += 1
+        return True
+
+    ai_service.consultar_alejandro = consultar_alejandro_falso
+    whatsapp_service.enviar_whatsapp = main.enviar_whatsapp = enviar_whatsapp_falso
+
+    # 2. Punta a punta: el id del mensaje trae la hora en que el cliente lo mandó
+    manejador = main.cola.manejador
+    async def medido(mensaje):
+        await manejador(mensaje)
+        partes = mensaje["id"].split(".")
+        if len(partes) == 4 and partes[1] == "carga":
+            medidas["punta_a_punta"].append(time.time() - float(partes[3]) / 1e6)
+    main.cola.manejador = medido
+
+    # 3. Sentencias de la BD (escritura y lectura)
+    def contar(conn, cursor, statement, *args):
+        if SENTENCIA.match(statement):
+            medidas["sentencias"] += 1
+    for motor in {engine, engine_lectura}:
+        event.listen(motor, "before_cursor_execute", contar)
+
+    # 4. Lag del event loop: cuánto se atrasa un sleep de 10 ms
+    async def vigilar_loop():
+        while True:
+            t = time.perf_counter()
+            await asyncio.sleep(0.01)
+            medidas["lag"].append(time.perf_counter() - t - 0.01)
+
+    @main.app.on_event("startup")
+    async def arrancar_vigilante():
+        asyncio.create_task(vigilar_loop())
+
+    base_ws = dict(main.manager.contadores)
+
+    @main.app.post("/bench/reiniciar")
+    async def reiniciar():
+        medidas.update(sentencias=0, lag=[], punta_a_punta=[], ia=0, envios=0)
+        base_ws.update(main.manager.contadores)
+        return {"ok": True}
+
+    @main.app.get("/bench/medidas")
+    async def ver_medidas():
+        # Contadores de WebSockets desde el último reinicio (sin el calentamiento)
+        websockets = {k: v - base_ws.get(k, 0) for k, v in main.manager.contadores.items()}
+        return {**medidas, "cola": main.cola.metricas(), "websockets": websockets}
+
+    uvicorn.run(main.app, host="127.0.0.1", port=puerto, log_level="warning", backlog=4096)
+
+
+# --- 2. SEMBRAR ---
+def telefono(club, i):
+    return f"57{club:04d}{i:06d}"
+
+def sembrar(clubes, jugadores):
+    from sqlalchemy import insert
+    from database import engine, SessionLocal
+    from models import Club, Player, WhatsAppUser
+    from migrations import aplicar_migraciones
+    aplicar_migraciones(engine)
+    db = SessionLocal()
+    db.execute(insert(Club), [{"id": c, "name": f"Club {c}", "admin_phone": telefono(c, 999999)}
+                              for c in range(1, clubes + 1)])
+    duenos = db.execute(insert(WhatsAppUser).returning(WhatsAppUser.id, WhatsAppUser.phone_number),
+                        [{"phone_number": telefono(c, i)} for c in range(1, clubes + 1) for i in range(jugadores)])
+    id_de = {fila.phone_number: fila.id for fila in duenos}
+    db.execute(insert(Player), [{"name": nombre(c, i), "club_id": c, "elo": 1200, "category": "General",
+                                 "wins": 0, "losses": 0, "owner_id": id_de[telefono(c, i)]}
+                                for c in range(1, clubes + 1) for i in range(jugadores)])
+    db.commit(); db.close()
+
+def nombre(club, i):
+    # Sin dígitos: la vía rápida no acepta números en los nombres ("Ab Cd" = jugador ab del club cd)
+    return f"{_letras(i)} {_letras(club)}"
+
+def _letras(i):
+    letras = ""
+    i += 1
+    while i:
+        i, resto = divmod(i - 1, 26)
+        letras = chr(97 + resto) + letras
+    return letras.capitalize()
+
+
+# --- 3. EL CLIENTE ---
+def payload(mensaje_id, tel, texto):
+    return {"object": "whatsapp_business_account", "entry": [{"id": "carga", "changes": [{"field": "messages", "value": {
+        "messaging_product": "whatsapp", "metadata": {"phone_number_id": "123"},
+        "messages": [{"from": tel, "id": mensaje_id, "timestamp": str(int(time.time())), "type": "text",
+                      "text": {"body": texto}}]}}]}]}
+
+def mensaje_al_azar(azar, n, clubes, jugadores, mezcla):
+    club = azar.randint(1, clubes)
+    a, b = azar.sample(range(jugadores), 2)
+    tipo = azar.choices(list(mezcla), weights=list(mezcla.values()))[0]
+    if tipo == "resultado":
+        texto = f"{nombre(club, a)} le ganó a {nombre(club, b)} 3-1"
+    elif tipo == "saludo":
+        texto = "hola"
+    else:
+        texto = azar.choice(PREGUNTAS)
+    # wamid.carga.<n>.<microsegundos>: el servidor calcula la latencia de punta a punta
+    return f"wamid.carga.{n}.{int(time.time() * 1e6)}", telefono(club, a), texto
+
+async def conectar_tvs(base, tvs, clubes, recibidos):
+    from websockets.asyncio.client import connect
+
+    async def tv(club_id):
+        ws = await connect(f"{base.replace('http://', 'ws://')}/ws/{club_id}", ping_interval=None,
+                           open_timeout=60)
+        async def oir():
+            try:
+                async for texto in ws:
+                    if '"ping"' in texto:
+                        await ws.send("pong")
+                    recibidos["deltas"] += 1
+            except Exception:
+                pass
+            recibidos["cerradas"] += 1
+        return ws, asyncio.create_task(oir())
+
+    conexiones = []
+    for i in range(0, tvs, 250):   # por tandas: que el backlog de accept no se desborde
+        conexiones += await asyncio.gather(*(tv(n % clubes + 1) for n in range(i, min(tvs, i + 250))))
+    return conexiones
+
+async def cargar(base, args, mezcla):
+    import httpx
+    azar = random.Random(args.semilla)
+    webhook, estados = [], {}
+    limites = httpx.Limits(max_connections=args.conexiones, max_keepalive_connections=args.conexiones)
+    async with httpx.AsyncClient(timeout=60, limits=limites) as http:
+        async def uno(n, toca):
+            mensaje_id, tel, texto = mensaje_al_azar(azar, n, args.clubes, args.jugadores, mezcla)
+            try:
+                r = await http.post(f"{base}/webhook", json=payload(mensaje_id, tel, texto))
+                estados[r.status_code] = estados.get(r.status_code, 0) + 1
+            except httpx.HTTPError as e:
+                estados[type(e).__name__] = estados.get(type(e).__name__, 0) + 1
+            webhook.append(time.perf_counter() - toca)
+
+        # Lazo abierto: el mensaje n sale a t0 + n/rps, responda o no el servidor
+        total = int(args.rps * args.segundos)
+        t0 = time.perf_counter()
+        tareas = []
+        for n in range(total):
+            toca = t0 + n / args.rps
+            espera = toca - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            tareas.append(asyncio.create_task(uno(n, toca)))
+        await asyncio.gather(*tareas)
+        envio = time.perf_counter() - t0
+
+        # Esperar a que los workers terminen lo encolado
+        limite = time.time() + args.espera_max
+        while time.time() < limite:
+            cola = (await http.get(f"{base}/bench/medidas")).json()["cola"]
+            if cola["profundidad_total"] == 0 and cola["procesados"] + cola["errores"] >= cola["encolados"]:
+                break
+            await asyncio.sleep(0.1)
+        total_s = time.perf_counter() - t0
+        medidas = (await http.get(f"{base}/bench/medidas")).json()
+    return webhook, estados, envio, total_s, medidas
+
+
+# --- 4. RESULTADOS ---
+def resumen_ms(valores):
+    return {"p50": round(percentil(valores, 50) * 1000, 2), "p95": round(percentil(valores, 95) * 1000, 2),
+            "p99": round(percentil(valores, 99) * 1000, 2), "max": round(max(valores, default=0) * 1000, 2)}
+
+def _valor(resultado, ruta):
+    for parte in ruta.split("."):
+        resultado = (resultado or {}).get(parte)
+    return resultado
+
+def comparar(actual, anterior, tolerancia):
+    """Devuelve [(metrica, antes, ahora, empeoro)] de las métricas en COMPARABLES."""
+    filas = []
+    for metrica, mas_es_mejor in COMPARABLES.items():
+        antes, ahora = _valor(anterior["resultados"], metrica), _valor(actual["resultados"], metrica)
+        if antes is None or ahora is None:
+            continue
+        if mas_es_mejor:
+            empeoro = ahora < antes * (1 - tolerancia)
+        else:
+            # Holgura absoluta chica: 0.3 ms -> 0.5 ms no es una regresión
+            empeoro = ahora > antes * (1 + tolerancia) + 1
+        filas.append((metrica, antes, ahora, empeoro))
+    return filas
+
+def corrida_anterior(escenario, salida):
+    archivos = sorted(glob.glob(os.path.join(salida, "bench_carga-*.json")))
+    for ruta in reversed(archivos):
+        with open(ruta) as f:
+            datos = json.load(f)
+        if datos.get("escenario") == escenario:
+            return ruta, datos
+    return None, None
+
+def version_del_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=utils.RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clubes", type=int, default=20)
+    parser.add_argument("--jugadores", type=int, default=40, help="por club")
+    parser.add_argument("--rps", type=float, default=100, help="mensajes por segundo al webhook")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--tvs", type=int, default=1000, help="WebSockets abiertos durante la prueba")
+    parser.add_argument("--ia-ms", type=float, default=300, help="mediana de la IA falsa")
+    parser.add_argument("--envio-ms", type=float, default=80, help="mediana del envío falso de WhatsApp")
+    parser.add_argument("--mezcla", default="resultado=0.3,saludo=0.2,pregunta=0.5")
+    parser.add_argument("--conexiones", type=int, default=64, help="conexiones HTTP del cliente")
+    parser.add_argument("--calentamiento", type=float, default=2, help="segundos a --rps antes de medir")
+    parser.add_argument("--espera-max", type=float, default=120, help="segundos esperando que se vacíe la cola")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--salida", default=RESULTADOS, help="carpeta de los JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior (si no, la última igual)")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    parser.add_argument("--fallar-si-empeora", action="store_true")
+    parser.add_argument("--verboso", action="store_true", help="muestra los logs del servidor")
+    parser.add_argument("--servidor", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.servidor:
+        return servidor(args.servidor, args.ia_ms, args.envio_ms)
+    mezcla = {k: float(v) for k, v in (parte.split("=") for parte in args.mezcla.split(","))}
+
+    import httpx
+    carpeta = tempfile.mkdtemp()
+    entorno = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(carpeta, 'carga.db')}",
+                   OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "fake"), WS_PING_INTERVALO="0",
+                   JINJA_CACHE_DIR=os.path.join(carpeta, "jinja"), PYTHONUNBUFFERED="1")
+    os.environ["DATABASE_URL"] = entorno["DATABASE_URL"]
+    sembrar(args.clubes, args.jugadores)
+
+    puerto = utils.puerto_libre()
+    salida_servidor = None if args.verboso else subprocess.DEVNULL
+    proceso = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--servidor", str(puerto),
+                                "--ia-ms", str(args.ia_ms), "--envio-ms", str(args.envio_ms)],
+                               cwd=utils.RAIZ, env=entorno, stdout=salida_servidor)
+    base = f"http://127.0.0.1:{puerto}"
+    recibidos = {"deltas": 0, "cerradas": 0}
+    try:
+        limite = time.time() + 30
+        while True:
+            try:
+                httpx.get(f"{base}/bench/medidas").raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.time() > limite:
+                    raise
+                time.sleep(0.1)
+
+        async def correr():
+            t = time.perf_counter()
+            conexiones = await conectar_tvs(base, args.tvs, args.clubes, recibidos)
+            conectar_s = time.perf_counter() - t
+            if args.calentamiento:
+                calentar = argparse.Namespace(**{**vars(args), "segundos": args.calentamiento, "semilla": -args.semilla})
+                await cargar(base, calentar, mezcla)
+            async with httpx.AsyncClient() as http:
+                await http.post(f"{base}/bench/reiniciar")
+            recibidos["deltas"] = 0
+            medido = await cargar(base, args, mezcla)
+            await asyncio.sleep(0.5)   # los últimos deltas en camino
+            vivas = sum(1 for ws, _ in conexiones if ws.state.name == "OPEN")
+            for ws, oyente in conexiones:
+                oyente.cancel()
+                await ws.close()
+            return conectar_s, vivas, medido
+
+        conectar_s, vivas, (webhook, estados, envio_s, total_s, medidas) = asyncio.run(correr())
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+    # Resumen
+    cola = medidas["cola"]
+    procesados = len(medidas["punta_a_punta"])   # solo los de la prueba (sin el calentamiento)
+    resultados = {
+        "mensajes": len(webhook), "estados_http": {str(k): v for k, v in estados.items()},
+        "webhook_ms": resumen_ms(webhook), "punta_a_punta_ms": resumen_ms(medidas["punta_a_punta"]),
+        "throughput_msg_s": round(procesados / total_s, 1), "envio_s": round(envio_s, 2),
+        "total_s": round(total_s, 2),
+        "sentencias": medidas["sentencias"],
+        "sentencias_por_mensaje": round(medidas["sentencias"] / max(procesados, 1), 2),
+        "lag_loop_ms": resumen_ms(medidas["lag"]),
+        "ia_llamadas": medidas["ia"], "whatsapp_envios": medidas["envios"],
+        "tvs": {"abiertas": args.tvs, "vivas_al_final": vivas, "conectar_s": round(conectar_s, 2),
+                "enviados": medidas["websockets"]["enviados"], "recibidos": recibidos["deltas"],
+                "expulsadas": sum(v for k, v in medidas["websockets"].items() if k.startswith("expulsados"))},
+        "cola": {k: cola[k] for k in ("encolados", "procesados", "errores", "rechazados", "duplicados")},
+    }
+    escenario = {k: getattr(args, k) for k in ("clubes", "jugadores", "rps", "segundos", "tvs", "ia_ms", "envio_ms",
+                                                "mezcla", "conexiones")}
+    actual = {"fecha": datetime.now().isoformat(timespec="seconds"), "version": version_del_codigo(),
+              "python": sys.version.split()[0], "escenario": escenario, "resultados": resultados}
+
+    print(f"\n📈 {args.rps:.0f} msg/s durante {args.segundos:.0f}s · {args.clubes} clubes · {args.tvs} TVs "
+          f"(conectadas en {conectar_s:.1f}s) · IA ~{args.ia_ms:.0f} ms · WhatsApp ~{args.envio_ms:.0f} ms")
+    print(f"{'':<22}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for nombre, clave in (("webhook (200)", "webhook_ms"), ("punta a punta", "punta_a_punta_ms"),
+                          ("lag del event loop", "lag_loop_ms")):
+        r = resultados[clave]
+        print(f"{nombre:<22}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['max']:>9.1f}")
+    print(f"Throughput: {resultados['throughput_msg_s']} msg/s procesados · HTTP {resultados['estados_http']} · "
+          f"cola {resultados['cola']}")
+    print(f"BD: {resultados['sentencias']} sentencias ({resultados['sentencias_por_mensaje']} por mensaje) · "
+          f"IA {resultados['ia_llamadas']} · WhatsApp {resultados['whatsapp_envios']}")
+    print(f"TVs: {vivas}/{args.tvs} vivas al final · {resultados['tvs']['enviados']} mensajes enviados, "
+          f"{recibidos['deltas']} recibidos · {resultados['tvs']['expulsadas']} expulsadas")
+
+    # Guardar y comparar con la corrida anterior del mismo escenario
+    os.makedirs(args.salida, exist_ok=True)
+    if args.comparar:
+        ruta_anterior = args.comparar
+        with open(ruta_anterior) as f:
+            anterior = json.load(f)
+    else:
+        ruta_anterior, anterior = corrida_anterior(escenario, args.salida)
+    ruta = os.path.join(args.salida, f"bench_carga-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(ruta, "w") as f:
+        json.dump(actual, f, indent=2, ensure_ascii=False)
+    print(f"💾 {os.path.relpath(ruta, utils.RAIZ)}")
+
+    empeoro = []
+    if anterior:
+        print(f"\nContra {os.path.basename(ruta_anterior)} ({anterior.get('version')}):")
+        for metrica, antes, ahora, malo in comparar(actual, anterior, args.tolerancia):
+            print(f"  {'❌' if malo else '  '} {metrica:<26}{antes:>10}{ahora:>10}")
+            if malo:
+                empeoro.append(metrica)
+
+    errores = []
+    if cola["errores"]:
+        errores.append(f"{cola['errores']} mensajes con error en los workers")
+    if procesados < len(webhook) - estados.get(503, 0):
+        errores.append(f"solo {procesados} de {len(webhook)} mensajes terminaron")
+    if vivas < args.tvs or recibidos["deltas"] < resultados["tvs"]["enviados"]:
+        errores.append("alguna TV se cayó o no recibió todos los mensajes")
+    if args.fallar_si_empeora and empeoro:
+        errores.append(f"empeoró: {', '.join(empeoro)}")
+    for e in errores:
+        print(f"❌ {e}")
+    if errores:
+        sys.exit(1)
+    print("✅ Todos los mensajes procesados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Prueba de contención: muchos "reporteros" registrando los MISMOS partidos a la vez.
+
+    python benchmarks/bench_contencion.py --partidos 50 --reporteros 16 [--database-url postgresql://...]
+
+Verifica al final que cada partido quedó registrado una sola vez, que hay
+exactamente 2 filas de rating_history por partido y que wins/losses/elo
+cuadran. Sale con código 1 si algo no cuadra.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import utils  # agrega la raíz del repo al sys.path
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--partidos", type=int, default=50)
+    parser.add_argument("--reporteros", type=int, default=16)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'contencion.db')}"
+    from database import engine, SessionLocal
+    from models import Base, Club, Player, Tournament, Match, RatingHistory
+    from migrations import aplicar_migraciones
+    from match_engine import registrar_resultado, registrar_ronda
+
+    Base.metadata.drop_all(bind=engine)
+    aplicar_migraciones(engine)
+    db = SessionLocal()
+    club = Club(name="Club Contención", admin_phone="570000")
+    db.add(club); db.flush()
+    torneo = Tournament(name="Copa Estrés", club_id=club.id, status="playing", smart_data={})
+    db.add(torneo); db.flush()
+    jugadores = [Player(name=f"Jugador {i}", club_id=club.id, elo=1200, wins=0, losses=0)
+                 for i in range(args.partidos * 2)]
+    db.add_all(jugadores); db.flush()
+    parejas = [(jugadores[2 * i], jugadores[2 * i + 1]) for i in range(args.partidos)]
+    db.add_all([Match(player_1_id=a.id, player_2_id=b.id, tournament_id=torneo.id, score="VS", is_finished=False)
+                for a, b in parejas])
+    db.commit()
+    nombres = [(a.name, b.name) for a, b in parejas]
+    club_id = club.id
+    db.close()
+
+    estados = {"registrado": 0, "duplicado": 0, "error": 0}
+    lock = threading.Lock()
+
+    def reportero(semilla):
+        rnd = random.Random(semilla)
+        orden = nombres[:]
+        rnd.shuffle(orden)
+        for ganador, perdedor in orden:
+            sesion = SessionLocal()
+            try:
+                # Mitad por WhatsApp (uno a uno), mitad por el endpoint masivo
+                if rnd.random() < 0.5:
+                    r = [registrar_resultado(sesion, club_id, ganador, perdedor, "3-1")]
+                else:
+                    r = registrar_ronda(sesion, club_id, [{"ganador": ganador, "perdedor": perdedor, "score": "3-1"}])
+                with lock:
+                    for x in r:
+                        estados[x["estado"]] += 1
+            except Exception as e:
+                with lock:
+                    estados["error"] += 1
+                print(f"❌ {type(e).__name__}: {e}")
+            finally:
+                sesion.close()
+
+    t0 = time.perf_counter()
+    hilos = [threading.Thread(target=reportero, args=(i,)) for i in range(args.reporteros)]
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    segundos = time.perf_counter() - t0
+
+    db = SessionLocal()
+    terminados = db.query(Match).filter(Match.is_finished == True).count()
+    historial = db.query(RatingHistory).count()
+    victorias = sum(p.wins for p in db.query(Player))
+    derrotas = sum(p.losses for p in db.query(Player))
+    suma_elo = sum(p.elo for p in db.query(Player))
+    db.close()
+
+    intentos = args.partidos * args.reporteros
+    print(f"{intentos} reportes de {args.partidos} partidos con {args.reporteros} hilos en {segundos:.2f}s "
+          f"({intentos / segundos:.0f} reportes/s)")
+    print(f"Estados: {estados}")
+    print(f"Partidos terminados: {terminados}, historial: {historial}, W/L: {victorias}/{derrotas}")
+
+    ok = (estados["error"] == 0 and terminados == args.partidos and historial == 2 * args.partidos
+          and victorias == args.partidos and derrotas == args.partidos and estados["registrado"] == args.partidos
+          and suma_elo == 1200 * len(nombres) * 2)
+    print("✅ Consistente" if ok else "❌ INCONSISTENTE")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Contexto del club: consultas por mensaje (antes) vs foto en memoria (club_context).
+
+    python benchmarks/bench_contexto.py --clubes 50 --jugadores 200 --mensajes 5000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import utils  # agrega la raíz del repo al sys.path
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clubes", type=int, default=50)
+    parser.add_argument("--jugadores", type=int, default=200, help="por club")
+    parser.add_argument("--mensajes", type=int, default=5000)
+    args = parser.parse_args()
+
+    ruta = os.path.join(tempfile.mkdtemp(), "bench_contexto.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+    from database import engine, SessionLocal
+    from models import Base, Club, Player, Tournament
+    from club_context import ContextoClubes
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for c in range(1, args.clubes + 1):
+        db.add(Club(id=c, name=f"Club {c}", admin_phone=f"57{c:08d}"))
+        db.add(Tournament(name=f"Copa {c}", club_id=c, status="inscription",
+                          smart_data={"inscritos": list(range(1, 33))}))
+    db.bulk_save_objects([Player(name=f"J{c}-{i}", elo=random.randint(900, 1600), club_id=c)
+                          for c in range(1, args.clubes + 1) for i in range(args.jugadores)])
+    db.commit()
+
+    # Lo que hacía ai_service.generar_contexto_club antes: 2 consultas por mensaje
+    def contexto_antes(club_id):
+        torneo = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status != "finished").first()
+        info_torneo = "No hay torneos activos."
+        if torneo:
+            inscritos = len((torneo.smart_data or {}).get("inscritos", []))
+            info_torneo = f"TORNEO ACTIVO: '{torneo.name}' ({torneo.category}). Estado: {torneo.status}. Inscritos: {inscritos}."
+        top = db.query(Player).filter(Player.club_id == club_id).order_by(Player.elo.desc()).limit(3).all()
+        ranking_txt = ", ".join([f"{p.name} ({p.elo})" for p in top])
+        return f"CLUB ID {club_id}:\n- {info_torneo}\n- Top 3: {ranking_txt}"
+
+    contextos = ContextoClubes()
+    clubes = [random.randint(1, args.clubes) for _ in range(args.mensajes)]
+
+    t0 = time.perf_counter()
+    for c in clubes:
+        contexto_antes(c)
+        db.expire_all()
+    antes = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for c in clubes:
+        contextos.texto(db, c)
+    despues = time.perf_counter() - t0
+
+    print(f"{args.clubes} clubes x {args.jugadores} jugadores, {args.mensajes} mensajes")
+    print(f"Antes  (consultas): {args.mensajes / antes:10.0f} msg/s")
+    print(f"Después (foto):     {args.mensajes / despues:10.0f} msg/s  ({antes / despues:.0f}x)")
+    print(f"Cargas de foto: {contextos.contadores['cargas']}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
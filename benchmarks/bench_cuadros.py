@@ -0,0 +1,289 @@
+"""
+Cuadros completos: generarlos con 512 inscritos, jugarlos hasta la final y pintarlos.
+
+    python benchmarks/bench_cuadros.py --jugadores 512 --hasta 70
+
+1. Estructura (en memoria, sin BD), para 2..--hasta inscritos: cada uno
+   aparece una sola vez (ronda 1 o bye directo a la ronda 2), el principal
+   tiene n-1 partidos, los cabezas 1 y 2 solo se pueden cruzar en la final
+   y en grupos cada pareja juega una vez.
+2. Generar con --jugadores inscritos: sentencias y tiempo de generar_cuadros
+   (un INSERT + un UPDATE) contra guardar el mismo cuadro con el ORM
+   (add_all y después los enlaces objeto por objeto). También en grupos.
+3. Jugar: levanta la app real (uvicorn + SQLite temporal) con una TV por
+   WebSocket y reporta por POST /club/{id}/resultados los partidos listos,
+   ronda por ronda, ganando siempre el mejor sembrado. Comprueba que el
+   campeón es el cabeza de serie 1, que la consolación la gana el mejor de
+   los que perdieron en la ronda 1 y que la TV, solo con deltas, termina
+   igual que /snapshot. Mide las sentencias de la vista del cuadro.
+Sale con código 1 si algo no cuadra.
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import utils  # agrega la raíz del repo al sys.path
+from bench_en_vivo import TV
+
+
+SENTENCIA = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class Contador:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, conn, cursor, statement, *args):
+        if SENTENCIA.match(statement):
+            self.total += 1
+
+    def medir(self, fn):
+        self.total = 0
+        t0 = time.perf_counter()
+        resultado = fn()
+        return resultado, self.total, (time.perf_counter() - t0) * 1000
+
+
+# --- 1. ESTRUCTURA EN MEMORIA ---
+def verificar_estructura(hasta):
+    from brackets import planificar_eliminacion, planificar_grupos, PRINCIPAL, CONSOLACION
+    errores = []
+    for n in range(2, hasta + 1):
+        ids = list(range(1, n + 1))   # id = cabeza de serie
+        plan = planificar_eliminacion(ids)
+        principal = {k: f for k, f in plan.items() if k[0] == PRINCIPAL}
+        colocados = [p for (_, ronda, _), f in principal.items() if ronda <= 2
+                     for p in (f["player_1_id"], f["player_2_id"]) if p is not None]
+        if sorted(colocados) != ids:
+            errores.append(f"{n}: inscritos mal colocados")
+        if len(principal) != n - 1:
+            errores.append(f"{n}: {len(principal)} partidos en el principal (esperaba {n - 1})")
+        # Siguiendo los enlaces, 1 y 2 llegan a lados distintos de la final
+        rondas = max(k[1] for k in principal)
+        for semilla in (1, 2):
+            clave = next(k for k, f in principal.items() if semilla in (f["player_1_id"], f["player_2_id"]))
+            posicion = 1 if plan[clave]["player_1_id"] == semilla else 2
+            while clave[1] < rondas:
+                clave, posicion = plan[clave]["siguiente"]
+            if posicion != semilla:
+                errores.append(f"{n}: el cabeza {semilla} no llega por su lado a la final")
+        perdedores = [f for f in plan.values() if f["perdedor"]]
+        consolacion = [k for k in plan if k[0] == CONSOLACION]
+        if consolacion and len(consolacion) != len(perdedores) - 1:
+            errores.append(f"{n}: consolación con {len(consolacion)} partidos para {len(perdedores)} perdedores")
+
+        grupos = planificar_grupos(ids)
+        parejas = [frozenset((f["player_1_id"], f["player_2_id"])) for f in grupos.values()]
+        miembros = {}
+        for f in grupos.values():
+            for p in (f["player_1_id"], f["player_2_id"]):
+                miembros.setdefault(f["bracket"], set()).add(p)
+        esperadas = sum(len(m) * (len(m) - 1) // 2 for m in miembros.values())
+        if len(set(parejas)) != len(parejas) or len(parejas) != esperadas or sum(map(len, miembros.values())) != n:
+            errores.append(f"{n}: grupos incompletos o con parejas repetidas")
+    return errores
+
+
+# --- 2. GENERAR ---
+def sembrar(n, nombre):
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models import Club, Player, Tournament, Enrollment
+    db = SessionLocal()
+    club = Club(name=nombre, admin_phone=f"57{abs(hash(nombre)) % 10**8}")
+    db.add(club); db.flush()
+    filas = db.execute(insert(Player).returning(Player.id),
+                       [{"name": f"Jugador {i}", "club_id": club.id, "elo": 3000 - i, "category": "General",
+                         "wins": 0, "losses": 0} for i in range(n)]).scalars().all()
+    torneo = Tournament(name=f"Copa {nombre}", club_id=club.id, status="inscription", smart_data={})
+    db.add(torneo); db.flush()
+    db.execute(insert(Enrollment), [{"tournament_id": torneo.id, "player_id": pid} for pid in filas])
+    ids = (club.id, torneo.id)
+    db.commit(); db.close()
+    return ids
+
+def guardar_con_orm(db, torneo_id, plan):
+    # Lo que haría el ORM "a mano": un objeto por partido y después los enlaces
+    from models import Match
+    objetos = {clave: Match(tournament_id=torneo_id, score="VS", is_finished=False, bracket=f["bracket"],
+                            round=f["round"], slot=f["slot"], player_1_id=f["player_1_id"],
+                            player_2_id=f["player_2_id"]) for clave, f in plan.items()}
+    db.add_all(objetos.values()); db.flush()
+    for clave, f in plan.items():
+        if f["siguiente"]:
+            objetos[clave].next_match_id, objetos[clave].next_position = objetos[f["siguiente"][0]].id, f["siguiente"][1]
+        if f["perdedor"]:
+            objetos[clave].loser_match_id, objetos[clave].loser_position = objetos[f["perdedor"][0]].id, f["perdedor"][1]
+    db.flush()
+
+def generar(contador, club_id, datos):
+    from database import SessionLocal
+    from actions import ejecutar_accion
+    db = SessionLocal()
+    try:
+        (texto, _, avisos), sentencias, ms = contador.medir(lambda: ejecutar_accion(
+            db, club_id, "570000", {"accion": "generar_cuadros", "datos": datos}))
+    finally:
+        db.close()
+    assert "generados" in texto, texto
+    return sentencias, ms, len(avisos)
+
+
+# --- 3. JUGAR POR LA API ---
+def partidos_listos(torneo_id):
+    from database import SessionLocal
+    from models import Match
+    db = SessionLocal()
+    filas = db.query(Match.player_1_id, Match.player_2_id).filter(
+        Match.tournament_id == torneo_id, Match.is_finished == False,
+        Match.player_1_id != None, Match.player_2_id != None).all()
+    db.close()
+    return filas
+
+async def jugar(base, club_id, torneo_id, semilla_de, nombre_de, en_vivo):
+    import httpx
+    from websockets.asyncio.client import connect
+    async with httpx.AsyncClient(timeout=60) as http:
+        tv = TV(base, club_id)
+        await tv.cargar(http)
+        ws = await connect(f"{base.replace('http://', 'ws://')}/ws/{club_id}")
+
+        async def seguir():
+            while True:
+                d = json.loads(await ws.recv())
+                if d["tipo"] == "ping":
+                    await ws.send("pong")
+                    continue
+                await tv.recibir(http, d)
+        oyente = asyncio.create_task(seguir())
+
+        rondas, reportados, t0 = 0, 0, time.perf_counter()
+        while listos := partidos_listos(torneo_id):
+            rondas += 1
+            resultados = []
+            for p1, p2 in listos:
+                ganador, perdedor = sorted((p1, p2), key=semilla_de.get)
+                resultados.append({"ganador": nombre_de[ganador], "perdedor": nombre_de[perdedor], "score": "3-1"})
+            for i in range(0, len(resultados), 64):
+                r = await http.post(f"{base}/club/{club_id}/resultados", json={"resultados": resultados[i:i + 64]})
+                estados = {x["estado"] for x in r.json()["resultados"]}
+                assert estados == {"registrado"}, estados
+            reportados += len(resultados)
+        segundos = time.perf_counter() - t0
+
+        limite = time.time() + 30
+        while tv.estado["seq"] < en_vivo.seq(club_id) and time.time() < limite:
+            await asyncio.sleep(0.05)
+        if oyente.done():
+            oyente.result()   # la TV se cayó: que se vea el error
+        oyente.cancel()
+        await ws.close()
+        en_vivo.descartar()
+        servidor = (await http.get(f"{base}/club/{club_id}/snapshot")).json()
+    return rondas, reportados, segundos, tv, servidor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jugadores", type=int, default=512)
+    parser.add_argument("--hasta", type=int, default=70, help="tamaños a verificar en memoria (2..hasta)")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cuadros.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["WS_PING_INTERVALO"] = "0"
+    # Cada tanda de 64 resultados son 128 deltas de golpe: que la TV no se expulse por lenta
+    os.environ["WS_COLA_MAX"] = "100000"
+    os.chdir(utils.RAIZ)
+    errores = verificar_estructura(args.hasta)
+    for e in errores[:10]:
+        print(f"❌ Estructura: {e}")
+
+    import main as app_main
+    from database import engine, SessionLocal
+    from brackets import planificar_eliminacion, orden_de_siembra, CONSOLACION
+    from models import Match, Player
+    from live_updates import en_vivo, vista_club
+    from migrations import aplicar_migraciones
+    aplicar_migraciones(engine)
+    contador = Contador(engine)
+    n = args.jugadores
+
+    # 2. Generar: ORM a mano vs brackets.py, eliminación y grupos
+    _, torneo_orm = sembrar(n, "ORM")
+    db = SessionLocal()
+    ids = [pid for (pid,) in db.query(Player.id).order_by(Player.elo.desc(), Player.id)]
+    _, sentencias_orm, ms_orm = contador.medir(lambda: guardar_con_orm(db, torneo_orm, planificar_eliminacion(ids)))
+    db.rollback(); db.close()
+    club_id, torneo_id = sembrar(n, "Cuadros")
+    sentencias, ms, avisos = generar(contador, club_id, {})
+    club_grupos, torneo_grupos = sembrar(n, "Grupos")
+    sentencias_grupos, ms_grupos, _ = generar(contador, club_grupos, {"formato": "grupos"})
+
+    db = SessionLocal()
+    jugadores = db.query(Player.id, Player.name, Player.elo).filter(Player.club_id == club_id) \
+                  .order_by(Player.elo.desc(), Player.id).all()
+    semilla_de = {j.id: i + 1 for i, j in enumerate(jugadores)}
+    nombre_de = {j.id: j.name for j in jugadores}
+    total = db.query(Match).filter(Match.tournament_id == torneo_id).count()
+    total_grupos = db.query(Match).filter(Match.tournament_id == torneo_grupos).count()
+    db.close()
+
+    # 3. Jugar hasta la final con una TV siguiendo los deltas
+    base = utils.levantar_servidor(app_main.app)
+    rondas, reportados, segundos, tv, servidor = asyncio.run(
+        jugar(base, club_id, torneo_id, semilla_de, nombre_de, en_vivo))
+
+    db = SessionLocal()
+    _, sentencias_vista, ms_vista = contador.medir(lambda: vista_club(db, club_id))
+    finales = {m.bracket: m.winner_id for m in db.query(Match).filter(
+        Match.tournament_id == torneo_id, Match.next_match_id == None, Match.round != None)}
+    pendientes = db.query(Match).filter(Match.tournament_id == torneo_id, Match.is_finished == False).count()
+    db.close()
+
+    # Consolación: la gana el mejor sembrado que perdió un partido real de la ronda 1
+    tamano = 1 << (n - 1).bit_length()
+    orden = orden_de_siembra(tamano)
+    perdedores_r1 = [orden[i + 1] for i in range(0, tamano, 2) if orden[i + 1] <= n]
+    campeon_consolacion = min(perdedores_r1) if len(perdedores_r1) >= 2 else None
+
+    print(f"\n🎾 Cuadro de {n} inscritos ({total} partidos con consolación; {total_grupos} en grupos)")
+    print(f"{'generar':<34}{'sentencias':>11}{'ms':>9}")
+    print(f"{'ORM (add_all + enlaces)':<34}{sentencias_orm:>11}{ms_orm:>9.1f}")
+    print(f"{'generar_cuadros (eliminación)':<34}{sentencias:>11}{ms:>9.1f}")
+    print(f"{'generar_cuadros (grupos)':<34}{sentencias_grupos:>11}{ms_grupos:>9.1f}")
+    print(f"Jugado por la API: {reportados} resultados en {rondas} tandas, {segundos:.2f}s "
+          f"({reportados / segundos:.0f} resultados/s), {avisos} avisos al generar")
+    print(f"Vista del cuadro: {sentencias_vista} sentencias, {ms_vista:.1f} ms, "
+          f"{len(servidor['secciones'])} secciones; TV: {tv.deltas} deltas, {tv.resyncs} resincronizaciones")
+
+    if pendientes or reportados != total:
+        errores.append(f"quedaron {pendientes} partidos sin jugar ({reportados} de {total})")
+    if semilla_de.get(finales.get("principal")) != 1:
+        errores.append(f"el campeón es el sembrado {semilla_de.get(finales.get('principal'))}, no el 1")
+    if campeon_consolacion and semilla_de.get(finales.get(CONSOLACION)) != campeon_consolacion:
+        errores.append(f"la consolación la ganó el sembrado {semilla_de.get(finales.get(CONSOLACION))}, "
+                       f"no el {campeon_consolacion}")
+    if sentencias > 7 or sentencias_grupos > 7 or sentencias_vista > 2:
+        errores.append("generar o pintar el cuadro ya no son sentencias constantes")
+    campos = ("p1", "p2", "n1", "n2", "ganador", "terminado")
+    if [[p[c] for c in campos] for p in tv.estado["partidos"]] != [[p[c] for c in campos] for p in servidor["partidos"]]:
+        errores.append("la TV (solo deltas) no coincide con /snapshot")
+    if any(p["terminado"] and not (p["n1"] and p["n2"]) for p in servidor["partidos"]):
+        errores.append("hay partidos jugados sin nombres en la vista")
+
+    for e in errores:
+        print(f"❌ {e}")
+    if errores:
+        sys.exit(1)
+    print("✅ Byes, avances, consolación, grupos y TV en vivo correctos")
+
+
+if __name__ == "__main__":
+    main()
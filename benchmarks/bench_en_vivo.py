@@ -0,0 +1,185 @@
+"""
+Prueba de carga de las TVs en vivo: cuántas veces renderiza el servidor por evento.
+
+    python benchmarks/bench_en_vivo.py --pantallas 20 --eventos 40
+
+Levanta la app real (uvicorn + SQLite temporal), conecta N "TVs" por
+WebSocket y registra E resultados de torneo, uno por uno:
+
+  1. Modo antiguo: por cada evento todas las TVs recargan /club/{id}
+     (lo que hacía location.reload()). Se mide con la caché de vista apagada.
+  2. Modo deltas: las TVs aplican los deltas JSON; una de ellas pierde un
+     mensaje a propósito y debe resincronizar con /club/{id}/snapshot.
+
+Al final cada TV debe tener exactamente la misma foto que el servidor.
+Sale con código 1 si alguna no cuadra.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import utils  # agrega la raíz del repo al sys.path
+
+
+# --- UNA TV SIMULADA (misma lógica que ranking.html) ---
+class TV:
+    def __init__(self, base, club_id, perder_seq=None):
+        self.base, self.club_id, self.perder_seq = base, club_id, perder_seq
+        self.estado = None
+        self.deltas = 0
+        self.resyncs = 0
+
+    async def cargar(self, http):
+        html = (await http.get(f"{self.base}/club/{self.club_id}")).text
+        inicio = html.index('id="estado-inicial" type="application/json">') + len('id="estado-inicial" type="application/json">')
+        self.estado = json.loads(html[inicio:html.index("</script>", inicio)])
+
+    def aplicar(self, d):
+        if d["tipo"] == "ranking":
+            for j in self.estado["jugadores"]:
+                j["elo"] = d["elos"].get(str(j["id"]), j["elo"])
+            return True
+        if d["tipo"] == "resultado":
+            partido = next((p for p in self.estado["partidos"] if p["id"] == d["match_id"]), None)
+            if partido is None:
+                return False
+            partido.update(ganador=d["ganador_id"], score=d["score"] or partido["score"], terminado=True)
+            for a in d.get("avances", []):
+                siguiente = next((p for p in self.estado["partidos"] if p["id"] == a["match_id"]), None)
+                if siguiente is None:
+                    return False
+                lado = "1" if a["posicion"] == 1 else "2"
+                siguiente.update({"p" + lado: a["player_id"], "n" + lado: a["nombre"]})
+            return True
+        return False
+
+    async def recibir(self, http, d):
+        self.deltas += 1
+        if d["seq"] == self.perder_seq:
+            self.perder_seq = None
+            return   # mensaje "perdido" en la red
+        if d["seq"] <= self.estado["seq"]:
+            return
+        if d["seq"] != self.estado["seq"] + 1 or not self.aplicar(d):
+            self.resyncs += 1
+            self.estado = (await http.get(f"{self.base}/club/{self.club_id}/snapshot")).json()
+            if d["seq"] > self.estado["seq"]:
+                self.aplicar(d)
+                self.estado["seq"] = d["seq"]
+            return
+        self.estado["seq"] = d["seq"]
+
+    async def escuchar(self, http, ws, seq_final):
+        while self.estado["seq"] < seq_final:
+            d = json.loads(await ws.recv())
+            if d["tipo"] == "ping":
+                await ws.send("pong")
+                continue
+            await self.recibir(http, d)
+
+
+def sembrar(SessionLocal, Club, Player, Tournament, Match, eventos):
+    db = SessionLocal()
+    club = db.query(Club).filter(Club.id == 1).first()
+    torneo = Tournament(name="Copa En Vivo", club_id=club.id, status="playing", smart_data={})
+    db.add(torneo); db.flush()
+    jugadores = [Player(name=f"Jugador {i}", club_id=club.id, elo=1200 + i, wins=0, losses=0)
+                 for i in range(eventos * 4)]
+    db.add_all(jugadores); db.flush()
+    parejas = [(jugadores[2 * i], jugadores[2 * i + 1]) for i in range(eventos * 2)]
+    db.add_all([Match(player_1_id=a.id, player_2_id=b.id, tournament_id=torneo.id, score="VS", is_finished=False)
+                for a, b in parejas])
+    db.commit()
+    nombres = [(a.name, b.name) for a, b in parejas]
+    club_id = club.id
+    db.close()
+    return club_id, nombres
+
+
+async def correr(args, base, club_id, nombres, en_vivo):
+    import httpx
+    from websockets.asyncio.client import connect
+
+    limites = httpx.Limits(max_connections=args.pantallas * 2)
+    async with httpx.AsyncClient(timeout=30, limits=limites) as http:
+        async def reportar(ganador, perdedor):
+            r = await http.post(f"{base}/club/{club_id}/resultados",
+                                json={"resultados": [{"ganador": ganador, "perdedor": perdedor, "score": "3-1"}]})
+            assert r.json()["resultados"][0]["estado"] == "registrado"
+
+        # 1. MODO ANTIGUO: "update" + N recargas completas por evento
+        en_vivo.vista_ttl = 0
+        antes = en_vivo.contadores["vistas_calculadas"]
+        t0 = time.perf_counter()
+        for ganador, perdedor in nombres[:args.eventos]:
+            await reportar(ganador, perdedor)
+            await asyncio.gather(*(http.get(f"{base}/club/{club_id}") for _ in range(args.pantallas)))
+        t_antiguo = time.perf_counter() - t0
+        renders_antiguo = en_vivo.contadores["vistas_calculadas"] - antes
+
+        # 2. MODO DELTAS: cada TV carga la página una vez y luego solo aplica deltas
+        en_vivo.vista_ttl = 30
+        tvs = [TV(base, club_id) for _ in range(args.pantallas)]
+        for tv in tvs:
+            await tv.cargar(http)
+        tvs[0].perder_seq = tvs[0].estado["seq"] + 3   # fuerza un salto de seq en la TV 0
+        ws_base = base.replace("http://", "ws://")
+        conexiones = [await connect(f"{ws_base}/ws/{club_id}") for _ in tvs]
+        await asyncio.sleep(0.2)
+
+        # Cada resultado de torneo produce 2 deltas: "resultado" y "ranking"
+        seq_final = en_vivo.seq(club_id) + 2 * args.eventos
+        antes = en_vivo.contadores["vistas_calculadas"]
+        t0 = time.perf_counter()
+        oyentes = [asyncio.create_task(tv.escuchar(http, ws, seq_final)) for tv, ws in zip(tvs, conexiones)]
+        for ganador, perdedor in nombres[args.eventos:args.eventos * 2]:
+            await reportar(ganador, perdedor)
+        await asyncio.wait_for(asyncio.gather(*oyentes), timeout=60)
+        t_deltas = time.perf_counter() - t0
+        renders_deltas = en_vivo.contadores["vistas_calculadas"] - antes
+        for ws in conexiones:
+            await ws.close()
+
+        # 3. VERIFICAR: todas las TVs igual que el servidor
+        en_vivo.vista_ttl = 0
+        servidor = (await http.get(f"{base}/club/{club_id}/snapshot")).json()
+        malas = [i for i, tv in enumerate(tvs)
+                 if {j["id"]: j["elo"] for j in tv.estado["jugadores"]} != {j["id"]: j["elo"] for j in servidor["jugadores"]}
+                 or {p["id"]: p["terminado"] for p in tv.estado["partidos"]} != {p["id"]: p["terminado"] for p in servidor["partidos"]}]
+
+    print(f"\n📺 {args.pantallas} pantallas, {args.eventos} eventos por modo")
+    print(f"{'modo':<22}{'renders':>10}{'por evento':>12}{'segundos':>10}")
+    print(f"{'antiguo (reload)':<22}{renders_antiguo:>10}{renders_antiguo / args.eventos:>12.2f}{t_antiguo:>10.2f}")
+    print(f"{'deltas + snapshot':<22}{renders_deltas:>10}{renders_deltas / args.eventos:>12.2f}{t_deltas:>10.2f}")
+    print(f"Deltas recibidos por TV: {tvs[1].deltas}   resincronizaciones: {sum(tv.resyncs for tv in tvs)}")
+    if malas:
+        print(f"❌ {len(malas)} TVs no coinciden con el servidor: {malas[:10]}")
+        return 1
+    print("✅ Todas las TVs coinciden con el servidor")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pantallas", type=int, default=20)
+    parser.add_argument("--eventos", type=int, default=40)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'en_vivo.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.chdir(utils.RAIZ)   # Jinja busca templates/ relativo al directorio actual
+    import main as app_main
+    from database import SessionLocal
+    from models import Club, Player, Tournament, Match
+    from live_updates import en_vivo
+
+    base = utils.levantar_servidor(app_main.app)
+    club_id, nombres = sembrar(SessionLocal, Club, Player, Tournament, Match, args.eventos)
+    sys.exit(asyncio.run(correr(args, base, club_id, nombres, en_vivo)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Benchmark del fan-out de WebSockets: miles de TVs, algunas lentas o rotas.
+
+    python benchmarks/bench_fanout.py --sockets 5000 --mensajes 20 --latencia-ms 1 --colgadas 5 --rotas 5
+    python benchmarks/bench_fanout.py --reales 2000     # además, sockets de verdad contra uvicorn
+
+Compara el broadcast antiguo (un await send_text tras otro) contra el
+ConnectionManager con cola + escritor por conexión. Los sockets falsos
+tardan --latencia-ms en cada envío; las "colgadas" nunca terminan un envío
+y las "rotas" lanzan excepción.
+"""
+import time
+import asyncio
+import argparse
+import utils  # agrega la raíz del repo al sys.path
+from connection_manager import ConnectionManager
+
+
+class SocketFalso:
+    def __init__(self, latencia, modo="sana"):
+        self.latencia, self.modo = latencia, modo
+        self.recibidos = 0
+        self.cerrado = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, mensaje):
+        if self.modo == "colgada":
+            await asyncio.Event().wait()
+        if self.modo == "rota":
+            raise ConnectionResetError("socket roto")
+        await asyncio.sleep(self.latencia)
+        self.recibidos += 1
+
+    async def close(self, code=1000):
+        self.cerrado = code
+
+
+# --- EL BROADCAST DE ANTES (para comparar) ---
+class ManagerAntiguo:
+    def __init__(self):
+        self.active_connections = {}
+
+    async def connect(self, websocket, club_id):
+        await websocket.accept()
+        self.active_connections.setdefault(club_id, []).append(websocket)
+
+    async def broadcast(self, message, club_id):
+        for connection in self.active_connections.get(club_id, []):
+            await connection.send_text(message)
+
+
+def crear_sockets(args):
+    sockets = [SocketFalso(args.latencia_ms / 1000) for _ in range(args.sockets)]
+    # Repartir las problemáticas por la lista (no todas al final)
+    paso = max(1, args.sockets // max(1, args.colgadas + args.rotas))
+    for i in range(args.colgadas):
+        sockets[(i * 2) * paso % args.sockets].modo = "colgada"
+    for i in range(args.rotas):
+        sockets[(i * 2 + 1) * paso % args.sockets].modo = "rota"
+    return sockets
+
+
+async def esperar_entrega(sanas, mensajes, limite):
+    t0 = time.perf_counter()
+    while any(s.recibidos < mensajes for s in sanas):
+        if time.perf_counter() - t0 > limite:
+            return None
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - t0
+
+
+async def medir_antiguo(args):
+    sockets = crear_sockets(args)
+    gestor = ManagerAntiguo()
+    for s in sockets:
+        await gestor.connect(s, 1)
+    sanas = [s for s in sockets if s.modo == "sana"]
+    t0 = time.perf_counter()
+    errores = 0
+    for i in range(args.mensajes):
+        try:
+            await asyncio.wait_for(gestor.broadcast(f"m{i}", 1), args.limite)
+        except asyncio.TimeoutError:
+            errores += 1
+            break
+        except Exception:
+            errores += 1   # la excepción aborta el resto del broadcast
+    segundos = time.perf_counter() - t0
+    entregados = sum(s.recibidos for s in sanas)
+    return segundos, entregados, len(sanas) * args.mensajes, errores
+
+
+async def medir_nuevo(args):
+    sockets = crear_sockets(args)
+    gestor = ConnectionManager(cola_max=args.cola, envio_timeout=args.envio_timeout, ping_intervalo=0)
+    await gestor.start()
+    for s in sockets:
+        await gestor.connect(s, 1)
+    sanas = [s for s in sockets if s.modo == "sana"]
+    t0 = time.perf_counter()
+    for i in range(args.mensajes):
+        gestor.broadcast(f"m{i}", 1)
+    t_broadcast = time.perf_counter() - t0
+    segundos = await esperar_entrega(sanas, args.mensajes, args.limite)
+    await asyncio.sleep(args.envio_timeout + 0.2)   # dejar que expiren las colgadas
+    metricas = gestor.metricas()
+    await gestor.stop()
+    entregados = sum(s.recibidos for s in sanas)
+    return t_broadcast, segundos, entregados, len(sanas) * args.mensajes, metricas
+
+
+# --- SOCKETS REALES: uvicorn + clientes websockets ---
+async def medir_reales(args):
+    from fastapi import FastAPI, WebSocket
+    from websockets.asyncio.client import connect
+
+    app = FastAPI()
+    gestor = ConnectionManager(ping_intervalo=0)
+
+    @app.websocket("/ws/{club_id}")
+    async def ws(websocket: WebSocket, club_id: int):
+        await gestor.connect(websocket, club_id)
+        try:
+            while True:
+                await websocket.receive_text()
+        except Exception:
+            gestor.disconnect(websocket, club_id)
+
+    base = utils.levantar_servidor(app).replace("http://", "ws://")
+    clientes = []
+    for i in range(0, args.reales, 200):
+        clientes += await asyncio.gather(*(connect(f"{base}/ws/1") for _ in range(min(200, args.reales - i))))
+    while gestor.total() < args.reales:
+        await asyncio.sleep(0.01)
+
+    # broadcast() corre en el loop de uvicorn (otro hilo): se lo pasamos con call_soon_threadsafe
+    loop_servidor = next(iter(gestor.por_socket.values())).escritor.get_loop()
+    latencias = []
+
+    async def leer(cliente):
+        for _ in range(args.mensajes):
+            mensaje = await cliente.recv()
+            latencias.append(time.perf_counter() - float(mensaje))
+
+    lectores = [asyncio.create_task(leer(c)) for c in clientes]
+    t0 = time.perf_counter()
+    for _ in range(args.mensajes):
+        loop_servidor.call_soon_threadsafe(gestor.broadcast, repr(time.perf_counter()), 1)
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*lectores)
+    segundos = time.perf_counter() - t0
+    for c in clientes:
+        await c.close()
+    return segundos, latencias, gestor.metricas()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=5000)
+    parser.add_argument("--mensajes", type=int, default=20)
+    parser.add_argument("--latencia-ms", type=float, default=1.0)
+    parser.add_argument("--colgadas", type=int, default=5)
+    parser.add_argument("--rotas", type=int, default=5)
+    parser.add_argument("--cola", type=int, default=64)
+    parser.add_argument("--envio-timeout", type=float, default=1.0)
+    parser.add_argument("--limite", type=float, default=10.0, help="segundos máximos por medición")
+    parser.add_argument("--reales", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"📡 {args.sockets} sockets ({args.colgadas} colgadas, {args.rotas} rotas), "
+          f"{args.mensajes} mensajes, {args.latencia_ms} ms por envío")
+
+    segundos, entregados, esperados, errores = asyncio.run(medir_antiguo(args))
+    print(f"\nAntiguo (secuencial): {entregados}/{esperados} entregados a las sanas en {segundos:.2f}s, "
+          f"{errores} broadcasts abortados/colgados")
+
+    t_broadcast, segundos, entregados, esperados, m = asyncio.run(medir_nuevo(args))
+    entrega = f"{segundos:.3f}s" if segundos is not None else f">{args.limite}s"
+    print(f"Nuevo (cola por TV):  {entregados}/{esperados} entregados a las sanas en {entrega} "
+          f"(broadcast() total {t_broadcast * 1000:.1f} ms)")
+    print(f"  lag p50 {m['lag_ms_p50']} ms, p99 {m['lag_ms_p99']} ms, máx {m['lag_ms_max']} ms; "
+          f"expulsadas: {m['expulsados_error']} por error/timeout, {m['expulsados_lentos']} por cola llena")
+
+    if args.reales:
+        segundos, latencias, m = asyncio.run(medir_reales(args))
+        print(f"\n🔌 {args.reales} sockets reales, {args.mensajes} mensajes: {len(latencias)} entregas en {segundos:.2f}s, "
+              f"latencia p50 {utils.percentil(latencias, 50) * 1000:.1f} ms, p99 {utils.percentil(latencias, 99) * 1000:.1f} ms")
+
+    ok = entregados == esperados
+    print("✅ Todas las TVs sanas recibieron todo" if ok else "❌ Faltaron entregas a TVs sanas")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Importación masiva (bulk_io.py): 100.000 filas de jugadores e historial de partidos.
+
+    python benchmarks/bench_importacion.py --filas 100000 --clubes 20 --jugadores 500 [--lote 5000]
+
+1. Línea base: crear_jugador de a uno (lo que hace un mensaje de WhatsApp),
+   --base veces, y su extrapolación a todos los jugadores.
+2. Importa --clubes × --jugadores jugadores (CSV) y el resto de las --filas
+   como partidos (NDJSON.gz, con jugadores que no estaban en el CSV) con
+   replay del ranking. Mide filas/s y sentencias por lote.
+3. Reimporta los partidos: no debe crear nada (upsert idempotente). Se corre
+   con tracemalloc y se compara el pico con el de un archivo de 2 lotes:
+   la memoria no debe crecer con el tamaño del archivo.
+4. Exporta todos los partidos en streaming (pico de memoria) y reimporta lo
+   exportado de un club por HTTP (POST en trozos, con BULK_TOKEN; sin token
+   debe dar 401) sin crear duplicados.
+Sale con código 1 si algo no cuadra.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+import utils  # agrega la raíz del repo al sys.path
+
+
+SENTENCIA = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+INICIO = datetime(2023, 1, 1, 8, 0)
+
+
+class Contador:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, conn, cursor, statement, *args):
+        if SENTENCIA.match(statement):
+            self.total += 1
+
+
+# --- FIXTURES (escritas en streaming, como llegarían de otro sistema) ---
+def nombre(club, i):
+    return f"Jugador {club}-{i}"
+
+def escribir_jugadores(ruta, clubes, jugadores):
+    categorias = ["Primera", "Segunda", "Damas", "Senior"]
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        f.write("club_id,nombre,categoria,telefono\n")
+        for c in range(1, clubes + 1):
+            for i in range(jugadores):
+                # Un celular por familia: varios jugadores comparten dueño
+                f.write(f"{c},{nombre(c, i)},{categorias[i % 4]},+57 300 {c:03d} {i // 3:04d}\n")
+
+def escribir_partidos(ruta, clubes, jugadores, partidos, rnd):
+    # El 10% de los rivales no está en el CSV de jugadores: se crean al importar
+    total = jugadores + jugadores // 10
+    with gzip.open(ruta, "wt", encoding="utf-8") as f:
+        for k in range(partidos):
+            c = k % clubes + 1
+            a, b = rnd.sample(range(total), 2)
+            fila = {"club_id": c, "fecha": (INICIO + timedelta(minutes=k)).isoformat(),
+                    "jugador_1": nombre(c, a), "jugador_2": nombre(c, b),
+                    "ganador": nombre(c, a if rnd.random() < 0.5 else b), "score": rnd.choice(["3-0", "3-1", "3-2"])}
+            f.write(json.dumps(fila) + "\n")
+
+
+def medir(contador, fn):
+    antes, t0 = contador.total, time.perf_counter()
+    resultado = fn()
+    return resultado, time.perf_counter() - t0, contador.total - antes
+
+def con_pico(fn):
+    tracemalloc.start()
+    try:
+        resultado = fn()
+        return resultado, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=100000, help="jugadores + partidos")
+    parser.add_argument("--clubes", type=int, default=20)
+    parser.add_argument("--jugadores", type=int, default=500, help="por club")
+    parser.add_argument("--lote", type=int, default=5000)
+    parser.add_argument("--base", type=int, default=300, help="jugadores de la línea base (uno por uno)")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(carpeta, 'importacion.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["BULK_TOKEN"] = "bench"
+    from sqlalchemy import func
+    from database import engine, SessionLocal
+    from migrations import aplicar_migraciones
+    from models import Club, Player, Match
+    from actions import ejecutar_accion
+    from bulk_io import importar, exportar, leer_filas, abrir
+    aplicar_migraciones(engine)
+    contador = Contador(engine)
+    errores = []
+
+    n_jugadores = args.clubes * args.jugadores
+    n_partidos = args.filas - n_jugadores
+    ruta_jugadores = os.path.join(carpeta, "jugadores.csv")
+    ruta_partidos = os.path.join(carpeta, "partidos.ndjson.gz")
+    escribir_jugadores(ruta_jugadores, args.clubes, args.jugadores)
+    escribir_partidos(ruta_partidos, args.clubes, args.jugadores, n_partidos, random.Random(args.semilla))
+    db = SessionLocal()
+    db.add_all([Club(id=c, name=f"Club {c}", admin_phone=f"57{c:08d}") for c in range(1, args.clubes + 2)])
+    db.commit()
+    db.close()
+    print(f"\n📦 {args.filas} filas: {n_jugadores} jugadores ({args.clubes} clubes) + {n_partidos} partidos, "
+          f"lotes de {args.lote}")
+
+    # 1. Línea base: de a un jugador por mensaje (club aparte)
+    base = args.clubes + 1
+    def uno_por_uno():
+        for i in range(args.base):
+            db = SessionLocal()
+            try:
+                ejecutar_accion(db, base, "573000000000", {"accion": "crear_jugador",
+                                                           "datos": {"nombre": nombre(base, i), "categoria": "General"}})
+            finally:
+                db.close()
+    _, s_base, q_base = medir(contador, uno_por_uno)
+    print(f"crear_jugador de a uno:  {args.base / s_base:8,.0f} jugadores/s · {q_base / args.base:.1f} sentencias "
+          f"por jugador -> {n_jugadores} jugadores ≈ {n_jugadores / args.base * s_base:.1f}s")
+
+    # 2. Importación
+    def importar_archivo(tipo, ruta, replay=False, lote=args.lote):
+        with abrir(ruta) as archivo:
+            formato = "ndjson" if ".ndjson" in ruta else "csv"
+            return importar(tipo, leer_filas(archivo, formato), lote=lote, replay=replay)
+    rj, s_j, q_j = medir(contador, lambda: importar_archivo("jugadores", ruta_jugadores))
+    print(f"importar jugadores:      {n_jugadores / s_j:8,.0f} filas/s · {s_j:.2f}s · {q_j} sentencias "
+          f"({q_j / max(1, rj['lotes']):.1f} por lote)")
+    rp, s_p, q_p = medir(contador, lambda: importar_archivo("partidos", ruta_partidos, replay=True))
+    replay = rp.get("replay", {})
+    print(f"importar partidos:       {n_partidos / s_p:8,.0f} filas/s · {s_p:.2f}s (replay {replay.get('segundos_total')}s)"
+          f" · {q_p} sentencias · {rp['jugadores_creados']} jugadores nuevos")
+    for r in (rj, rp):
+        if r["errores"] or r["sin_club"]:
+            errores.append(f"{r['tipo']}: {r['errores']} errores, {r['sin_club']} sin club {r['mensajes_error'][:3]}")
+    if rj["creados"] != n_jugadores:
+        errores.append(f"jugadores creados {rj['creados']} != {n_jugadores}")
+
+    db = SessionLocal()
+    en_bd = db.query(func.count(Match.id)).scalar()
+    victorias, derrotas = db.query(func.sum(Player.wins), func.sum(Player.losses)).filter(Player.club_id <= args.clubes).one()
+    db.close()
+    if rp["creados"] + rp["omitidos"] != n_partidos or en_bd != rp["creados"]:
+        errores.append(f"partidos: {rp['creados']} creados + {rp['omitidos']} omitidos, {en_bd} en la BD")
+    if victorias != en_bd or derrotas != en_bd:
+        errores.append(f"replay: {victorias} victorias / {derrotas} derrotas para {en_bd} partidos")
+
+    # 3. Reimportar: idempotente y con memoria acotada
+    ruta_chica = os.path.join(carpeta, "dos_lotes.ndjson.gz")
+    with gzip.open(ruta_partidos, "rt", encoding="utf-8") as origen, gzip.open(ruta_chica, "wt", encoding="utf-8") as f:
+        for _, linea in zip(range(2 * args.lote), origen):
+            f.write(linea)
+    (rc, s_r, q_r), pico = con_pico(lambda: medir(contador, lambda: importar_archivo("partidos", ruta_partidos)))
+    _, pico_chico = con_pico(lambda: importar_archivo("partidos", ruta_chica))
+    print(f"reimportar partidos:     {n_partidos / s_r:8,.0f} filas/s (con tracemalloc) · {rc['creados']} creados · "
+          f"pico {pico / 2**20:.1f} MB (2 lotes: {pico_chico / 2**20:.1f} MB)")
+    if rc["creados"] or rc["jugadores_creados"]:
+        errores.append(f"reimportar creó {rc['creados']} partidos y {rc['jugadores_creados']} jugadores")
+    if pico > 2 * pico_chico:
+        errores.append(f"la memoria crece con el archivo: {pico / 2**20:.1f} MB vs {pico_chico / 2**20:.1f} MB")
+
+    # 4. Exportar en streaming y reimportar por HTTP
+    def exportar_todo():
+        lineas = 0
+        for trozo in exportar("partidos", formato="csv", pagina=args.lote):
+            lineas += trozo.count("\n")
+        return lineas - 1   # encabezado
+    (exportadas, s_e), pico_e = con_pico(lambda: medir(contador, exportar_todo)[:2])
+    print(f"exportar partidos:       {exportadas / s_e:8,.0f} filas/s (con tracemalloc) · pico {pico_e / 2**20:.1f} MB")
+    if exportadas != en_bd:
+        errores.append(f"exportadas {exportadas} filas de {en_bd}")
+
+    from fastapi.testclient import TestClient
+    import main as servidor
+    with TestClient(servidor.app) as cliente:
+        sin_token = cliente.post("/club/1/importar/partidos?formato=ndjson", content=b"").status_code
+        if sin_token != 401:
+            errores.append(f"importar sin token respondió {sin_token}")
+        cliente.headers["authorization"] = "Bearer bench"
+        respuesta = cliente.get("/club/1/exportar/partidos?formato=ndjson")
+        cuerpo = respuesta.content
+        trozos = (cuerpo[i:i + 64 * 1024] for i in range(0, len(cuerpo), 64 * 1024))
+        t0 = time.perf_counter()
+        r = cliente.post("/club/1/importar/partidos?formato=ndjson", content=trozos).json()
+        s_h = time.perf_counter() - t0
+    del_club = cuerpo.count(b"\n")
+    print(f"HTTP club 1:             exporta {del_club} partidos, reimporta {r.get('filas')} en {s_h:.2f}s · "
+          f"{r.get('creados')} creados")
+    if r.get("filas") != del_club or r.get("creados") or r.get("errores"):
+        errores.append(f"reimportar por HTTP: {r}")
+
+    for e in errores[:10]:
+        print(f"❌ {e}")
+    if errores:
+        sys.exit(1)
+    print(f"✅ {args.filas} filas importadas en {s_j + s_p:.1f}s sin errores; reimportar no duplica y la memoria "
+          f"no crece con el archivo")
+
+
+if __name__ == "__main__":
+    main()
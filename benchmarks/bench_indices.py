@@ -0,0 +1,159 @@
+"""
+Latencia de las consultas calientes con y sin los índices compuestos (migración 0003).
+
+    python benchmarks/bench_indices.py --clubes 1000 --jugadores 100 [--database-url postgresql://...]
+
+Siembra --clubes clubes con --jugadores cada uno (100k por defecto), un torneo
+activo y algunos terminados por club y partidos de torneo. Mide p50/p99 de
+cada consulta:
+  1. Sin los índices de la 0003 (como estaban las BDs antes).
+  2. Después de aplicar _0003_indices_compuestos.
+Imprime el plan (EXPLAIN QUERY PLAN / EXPLAIN) de cada consulta con índices.
+Sale con código 1 si alguna consulta sigue haciendo un recorrido completo.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+import utils  # agrega la raíz del repo al sys.path
+
+INDICES = ["ix_players_club_elo", "ix_players_club_nombre", "ix_players_club_nombre_lower", "ix_players_owner",
+           "ix_tournaments_club_status", "ix_matches_torneo_terminado", "ix_matches_jugadores",
+           "ix_matches_ganador_fecha"]
+
+# (nombre, sql, generador de parámetros) — las mismas formas que arma el ORM
+CONSULTAS = [
+    ("torneo activo del club",
+     "SELECT id, name FROM tournaments WHERE club_id = :club AND status = 'inscription' LIMIT 1",
+     lambda r, a: {"club": r.randint(1, a.clubes)}),
+    ("ranking del club",
+     "SELECT id, name, elo FROM players WHERE club_id = :club ORDER BY elo DESC",
+     lambda r, a: {"club": r.randint(1, a.clubes)}),
+    ("jugador por nombre (lower)",
+     "SELECT id FROM players WHERE club_id = :club AND lower(name) = :nombre LIMIT 1",
+     lambda r, a: {"club": r.randint(1, a.clubes), "nombre": f"jugador {r.randrange(a.jugadores)}"}),
+    ("jugadores de un celular",
+     "SELECT id, name FROM players WHERE owner_id = :dueno",
+     lambda r, a: {"dueno": r.randint(1, a.clubes)}),
+    ("cuadros del torneo",
+     "SELECT id, player_1_id, player_2_id FROM matches WHERE tournament_id = :torneo AND is_finished = :terminado",
+     lambda r, a: {"torneo": r.randint(1, a.clubes * 3), "terminado": False}),
+    ("partido entre dos jugadores",
+     "SELECT id FROM matches WHERE player_1_id = :a AND player_2_id = :b",
+     lambda r, a: (lambda p: {"a": p, "b": p + 1})(r.randrange(1, a.clubes * a.jugadores, 2))),
+    ("amistosos recientes del ganador",
+     "SELECT id FROM matches WHERE winner_id = :g AND timestamp >= :desde",
+     lambda r, a: {"g": r.randint(1, a.clubes * a.jugadores), "desde": datetime(2000, 1, 1)}),
+]
+
+
+def sembrar(engine, args):
+    from sqlalchemy import insert
+    from models import Club, Player, Tournament, Match, WhatsAppUser
+    azar = random.Random(7)
+    ahora = datetime.utcnow()
+    with engine.begin() as con:
+        con.execute(insert(WhatsAppUser), [{"id": c, "phone_number": f"57300{c:07d}"} for c in range(1, args.clubes + 1)])
+        con.execute(insert(Club), [{"id": c, "name": f"Club {c}", "admin_phone": f"57100{c:07d}"}
+                                   for c in range(1, args.clubes + 1)])
+        jugadores = [{"id": (c - 1) * args.jugadores + j + 1, "name": f"Jugador {j}", "club_id": c, "owner_id": c,
+                      "elo": azar.randint(900, 2000), "category": "General", "wins": 0, "losses": 0}
+                     for c in range(1, args.clubes + 1) for j in range(args.jugadores)]
+        for i in range(0, len(jugadores), 10000):
+            con.execute(insert(Player), jugadores[i:i + 10000])
+        # Por club: dos torneos terminados y uno en inscripción
+        con.execute(insert(Tournament), [{"id": (c - 1) * 3 + k + 1, "name": f"Copa {k}", "club_id": c,
+                                          "status": "inscription" if k == 2 else "finished", "smart_data": {}}
+                                         for c in range(1, args.clubes + 1) for k in range(3)])
+        partidos = [{"player_1_id": p, "player_2_id": p + 1, "winner_id": p, "score": "3-1", "timestamp": ahora,
+                     "is_finished": True, "version": 0, "tournament_id": ((p - 1) // args.jugadores) * 3 + 1}
+                    for p in range(1, args.clubes * args.jugadores, 2)]
+        for i in range(0, len(partidos), 10000):
+            con.execute(insert(Match), partidos[i:i + 10000])
+
+
+def medir(engine, args):
+    from sqlalchemy import text
+    azar = random.Random(11)
+    salida = {}
+    with engine.connect() as con:
+        for nombre, sql, parametros in CONSULTAS:
+            tiempos = []
+            for _ in range(args.repeticiones):
+                t0 = time.perf_counter()
+                con.execute(text(sql), parametros(azar, args)).fetchall()
+                tiempos.append((time.perf_counter() - t0) * 1000)
+            salida[nombre] = (utils.percentil(tiempos, 50), utils.percentil(tiempos, 99))
+    return salida
+
+
+def planes(engine, args):
+    from sqlalchemy import text
+    azar = random.Random(13)
+    prefijo = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    salida = {}
+    with engine.connect() as con:
+        for nombre, sql, parametros in CONSULTAS:
+            filas = con.execute(text(prefijo + sql), parametros(azar, args)).fetchall()
+            salida[nombre] = [str(fila[-1]) for fila in filas]
+    return salida
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clubes", type=int, default=1000)
+    parser.add_argument("--jugadores", type=int, default=100)
+    parser.add_argument("--repeticiones", type=int, default=300)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'indices.db')}"
+    from sqlalchemy import text
+    from database import engine
+    from models import Base
+    from migrations import aplicar_migraciones, _0003_indices_compuestos
+
+    Base.metadata.drop_all(bind=engine)
+    aplicar_migraciones(engine)
+    t0 = time.perf_counter()
+    sembrar(engine, args)
+    print(f"🌱 {args.clubes} clubes x {args.jugadores} jugadores sembrados en {time.perf_counter() - t0:.1f}s")
+
+    # 1. Sin los índices de la 0003
+    with engine.begin() as con:
+        for indice in INDICES:
+            con.execute(text(f"DROP INDEX IF EXISTS {indice}"))
+        con.execute(text("ANALYZE"))
+    sin = medir(engine, args)
+
+    # 2. Con los índices (la misma migración que corre en producción)
+    with engine.begin() as con:
+        _0003_indices_compuestos(con)
+        con.execute(text("ANALYZE"))
+    con_indices = medir(engine, args)
+    plan = planes(engine, args)
+
+    completos = 0
+    print(f"\n{'consulta':<34}{'p50 sin':>10}{'p99 sin':>10}{'p50 con':>10}{'p99 con':>10}  (ms)")
+    for nombre, _, _ in CONSULTAS:
+        (p50_sin, p99_sin), (p50_con, p99_con) = sin[nombre], con_indices[nombre]
+        print(f"{nombre:<34}{p50_sin:>10.3f}{p99_sin:>10.3f}{p50_con:>10.3f}{p99_con:>10.3f}")
+    print("\n🔎 Planes con índices:")
+    for nombre, lineas in plan.items():
+        recorrido = any(l.startswith("SCAN ") and " USING " not in l for l in lineas) \
+            or any("Seq Scan" in l for l in lineas)
+        completos += recorrido
+        print(f"  {'❌' if recorrido else '✅'} {nombre}")
+        for linea in lineas:
+            print(f"       {linea}")
+    if completos:
+        print(f"❌ {completos} consultas siguen recorriendo la tabla completa")
+        sys.exit(1)
+    print("✅ Todas las consultas calientes usan índice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Inscripciones concurrentes: ¿se pierde alguna?
+
+    python benchmarks/bench_inscripciones.py --jugadores 200 --hilos 16 [--database-url postgresql://...]
+
+Inscribe --jugadores en el mismo torneo desde --hilos a la vez, dos veces
+cada uno (como los reintentos de Meta):
+  1. Con el método antiguo (copiar smart_data["inscritos"], agregar, reescribir).
+  2. Con ejecutar_accion -> enrollments.inscribir (INSERT ... ON CONFLICT).
+Sale con código 1 si el método nuevo pierde o duplica alguna inscripción.
+"""
+import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import utils  # agrega la raíz del repo al sys.path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jugadores", type=int, default=200)
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'inscripciones.db')}"
+    from sqlalchemy.orm.attributes import flag_modified
+    from database import engine, SessionLocal
+    from models import Base, Club, Player, Tournament, Enrollment
+    from migrations import aplicar_migraciones
+    from actions import ejecutar_accion
+
+    Base.metadata.drop_all(bind=engine)
+    aplicar_migraciones(engine)
+    db = SessionLocal()
+    club = Club(name="Club Inscripciones", admin_phone="570001")
+    db.add(club); db.flush()
+    db.add_all([Player(name=f"Jugador {i}", club_id=club.id) for i in range(args.jugadores)])
+    viejo = Tournament(name="Copa Blob", club_id=club.id, status="finished", smart_data={"inscritos": []})
+    db.add(viejo); db.flush()
+    nuevo = Tournament(name="Copa Tabla", club_id=club.id, status="inscription", smart_data={})
+    db.add(nuevo); db.commit()
+    club_id, viejo_id, nuevo_id = club.id, viejo.id, nuevo.id
+    ids = [p.id for p in db.query(Player).filter(Player.club_id == club_id)]
+    db.close()
+
+    # 1. Como se hacía antes (copiado de actions.py antes del cambio)
+    def inscribir_blob(player_id):
+        sesion = SessionLocal()
+        try:
+            torneo = sesion.get(Tournament, viejo_id)
+            sesion.refresh(torneo)
+            datos = dict(torneo.smart_data) if torneo.smart_data else {"inscritos": []}
+            lista = list(datos.get("inscritos", []))
+            if player_id not in lista:
+                lista.append(player_id)
+                datos["inscritos"] = lista
+                torneo.smart_data = datos
+                flag_modified(torneo, "smart_data")
+                sesion.commit()
+        except Exception:
+            sesion.rollback()
+        finally:
+            sesion.close()
+
+    # 2. Como se hace ahora (por la misma puerta que un mensaje de WhatsApp)
+    def inscribir_tabla(i):
+        sesion = SessionLocal()
+        try:
+            decision = {"accion": "inscribir_en_torneo", "datos": {"nombre_jugador": f"Jugador {i}"}}
+            return ejecutar_accion(sesion, club_id, "570001", decision)[0]
+        finally:
+            sesion.close()
+
+    trabajos = list(range(args.jugadores)) * 2
+    with ThreadPoolExecutor(args.hilos) as pool:
+        t0 = time.perf_counter()
+        list(pool.map(inscribir_blob, [ids[i] for i in trabajos]))
+        t_blob = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        respuestas = list(pool.map(inscribir_tabla, trabajos))
+        t_tabla = time.perf_counter() - t0
+
+    db = SessionLocal()
+    en_blob = len(set(db.get(Tournament, viejo_id).smart_data.get("inscritos", [])))
+    en_tabla = db.query(Enrollment).filter(Enrollment.tournament_id == nuevo_id).count()
+    db.close()
+    nuevas = sum(r.startswith("✅") for r in respuestas)
+
+    print(f"\n📝 {args.jugadores} jugadores x2 (reintentos), {args.hilos} hilos")
+    print(f"{'método':<22}{'inscritos':>10}{'perdidos':>10}{'segundos':>10}")
+    print(f"{'blob smart_data':<22}{en_blob:>10}{args.jugadores - en_blob:>10}{t_blob:>10.2f}")
+    print(f"{'tabla enrollments':<22}{en_tabla:>10}{args.jugadores - en_tabla:>10}{t_tabla:>10.2f}")
+    print(f"Respuestas '✅ inscrito': {nuevas} (deben ser exactamente {args.jugadores})")
+    ok = en_tabla == args.jugadores and nuevas == args.jugadores
+    print("✅ Ninguna inscripción perdida ni duplicada" if ok else "❌ La tabla perdió o duplicó inscripciones")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
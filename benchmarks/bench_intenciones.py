@@ -0,0 +1,63 @@
+"""
+Regresión + benchmark de la vía rápida de intenciones (intent_classifier).
+
+    python benchmarks/bench_intenciones.py [--repeticiones 2000] [--latencia-llm 1200]
+
+Cada línea de corpus_intenciones.jsonl trae el texto, el rol, si hay
+inscripción abierta y lo esperado: {"accion", "datos"} o null si el mensaje
+DEBE ir a la IA. Sale con código 1 si algo no coincide.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import utils  # agrega la raíz del repo al sys.path
+from intent_classifier import clasificar
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_intenciones.jsonl")
+
+def cargar_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+def coincide(esperado, decision):
+    if esperado is None:
+        return decision is None
+    if decision is None or decision["accion"] != esperado["accion"]:
+        return False
+    # Para "chat" solo importa la acción (el texto de respuesta es libre)
+    return esperado["accion"] == "chat" or decision["datos"] == esperado["datos"]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    parser.add_argument("--latencia-llm", type=float, default=1200, help="ms de una llamada típica a la IA")
+    args = parser.parse_args()
+
+    corpus = cargar_corpus()
+    errores = 0
+    for caso in corpus:
+        decision = clasificar(caso["texto"], caso["rol"], caso["inscripcion_abierta"])
+        if not coincide(caso["esperado"], decision):
+            errores += 1
+            print(f"❌ {caso['texto']!r}: esperado {caso['esperado']}, obtenido {decision}")
+
+    t0 = time.perf_counter()
+    aciertos = 0
+    for _ in range(args.repeticiones):
+        for caso in corpus:
+            if clasificar(caso["texto"], caso["rol"], caso["inscripcion_abierta"]) is not None:
+                aciertos += 1
+    total = args.repeticiones * len(corpus)
+    segundos = time.perf_counter() - t0
+
+    tasa = aciertos / total
+    print(f"Corpus: {len(corpus)} mensajes, {errores} errores")
+    print(f"Tasa de aciertos (sin IA): {tasa:.1%}")
+    print(f"Latencia local: {segundos / total * 1e6:.1f} µs/mensaje")
+    print(f"Ahorro estimado: {tasa * args.latencia_llm:.0f} ms por mensaje (IA a {args.latencia_llm:.0f} ms)")
+    sys.exit(1 if errores else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Tabla de posiciones en memoria contra ORDER BY en la BD.
+
+    python benchmarks/bench_leaderboard.py --jugadores 10000 --partidos 300
+
+1. Siembra un club con --jugadores repartidos en 4 categorías y levanta la
+   app real (uvicorn + SQLite temporal).
+2. Registra --partidos resultados por POST /club/{id}/resultados (los deltas
+   mantienen la tabla) y compara /club/{id}/ranking y /ranking/{jugador}
+   (todas las páginas, por categoría y con "alrededor") con ORDER BY elo DESC
+   en la BD. Sale con código 1 si algo no cuadra.
+3. Mide p50/p99 de: puesto de un jugador (COUNT en SQL contra bisect), una
+   página del top (ORDER BY ... OFFSET contra slice) y aplicar un partido
+   (reordenar todo contra mover dos jugadores).
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import utils  # agrega la raíz del repo al sys.path
+
+CATEGORIAS = ["Primera", "Segunda", "Damas", "Senior"]
+
+
+def sembrar(args):
+    from sqlalchemy import insert
+    from database import engine, SessionLocal
+    from models import Club, Player
+    from migrations import aplicar_migraciones
+    aplicar_migraciones(engine)
+    azar = random.Random(3)
+    db = SessionLocal()
+    club = Club(name="Club Ranking", admin_phone="570009")
+    db.add(club); db.commit()
+    club_id = club.id
+    db.execute(insert(Player), [{"name": f"Jugador {i}", "club_id": club_id, "elo": azar.randint(900, 1800),
+                                 "category": CATEGORIAS[i % 4], "wins": 0, "losses": 0}
+                                for i in range(args.jugadores)])
+    db.commit(); db.close()
+    return club_id
+
+
+def ranking_sql(db, club_id, categoria=None):
+    from models import Player
+    q = db.query(Player.id, Player.name, Player.elo, Player.category).filter(Player.club_id == club_id)
+    if categoria:
+        q = q.filter(Player.category == categoria)
+    return [tuple(f) for f in q.order_by(Player.elo.desc(), Player.id)]
+
+
+async def verificar(args, base, club_id):
+    import httpx
+    from database import SessionLocal
+    azar = random.Random(5)
+    errores = 0
+    async with httpx.AsyncClient(timeout=60) as http:
+        await http.get(f"{base}/club/{club_id}/ranking")   # cargar la tabla antes de los partidos
+        for _ in range(args.partidos):
+            a, b = azar.sample(range(args.jugadores), 2)
+            r = await http.post(f"{base}/club/{club_id}/resultados",
+                                json={"resultados": [{"ganador": f"Jugador {a}", "perdedor": f"Jugador {b}",
+                                                      "score": f"3-{azar.randint(0, 2)}"}]})
+            assert r.json()["resultados"][0]["estado"] in ("registrado", "duplicado"), r.text
+        await asyncio.sleep(0.5)   # que lleguen los últimos deltas
+
+        db = SessionLocal()
+        for categoria in [None] + CATEGORIAS:
+            esperado = ranking_sql(db, club_id, categoria)
+            obtenido, pagina = [], 1
+            while True:
+                params = {"pagina": pagina, "por_pagina": 200, **({"categoria": categoria} if categoria else {})}
+                datos = (await http.get(f"{base}/club/{club_id}/ranking", params=params)).json()
+                obtenido += [(j["id"], j["name"], j["elo"], j["category"]) for j in datos["jugadores"]]
+                if pagina >= datos["paginas"]:
+                    break
+                pagina += 1
+            if obtenido != esperado:
+                errores += 1
+                print(f"❌ Ranking {categoria or 'general'} no coincide con la BD")
+            for _ in range(20):
+                i = azar.randrange(len(esperado))
+                params = {"radio": 3, **({"categoria": categoria} if categoria else {})}
+                datos = (await http.get(f"{base}/club/{club_id}/ranking/{esperado[i][0]}", params=params)).json()
+                vecinos = [j["id"] for j in datos["alrededor"]]
+                if datos["puesto"] != i + 1 or vecinos != [f[0] for f in esperado[max(0, i - 3):i + 4]]:
+                    errores += 1
+                    print(f"❌ Puesto de {esperado[i][0]} ({categoria or 'general'}): {datos['puesto']} != {i + 1}")
+        db.close()
+    return errores
+
+
+def medir(args, club_id):
+    from sqlalchemy import func
+    from database import SessionLocal
+    from models import Player
+    from leaderboard import Tabla
+    azar = random.Random(9)
+    db = SessionLocal()
+    filas = ranking_sql(db, club_id)
+    tabla = Tabla()
+    for pid, nombre, elo, categoria in filas:
+        tabla.agregar(pid, nombre, elo, categoria)
+    ids = [f[0] for f in filas]
+    elos = {f[0]: f[2] for f in filas}
+    tiempos = {k: [] for k in ("puesto_sql", "puesto_tabla", "pagina_sql", "pagina_tabla",
+                               "partido_reordenar", "partido_tabla")}
+
+    def cronometrar(clave, fn):
+        t0 = time.perf_counter()
+        fn()
+        tiempos[clave].append((time.perf_counter() - t0) * 1000)
+
+    for _ in range(200):
+        pid = azar.choice(ids)
+        desde = azar.randrange(0, len(ids), 50)
+        cronometrar("puesto_sql", lambda: db.query(func.count(Player.id)).filter(
+            Player.club_id == club_id, (Player.elo > elos[pid]) | ((Player.elo == elos[pid]) & (Player.id < pid))).scalar())
+        cronometrar("puesto_tabla", lambda: tabla.puesto(pid))
+        cronometrar("pagina_sql", lambda: db.query(Player.id, Player.name, Player.elo).filter(
+            Player.club_id == club_id).order_by(Player.elo.desc(), Player.id).offset(desde).limit(50).all())
+        cronometrar("pagina_tabla", lambda: tabla.pagina(desde, 50))
+        a, b = azar.sample(ids, 2)
+        elos[a] += 10; elos[b] -= 10
+        # Antes (club_context._reordenar): ordenar todo y rehacer el dict de puestos
+        cronometrar("partido_reordenar", lambda: {pid: i + 1 for i, (_, pid) in
+                                                  enumerate(sorted((-e, p) for p, e in elos.items()))})
+        cronometrar("partido_tabla", lambda: (tabla.mover(a, elos[a]), tabla.mover(b, elos[b])))
+    db.close()
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jugadores", type=int, default=10000)
+    parser.add_argument("--partidos", type=int, default=300)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'leaderboard.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["WS_PING_INTERVALO"] = "0"
+    os.chdir(utils.RAIZ)
+    club_id = sembrar(args)
+    import main as app_main
+    base = utils.levantar_servidor(app_main.app)
+
+    errores = asyncio.run(verificar(args, base, club_id))
+    tiempos = medir(args, club_id)
+
+    print(f"\n🏆 {args.jugadores} jugadores, {args.partidos} partidos por la API")
+    print(f"{'operación':<22}{'p50 BD/antes':>14}{'p99':>9}{'p50 tabla':>12}{'p99':>9}  (ms)")
+    for nombre, antes, ahora in [("puesto de un jugador", "puesto_sql", "puesto_tabla"),
+                                 ("página de 50", "pagina_sql", "pagina_tabla"),
+                                 ("aplicar un partido", "partido_reordenar", "partido_tabla")]:
+        print(f"{nombre:<22}{utils.percentil(tiempos[antes], 50):>14.3f}{utils.percentil(tiempos[antes], 99):>9.3f}"
+              f"{utils.percentil(tiempos[ahora], 50):>12.4f}{utils.percentil(tiempos[ahora], 99):>9.4f}")
+    if errores:
+        print(f"❌ {errores} diferencias entre la tabla y la BD")
+        sys.exit(1)
+    print("✅ Ranking, puestos y vecinos coinciden con ORDER BY en la BD")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark del camino de salida (Graph API + OpenAI) contra fake_servers.py.
+
+    python benchmarks/bench_outbound.py --mensajes 2000 --latencia 50 --rate429 0.02
+"""
+import os
+import time
+import asyncio
+import argparse
+from utils import levantar_servidor, percentil
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensajes", type=int, default=1000)
+    parser.add_argument("--latencia", type=float, default=50, help="ms por petición en el servidor falso")
+    parser.add_argument("--rate429", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Configurar el servidor falso ANTES de importarlo
+    os.environ["FAKE_LATENCY_MS"] = str(args.latencia)
+    os.environ["FAKE_429_RATE"] = str(args.rate429)
+    os.environ["FAKE_RETRY_AFTER"] = "0.2"
+    import fake_servers
+    url = levantar_servidor(fake_servers.app)
+
+    os.environ["GRAPH_API_URL"] = url
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ.setdefault("PHONE_NUMBER_ID", "123")
+    import http_transport
+    import whatsapp_service
+    import ai_service
+
+    async def correr():
+        # 1. Envíos masivos por la cola
+        t0 = time.perf_counter()
+        await whatsapp_service.cola_envios.notificar((f"57300{i:05d}", "Hola") for i in range(args.mensajes))
+        await whatsapp_service.cola_envios.esperar()
+        t_envios = time.perf_counter() - t0
+
+        # 2. Consultas a la "IA" concurrentes
+        latencias = []
+        async def una(i):
+            t = time.perf_counter()
+            await ai_service.consultar_alejandro(f"mensaje {i}", "contexto", "JUGADOR")
+            latencias.append(time.perf_counter() - t)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(una(i) for i in range(args.mensajes)))
+        t_ia = time.perf_counter() - t0
+
+        await whatsapp_service.cola_envios.stop()
+        await http_transport.cerrar_clientes()
+        return t_envios, t_ia, latencias
+
+    t_envios, t_ia, latencias = asyncio.run(correr())
+    print(f"WhatsApp: {args.mensajes} envíos en {t_envios:.2f}s -> {args.mensajes / t_envios:.0f} msg/s")
+    print(f"OpenAI:   {args.mensajes} consultas en {t_ia:.2f}s -> {args.mensajes / t_ia:.0f} req/s "
+          f"(p50 {percentil(latencias, 50)*1000:.0f}ms, p99 {percentil(latencias, 99)*1000:.0f}ms)")
+    print(f"Transporte: {http_transport.metricas()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+TVs consultando /club/{id} una y otra vez: peticiones por segundo y bytes.
+
+    python benchmarks/bench_paginas.py --tvs 20 --segundos 5 --jugadores 200
+
+Levanta main:app en un proceso aparte (uvicorn, SQLite temporal) con una
+ruta extra que renderiza como antes (TemplateResponse en cada petición) y
+mide, con --tvs clientes a la vez:
+  1. antes: render de Jinja en cada petición, sin comprimir
+  2. caché: página ya renderizada y comprimida (gzip/br)
+  3. 304: la TV manda If-None-Match y no cambió nada
+Al final registra un resultado y comprueba que el ETag cambia (la caché no
+sirve una página vieja). Sale con código 1 si no cambia.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import utils  # agrega la raíz del repo al sys.path
+
+
+def servidor(puerto):
+    # Corre en el subproceso: la app real + la ruta de antes para comparar
+    import uvicorn
+    import main
+    from fastapi import Request
+
+    @main.app.get("/bench/antes/{club_id}")
+    async def ver_club_antes(request: Request, club_id: int):
+        # Copia de ver_club antes de la caché de páginas
+        estado = await main._vista(club_id)
+        return main.templates.TemplateResponse(request, "ranking.html", {
+            "jugadores": estado["jugadores"], "partidos": estado["partidos"],
+            "titulo": estado["titulo"], "modo": estado["modo"], "club_id": club_id, "estado": estado
+        })
+
+    uvicorn.run(main.app, host="127.0.0.1", port=puerto, log_level="warning")
+
+
+async def martillar(puerto, ruta, tvs, segundos, cabeceras):
+    # Cliente HTTP/1.1 mínimo con keep-alive: httpx sería el cuello de botella
+    extra = "".join(f"{k}: {v}\r\n" for k, v in cabeceras.items())
+    peticion = f"GET {ruta} HTTP/1.1\r\nhost: 127.0.0.1\r\n{extra}\r\n".encode()
+    estados, bytes_red = {}, 0
+    fin = time.perf_counter() + segundos
+
+    async def tv():
+        nonlocal bytes_red
+        reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+        hechas = 0
+        while time.perf_counter() < fin:
+            writer.write(peticion)
+            cabecera = await reader.readuntil(b"\r\n\r\n")
+            estado = int(cabecera.split(b" ", 2)[1])
+            largo = 0
+            for linea in cabecera.split(b"\r\n"):
+                if linea.lower().startswith(b"content-length:"):
+                    largo = int(linea.split(b":")[1])
+            await reader.readexactly(largo)
+            bytes_red += largo
+            estados[estado] = estados.get(estado, 0) + 1
+            hechas += 1
+        writer.close()
+        return hechas
+
+    total = sum(await asyncio.gather(*[tv() for _ in range(tvs)]))
+    return total / segundos, bytes_red / max(total, 1), estados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tvs", type=int, default=20)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--jugadores", type=int, default=200)
+    parser.add_argument("--servidor", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.servidor:
+        return servidor(args.servidor)
+
+    import httpx
+    carpeta = tempfile.mkdtemp()
+    entorno = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(carpeta, 'paginas.db')}",
+                   OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "fake"), WS_PING_INTERVALO="0",
+                   JINJA_CACHE_DIR=os.path.join(carpeta, "jinja"))
+    os.environ["DATABASE_URL"] = entorno["DATABASE_URL"]
+    from database import engine, SessionLocal
+    from models import Club, Player
+    from migrations import aplicar_migraciones
+    aplicar_migraciones(engine)
+    db = SessionLocal()
+    club = Club(id=1, name="Club Demo", admin_phone="573152405542")
+    db.add(club); db.flush()
+    db.add_all([Player(name=f"Jugador {i}", club_id=1, elo=1000 + i * 3, category="General")
+                for i in range(args.jugadores)])
+    db.commit(); db.close()
+
+    puerto = utils.puerto_libre()
+    proceso = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--servidor", str(puerto)],
+                               cwd=utils.RAIZ, env=entorno)
+    base = f"http://127.0.0.1:{puerto}"
+    try:
+        limite = time.time() + 20
+        while True:
+            try:
+                # El ETag depende de la codificación: se pide con la misma del caso 304
+                etag = httpx.get(f"{base}/club/1", headers={"accept-encoding": "br, gzip"}).headers["etag"]
+                break
+            except httpx.HTTPError:
+                if time.time() > limite:
+                    raise
+                time.sleep(0.1)
+
+        casos = [("antes (render siempre)", "/bench/antes/1", {"accept-encoding": "identity"}),
+                 ("caché, gzip", "/club/1", {"accept-encoding": "gzip"}),
+                 ("caché, br", "/club/1", {"accept-encoding": "br, gzip"}),
+                 ("304 (If-None-Match)", "/club/1", {"accept-encoding": "br, gzip", "if-none-match": etag})]
+        print(f"\n📺 {args.tvs} TVs durante {args.segundos}s, club con {args.jugadores} jugadores")
+        print(f"{'modo':<26}{'req/s':>9}{'bytes/resp':>11}  estados")
+        for nombre, ruta, cabeceras in casos:
+            rps, tam, estados = asyncio.run(martillar(puerto, ruta, args.tvs, args.segundos, cabeceras))
+            print(f"{nombre:<26}{rps:>9.0f}{tam:>11.0f}  {estados}")
+
+        # Un cambio en el club tiene que cambiar el ETag
+        httpx.post(f"{base}/club/1/resultados", json={"resultados": [
+            {"ganador": "Jugador 0", "perdedor": "Jugador 1", "score": "3-0"}]})
+        time.sleep(0.3)
+        r = httpx.get(f"{base}/club/1", headers={"accept-encoding": "br, gzip", "if-none-match": etag})
+        metricas = httpx.get(f"{base}/debug/cola").json()["paginas"]
+        print(f"Caché: {metricas}")
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+    if r.status_code != 200 or r.headers["etag"] == etag:
+        print("❌ Tras un resultado la página siguió con el mismo ETag")
+        sys.exit(1)
+    print("✅ Tras un resultado el ETag cambió y la TV recibió la página nueva")
+
+
+if __name__ == "__main__":
+    main()
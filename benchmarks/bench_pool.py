@@ -0,0 +1,120 @@
+"""
+Escrituras del webhook + lecturas de las TVs a la vez, con la configuración
+vieja del motor y con la nueva.
+
+    python benchmarks/bench_pool.py --hilos 24 --segundos 5
+
+Cada configuración corre en su propio proceso (database.py se configura al
+importarse) sobre una BD SQLite nueva:
+  - antes: journal DELETE, synchronous FULL, sin busy_timeout, pool 5+10
+  - ahora: los valores por defecto de database.py (WAL, NORMAL, busy_timeout, pool 10+10)
+La mitad de los hilos guarda mensajes entrantes (registrar_entrada, como el
+webhook) y la otra mitad calcula la vista del club. Reporta operaciones por
+segundo, errores "database is locked", p99 y el pico de conexiones del pool.
+Sale con código 1 si la configuración nueva tuvo algún error.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import utils  # agrega la raíz del repo al sys.path
+
+CONFIGURACIONES = {
+    "antes": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_BUSY_TIMEOUT_MS": "0",
+              "DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10"},
+    "ahora": {},
+}
+
+
+def trabajador(args):
+    # Corre dentro del subproceso, con DATABASE_URL y la configuración ya puestas
+    from database import engine, unidad_de_trabajo, sesion_lectura, metricas_pool
+    from models import Club, Player
+    from migrations import aplicar_migraciones
+    from message_queue import registrar_entrada
+    from live_updates import vista_club
+
+    aplicar_migraciones(engine)
+    with unidad_de_trabajo() as db:
+        club = Club(name="Club Pool", admin_phone="570001")
+        db.add(club); db.flush()
+        db.add_all([Player(name=f"Jugador {i}", club_id=club.id, elo=1200 + i) for i in range(200)])
+        db.flush()
+        club_id = club.id
+
+    fin = time.perf_counter() + args.segundos
+    tiempos = {"escritura": [], "lectura": []}
+    errores = {"escritura": 0, "lectura": 0}
+    lock = threading.Lock()
+
+    def correr(n, tipo):
+        i = 0
+        while time.perf_counter() < fin:
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                if tipo == "escritura":
+                    with unidad_de_trabajo() as db:
+                        registrar_entrada(db, {"id": f"wamid.{n}.{i}", "telefono": "570001", "texto": "hola"})
+                else:
+                    with sesion_lectura() as db:
+                        vista_club(db, club_id)
+                with lock:
+                    tiempos[tipo].append((time.perf_counter() - t0) * 1000)
+            except Exception as e:
+                if "locked" not in str(e):
+                    raise
+                with lock:
+                    errores[tipo] += 1
+
+    hilos = [threading.Thread(target=correr, args=(n, "escritura" if n % 2 == 0 else "lectura"))
+             for n in range(args.hilos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    print(json.dumps({
+        "ops": {t: len(v) / args.segundos for t, v in tiempos.items()},
+        "p99": {t: utils.percentil(v, 99) for t, v in tiempos.items()},
+        "errores": errores,
+        "pool": metricas_pool()["principal"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hilos", type=int, default=24)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--trabajador", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.trabajador:
+        return trabajador(args)
+
+    resultados = {}
+    for nombre, config in CONFIGURACIONES.items():
+        entorno = dict(os.environ, **config,
+                       DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}")
+        salida = subprocess.run([sys.executable, __file__, "--trabajador", "--hilos", str(args.hilos),
+                                 "--segundos", str(args.segundos)],
+                                env=entorno, capture_output=True, text=True, check=True).stdout
+        resultados[nombre] = json.loads(salida.strip().splitlines()[-1])
+
+    print(f"\n🔌 {args.hilos} hilos ({args.hilos // 2} escriben, {args.hilos // 2} leen) durante {args.segundos}s")
+    print(f"{'config':<8}{'escr/s':>9}{'lect/s':>9}{'p99 escr':>10}{'p99 lect':>10}"
+          f"{'locked':>8}{'pico pool':>11}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<8}{r['ops']['escritura']:>9.0f}{r['ops']['lectura']:>9.0f}"
+              f"{r['p99']['escritura']:>10.1f}{r['p99']['lectura']:>10.1f}"
+              f"{sum(r['errores'].values()):>8}{r['pool']['pico_en_uso']:>5}/{r['pool']['capacidad']}")
+    if sum(resultados["ahora"]["errores"].values()):
+        print("❌ La configuración nueva sigue dando 'database is locked'")
+        sys.exit(1)
+    print("✅ Sin 'database is locked' con WAL + busy_timeout")
+
+
+if __name__ == "__main__":
+    main()
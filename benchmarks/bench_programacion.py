@@ -0,0 +1,322 @@
+"""
+Programación de canchas: torneos simultáneos, cientos de partidos, resultados que se adelantan y se atrasan.
+
+    python benchmarks/bench_programacion.py --torneos 6 --jugadores 96 --canchas 6 --resultados 300
+
+1. En memoria (scheduler.planificar): --torneos cuadros de eliminación con
+   consolación que comparten jugadores (un jugador puede estar en varios
+   torneos del club). Mide el tiempo de planificar y verifica la
+   programación: ninguna cancha con dos partidos a la vez, descanso de cada
+   jugador, cada partido después de los partidos de los que salen sus
+   jugadores (+ descanso) y todo dentro del horario del club.
+2. Incremental: juega --resultados partidos cancha por cancha, cada uno
+   terminando antes o después de lo previsto (desvío aleatorio), reprograma
+   después de cada resultado y cuenta cuántos partidos cambian de hora o de
+   cancha (lo que se escribe) frente a reescribir todo lo pendiente.
+3. Con la BD: genera los torneos con la acción generar_cuadros (cada uno se
+   reparte junto con los que ya están en juego), cuenta las sentencias de
+   reprogramar y registra un resultado atrasado por match_engine para ver que
+   solo se reescribe lo que depende de él.
+Sale con código 1 si alguna programación no es válida.
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+import utils  # agrega la raíz del repo al sys.path
+
+
+SENTENCIA = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+AHORA = datetime(2026, 3, 2, 6, 30)   # lunes, antes de abrir
+
+
+# --- FIXTURES ---
+def jugadores_del_torneo(t, jugadores, universo):
+    # Ventanas corridas sobre el mismo universo: los torneos comparten jugadores
+    inicio = (t * jugadores // 2) % universo
+    return [(inicio + i) % universo + 1 for i in range(jugadores)]
+
+def partidos_de_torneos(torneos, jugadores):
+    from brackets import planificar_eliminacion
+    from scheduler import _orden
+    universo = jugadores * 2
+    partidos, siguiente_id = [], 1
+    for t in range(torneos):
+        plan = planificar_eliminacion(jugadores_del_torneo(t, jugadores, universo))
+        ids = {}
+        for clave in plan:
+            ids[clave], siguiente_id = siguiente_id, siguiente_id + 1
+        for clave, f in plan.items():
+            siguiente, perdedor = f["siguiente"] or (None, None), f["perdedor"] or (None, None)
+            partidos.append({"id": ids[clave], "p1": f["player_1_id"], "p2": f["player_2_id"],
+                             "siguiente": ids.get(siguiente[0]), "pos_siguiente": siguiente[1],
+                             "perdedor": ids.get(perdedor[0]), "pos_perdedor": perdedor[1],
+                             "terminado": False, "fin": None, "inicio": None, "cancha": None,
+                             "orden": _orden(t + 1, f["bracket"], f["round"], f["slot"], ids[clave])})
+    return partidos
+
+
+# --- VERIFICAR UNA PROGRAMACIÓN ---
+def verificar(partidos, plan, sede, ahora):
+    """partidos: como los recibe planificar; plan: su salida. Devuelve la lista de errores."""
+    errores = []
+    por_id = {p["id"]: p for p in partidos}
+    intervalos = {}   # match_id -> (inicio, fin, cancha) de lo programado y lo que está en juego
+    for p in partidos:
+        if p["id"] in plan:
+            inicio, cancha = plan[p["id"]]
+            intervalos[p["id"]] = (inicio, inicio + sede.duracion, cancha)
+            if inicio < ahora:
+                errores.append(f"partido {p['id']} programado en el pasado ({inicio})")
+            abre = datetime.combine(inicio.date(), sede.apertura)
+            cierra = datetime.combine(inicio.date(), sede.cierre)
+            if inicio < abre or inicio + sede.duracion > cierra:
+                errores.append(f"partido {p['id']} fuera del horario ({inicio:%d/%m %H:%M})")
+        elif not p["terminado"]:
+            if p["inicio"] is None or p["inicio"] > ahora:
+                errores.append(f"partido {p['id']} quedó sin programar")
+                continue
+            intervalos[p["id"]] = (p["inicio"], max(p["inicio"] + sede.duracion, ahora), p["cancha"])
+
+    # 1. Canchas: sin solapes
+    por_cancha = {}
+    for match_id, (inicio, fin, cancha) in intervalos.items():
+        por_cancha.setdefault(cancha, []).append((inicio, fin, match_id))
+    for cancha, lista in por_cancha.items():
+        lista.sort()
+        for (_, fin, a), (inicio, _, b) in zip(lista, lista[1:]):
+            if inicio < fin:
+                errores.append(f"cancha {cancha}: {a} y {b} se solapan")
+
+    # 2. Jugadores: descanso entre partidos (incluye los terminados)
+    por_jugador = {}
+    for p in partidos:
+        if p["terminado"]:
+            tramo = (p["fin"] - sede.duracion, p["fin"])
+        elif p["id"] in intervalos:
+            tramo = intervalos[p["id"]][:2]
+        else:
+            continue
+        for j in (p["p1"], p["p2"]):
+            if j is not None:
+                por_jugador.setdefault(j, []).append(tramo)
+    for j, tramos in por_jugador.items():
+        tramos.sort()
+        for (_, fin), (inicio, _) in zip(tramos, tramos[1:]):
+            if inicio < fin + sede.descanso and inicio >= ahora:
+                errores.append(f"jugador {j} sin descanso ({fin:%H:%M} -> {inicio:%H:%M})")
+
+    # 3. Cuadro: después de los partidos de los que salen sus jugadores
+    for p in partidos:
+        fin = p["fin"] if p["terminado"] else intervalos.get(p["id"], (None, None))[1]
+        for destino in (p["siguiente"], p["perdedor"]):
+            if destino in plan and fin is not None and plan[destino][0] < fin + sede.descanso:
+                errores.append(f"partido {destino} empieza antes de que termine {p['id']} (+ descanso)")
+            if destino in por_id and fin is None and destino in intervalos:
+                errores.append(f"partido {destino} programado antes que {p['id']}, del que depende")
+    return errores
+
+
+# --- 1. EN MEMORIA ---
+def aplicar(partidos, plan):
+    for p in partidos:
+        if p["id"] in plan:
+            p["inicio"], p["cancha"] = plan[p["id"]]
+
+def jugar_en_memoria(partidos, sede, resultados, azar):
+    from scheduler import planificar
+    por_id = {p["id"]: p for p in partidos}
+    desvio = {p["id"]: timedelta(minutes=azar.randint(-20, 25)) for p in partidos}
+    ahora = AHORA
+    plan = planificar(partidos, sede, ahora)
+    aplicar(partidos, plan)
+    cambios, pendientes, errores, ms = [], [], [], []
+    for _ in range(resultados):
+        # El próximo resultado: de lo que está al frente de cada cancha, lo que termina primero
+        frente = {}
+        for p in partidos:
+            if not p["terminado"] and p["inicio"] is not None and p["p1"] and p["p2"]:
+                if p["cancha"] not in frente or p["inicio"] < frente[p["cancha"]]["inicio"]:
+                    frente[p["cancha"]] = p
+        if not frente:
+            break
+        p = min(frente.values(), key=lambda p: (p["inicio"] + sede.duracion + desvio[p["id"]], p["id"]))
+        ahora = max(ahora, p["inicio"] + sede.duracion + desvio[p["id"]])
+        p["terminado"], p["fin"] = True, ahora
+        for destino, posicion, jugador in ((p["siguiente"], p["pos_siguiente"], p["p1"]),
+                                           (p["perdedor"], p["pos_perdedor"], p["p2"])):
+            if destino:
+                por_id[destino][f"p{posicion}"] = jugador
+
+        t0 = time.perf_counter()
+        nuevo = planificar(partidos, sede, ahora)
+        ms.append((time.perf_counter() - t0) * 1000)
+        errores += verificar(partidos, nuevo, sede, ahora)
+        cambios.append(sum(1 for match_id, hora in nuevo.items()
+                           if (por_id[match_id]["inicio"], por_id[match_id]["cancha"]) != hora))
+        pendientes.append(len(nuevo))
+        aplicar(partidos, nuevo)
+    return cambios, pendientes, errores, ms
+
+
+# --- 3. CON LA BD ---
+class Contador:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, conn, cursor, statement, *args):
+        if SENTENCIA.match(statement):
+            self.total += 1
+
+def registrar_a_las(db, club_id, hora_utc, ganador, perdedor):
+    # registrar_resultado con el reloj de match_engine y scheduler puesto en hora_utc
+    import match_engine
+    import scheduler
+    class Reloj(datetime):
+        @classmethod
+        def utcnow(cls):
+            return hora_utc
+    match_engine.datetime = scheduler.datetime = Reloj
+    try:
+        return match_engine.registrar_resultado(db, club_id, ganador, perdedor, "3-2")
+    finally:
+        match_engine.datetime = scheduler.datetime = datetime
+
+def con_bd(torneos, jugadores, canchas, contador):
+    from sqlalchemy import insert, func
+    from database import SessionLocal
+    from models import Club, Player, Tournament, Enrollment, Match
+    from actions import ejecutar_accion
+    from scheduler import Sede, reprogramar, a_local
+    errores = []
+    db = SessionLocal()
+    club = Club(name="Club Canchas", admin_phone="570000000", courts=canchas)
+    db.add(club); db.flush()
+    club_id = club.id
+    universo = jugadores * 2
+    ids = db.execute(insert(Player).returning(Player.id),
+                     [{"name": f"Jugador {i}", "club_id": club_id, "elo": 3000 - i, "category": "General",
+                       "wins": 0, "losses": 0} for i in range(universo)]).scalars().all()
+    db.commit()
+
+    # 1. Un torneo tras otro: cada generar_cuadros reparte también los que ya están en juego
+    for t in range(torneos):
+        torneo = Tournament(name=f"Copa {t + 1}", club_id=club_id, status="inscription", smart_data={})
+        db.add(torneo); db.flush()
+        db.execute(insert(Enrollment), [{"tournament_id": torneo.id, "player_id": ids[i - 1]}
+                                        for i in jugadores_del_torneo(t, jugadores, universo)])
+        db.commit()
+        texto, _, _ = ejecutar_accion(db, club_id, "570000", {"accion": "generar_cuadros", "datos": {}})
+        assert "generados" in texto, texto
+
+    def leer():
+        filas = db.query(Match).filter(Match.tournament_id != None).all()
+        return [{"id": m.id, "p1": m.player_1_id, "p2": m.player_2_id, "siguiente": m.next_match_id,
+                 "perdedor": m.loser_match_id, "terminado": m.is_finished,
+                 "fin": a_local(m.timestamp) if m.is_finished else None,
+                 "inicio": a_local(m.scheduled_at), "cancha": m.court} for m in filas]
+
+    sede = Sede.del_club(db.get(Club, club_id))
+    ahora = datetime.utcnow()
+    partidos = leer()
+    plan = {p["id"]: (p["inicio"], p["cancha"]) for p in partidos}
+    errores += verificar(partidos, plan, sede, a_local(ahora).replace(second=0, microsecond=0) - timedelta(minutes=1))
+    db.rollback()
+
+    # 2. Reprogramar sin cambios: una consulta y nada que escribir
+    contador.total = 0
+    t0 = time.perf_counter()
+    sin_cambios = reprogramar(db, club_id, ahora)
+    ms = (time.perf_counter() - t0) * 1000
+    sentencias = contador.total
+    db.rollback()
+
+    # 3. La primera tanda: todos terminan a horario menos el de la cancha 1, que termina 40 min tarde
+    primeros = (db.query(Match).filter(Match.scheduled_at == db.query(func.min(Match.scheduled_at)).scalar_subquery(),
+                                       Match.player_1_id != None, Match.player_2_id != None).order_by(Match.court).all())
+    nombres = {j.id: j.name for j in db.query(Player).filter(Player.club_id == club_id)}
+    tanda = [(m.court, m.scheduled_at + sede.duracion + timedelta(minutes=40 if m.court == 1 else 0),
+              nombres[m.player_1_id], nombres[m.player_2_id]) for m in primeros]
+    db.rollback()
+    for cancha, fin, ganador, perdedor in tanda[1:]:
+        registrar_a_las(db, club_id, fin, ganador, perdedor)
+    antes = {p["id"]: (p["inicio"], p["cancha"]) for p in leer()}
+    db.rollback()
+    _, tarde, ganador, perdedor = tanda[0]
+    contador.total = 0
+    resultado = registrar_a_las(db, club_id, tarde, ganador, perdedor)
+    sentencias_resultado = contador.total
+    assert resultado["estado"] == "registrado", resultado
+    partidos = leer()
+    despues = {p["id"]: (p["inicio"], p["cancha"]) for p in partidos if not p["terminado"]}
+    movidos = sum(1 for match_id, hora in despues.items() if antes[match_id] != hora)
+    plan = {p["id"]: (p["inicio"], p["cancha"]) for p in partidos if not p["terminado"] and p["inicio"] > a_local(tarde)}
+    errores += verificar(partidos, plan, sede, a_local(tarde))
+    db.close()
+    return {"partidos": len(antes), "sin_cambios": sin_cambios, "sentencias": sentencias, "ms": ms,
+            "movidos": movidos, "pendientes": len(despues), "sentencias_resultado": sentencias_resultado,
+            "errores": errores}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--torneos", type=int, default=6)
+    parser.add_argument("--jugadores", type=int, default=96, help="inscritos por torneo")
+    parser.add_argument("--canchas", type=int, default=6)
+    parser.add_argument("--resultados", type=int, default=300)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'programacion.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from scheduler import Sede, planificar
+    sede = Sede(canchas=args.canchas)
+    errores = []
+
+    # 1. Planificar desde cero
+    partidos = partidos_de_torneos(args.torneos, args.jugadores)
+    t0 = time.perf_counter()
+    plan = planificar(partidos, sede, AHORA)
+    ms = (time.perf_counter() - t0) * 1000
+    errores += verificar(partidos, plan, sede, AHORA)
+    ultimo = max(inicio for inicio, _ in plan.values()) + sede.duracion
+    print(f"\n🎾 {args.torneos} torneos × {args.jugadores} inscritos, {args.canchas} canchas ({sede.texto()})")
+    print(f"Planificar {len(plan)} partidos: {ms:.1f} ms · último termina {ultimo:%d/%m %H:%M}")
+
+    # 2. Incremental
+    cambios, pendientes, errores_juego, tiempos = jugar_en_memoria(partidos, sede, args.resultados,
+                                                                   random.Random(args.semilla))
+    errores += errores_juego
+    if cambios:
+        print(f"{len(cambios)} resultados (desvío -20..+25 min): reprogramar {sum(tiempos) / len(tiempos):.1f} ms "
+              f"de media · filas a escribir {sum(cambios)} en total, {sum(cambios) / len(cambios):.1f} por resultado "
+              f"(reescribiendo todo: {sum(pendientes) / len(pendientes):.0f} por resultado)")
+
+    # 3. Con la BD
+    from database import engine
+    from migrations import aplicar_migraciones
+    aplicar_migraciones(engine)
+    bd = con_bd(min(args.torneos, 3), min(args.jugadores, 64), args.canchas, Contador(engine))
+    errores += bd["errores"]
+    print(f"BD: {bd['partidos']} partidos · reprogramar sin cambios: {bd['sentencias']} sentencia(s), "
+          f"{bd['sin_cambios']} filas, {bd['ms']:.1f} ms")
+    print(f"BD: resultado 40 min tarde -> {bd['movidos']} de {bd['pendientes']} partidos pendientes movidos, "
+          f"{bd['sentencias_resultado']} sentencias en total")
+
+    for e in errores[:10]:
+        print(f"❌ {e}")
+    if errores or bd["sin_cambios"] or not bd["movidos"] or bd["movidos"] == bd["pendientes"]:
+        print(f"❌ Programación inválida ({len(errores)} errores) o reprogramación no incremental")
+        sys.exit(1)
+    print("✅ Sin solapes de canchas, con descansos, respetando el cuadro y el horario; "
+          "reprogramar solo escribe lo que cambia")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Regresión de consultas SQL: cuántas sentencias ejecuta cada ruta caliente.
+
+    python benchmarks/conteo_consultas.py [--database-url postgresql://...] [-v]
+
+Siembra la BD en dos tamaños (chico y 10x más jugadores/inscritos/partidos)
+y cuenta las sentencias SELECT/INSERT/UPDATE/DELETE de cada caso. Sale con
+código 1 si un caso supera su presupuesto o si el conteo crece con el
+tamaño de los datos (un N+1). Si un cambio baja un conteo, ajustar aquí el
+presupuesto para que no vuelva a subir.
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import utils  # agrega la raíz del repo al sys.path
+
+# Sentencias máximas por caso (mismo número en los dos tamaños)
+PRESUPUESTO = {
+    "GET /club (ranking)": 2,
+    "GET /club (inscripción)": 2,
+    "GET /club (cuadros)": 2,
+    "GET /club/snapshot (caché)": 0,
+    "GET /club/ranking (frío)": 1,
+    "GET /club/ranking (caché)": 0,
+    "GET /club/ranking/{jugador}": 0,
+    "webhook: contexto en frío": 3,
+    "webhook: contexto en caliente": 1,
+    "webhook: registrar entrada": 1,
+    "acción: crear_jugador": 3,
+    "acción: inscribir_en_torneo": 3,
+    "acción: registrar_partido": 8,
+    "acción: generar_cuadros": 7,                 # + reprogramar: un SELECT y un UPDATE
+    "acción: registrar_partido (cuadro)": 10,
+    "POST /resultados (10 partidos)": 80,
+}
+
+SENTENCIA = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class Contador:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.total = 0
+        self.sentencias = []
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, conn, cursor, statement, parameters, context, executemany):
+        if SENTENCIA.match(statement):
+            self.total += 1
+            self.sentencias.append(" ".join(statement.split())[:140])
+
+    def medir(self, fn):
+        self.total, self.sentencias = 0, []
+        fn()
+        return self.total, list(self.sentencias)
+
+
+def sembrar(db, escala):
+    from models import Club, Player, Tournament, Match, WhatsAppUser, Enrollment
+    dueno = WhatsAppUser(phone_number="573000000001")
+    db.add(dueno); db.flush()
+    clubes = {}
+    for modo in ("ranking", "inscripcion", "cuadros", "acciones"):
+        club = Club(name=f"Club {modo}", admin_phone=f"57100{len(clubes)}")
+        db.add(club); db.flush()
+        jugadores = [Player(name=f"{modo.title()} Jugador {i}", club_id=club.id, elo=1200 + i, owner_id=dueno.id)
+                     for i in range(20 * escala)]
+        db.add_all(jugadores); db.flush()
+        if modo in ("inscripcion", "acciones"):
+            torneo = Tournament(name=f"Copa {modo}", club_id=club.id, status="inscription", smart_data={})
+            db.add(torneo); db.flush()
+            db.add_all([Enrollment(tournament_id=torneo.id, player_id=j.id) for j in jugadores[:8 * escala]])
+        if modo == "cuadros":
+            torneo = Tournament(name="Copa cuadros", club_id=club.id, status="playing", smart_data={})
+            db.add(torneo); db.flush()
+            db.add_all([Match(player_1_id=jugadores[2 * i].id, player_2_id=jugadores[2 * i + 1].id,
+                              tournament_id=torneo.id, score="VS", is_finished=False) for i in range(8 * escala)])
+        clubes[modo] = club.id
+    db.commit()
+    return clubes
+
+
+def correr(escala, contador, cliente):
+    import main
+    from database import engine, SessionLocal
+    from models import Base, Player
+    from migrations import aplicar_migraciones
+    from club_context import contextos
+    from live_updates import en_vivo
+    from leaderboard import leaderboards
+    from actions import ejecutar_accion
+    from message_queue import registrar_entrada
+
+    Base.metadata.drop_all(bind=engine)
+    aplicar_migraciones(engine)
+    contextos.descartar()
+    en_vivo.descartar()
+    leaderboards.descartar()
+    db = SessionLocal()
+    clubes = sembrar(db, escala)
+    db.close()
+    tel = "573000000001"
+    db = SessionLocal()
+    primero = db.query(Player.id).filter(Player.club_id == clubes["ranking"]).first()[0]
+    db.close()
+
+    def con_sesion(fn):
+        def envoltura():
+            db = SessionLocal()
+            try:
+                fn(db)
+            finally:
+                db.close()
+        return envoltura
+
+    def pagina(club_id):
+        def fn():
+            en_vivo.descartar()
+            leaderboards.descartar()
+            assert cliente.get(f"/club/{club_id}").status_code == 200
+        return fn
+
+    def accion(club_key, nombre, datos):
+        return con_sesion(lambda db: ejecutar_accion(db, clubes[club_key], tel, {"accion": nombre, "datos": datos}))
+
+    # Primer partido real de la ronda 1 del cuadro que arma generar_cuadros. Sembrados
+    # por Elo: el cabeza de serie k es "Acciones Jugador {8 * escala - k}" y el último,
+    # "Nuevo Jugador" (lo inscribe un caso anterior, con el Elo del peor)
+    from brackets import orden_de_siembra
+    n = 8 * escala + 1
+    orden = orden_de_siembra(1 << (n - 1).bit_length())
+    a, b = next((orden[i], orden[i + 1]) for i in range(0, len(orden), 2) if orden[i + 1] <= n)
+    sembrado = lambda k: f"Acciones Jugador {8 * escala - k}" if k < n else "Nuevo Jugador"
+
+    ronda = [{"ganador": f"Ranking Jugador {2 * i}", "perdedor": f"Ranking Jugador {2 * i + 1}", "score": "3-0"}
+             for i in range(10)]
+    casos = [
+        ("GET /club (ranking)", pagina(clubes["ranking"])),
+        ("GET /club (inscripción)", pagina(clubes["inscripcion"])),
+        ("GET /club (cuadros)", pagina(clubes["cuadros"])),
+        ("GET /club/snapshot (caché)", lambda: cliente.get(f"/club/{clubes['cuadros']}/snapshot")),
+        ("GET /club/ranking (frío)", lambda: (leaderboards.descartar(),
+                                              cliente.get(f"/club/{clubes['ranking']}/ranking?pagina=2"))),
+        ("GET /club/ranking (caché)", lambda: cliente.get(f"/club/{clubes['ranking']}/ranking?categoria=General")),
+        ("GET /club/ranking/{jugador}", lambda: cliente.get(f"/club/{clubes['ranking']}/ranking/{primero}?radio=3")),
+        ("webhook: contexto en frío", con_sesion(lambda db: (contextos.descartar(), main._preparar_contexto(db, tel)))),
+        ("webhook: contexto en caliente", con_sesion(lambda db: main._preparar_contexto(db, tel))),
+        ("webhook: registrar entrada", con_sesion(lambda db: registrar_entrada(
+            db, {"id": f"wamid.{escala}", "telefono": tel, "texto": "hola"}))),
+        ("acción: crear_jugador", accion("acciones", "crear_jugador", {"nombre": "Nuevo Jugador", "categoria": "General"})),
+        ("acción: inscribir_en_torneo", accion("acciones", "inscribir_en_torneo", {"nombre_jugador": "Nuevo Jugador"})),
+        ("acción: registrar_partido", accion("ranking", "registrar_partido",
+                                             {"ganador": "Ranking Jugador 0", "perdedor": "Ranking Jugador 1", "score": "3-1"})),
+        # Sin consolación: en el chico hay un solo partido de ronda 1 y en el 10x varios, así
+        # el partido de abajo hace el mismo número de avances (uno) en los dos tamaños
+        ("acción: generar_cuadros", accion("acciones", "generar_cuadros", {"consolacion": False})),
+        ("acción: registrar_partido (cuadro)", accion("acciones", "registrar_partido", {
+            "ganador": sembrado(a), "perdedor": sembrado(b), "score": "3-2"})),
+        ("POST /resultados (10 partidos)", lambda: cliente.post(f"/club/{clubes['ranking']}/resultados",
+                                                                  json={"resultados": ronda})),
+    ]
+    return {nombre: contador.medir(fn) for nombre, fn in casos}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostrar las sentencias de cada caso")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'consultas.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.chdir(utils.RAIZ)
+    from fastapi.testclient import TestClient
+    import main as app_main
+    from database import engine
+
+    contador = Contador(engine)
+    with TestClient(app_main.app) as cliente:
+        chico = correr(1, contador, cliente)
+        grande = correr(10, contador, cliente)
+
+    fallas = 0
+    print(f"\n{'caso':<34}{'chico':>7}{'10x':>7}{'máx':>6}")
+    for nombre, maximo in PRESUPUESTO.items():
+        (n1, sentencias), (n2, _) = chico[nombre], grande[nombre]
+        estado = "✅"
+        if n2 != n1:
+            estado, fallas = "❌ N+1", fallas + 1
+        elif n1 > maximo:
+            estado, fallas = "❌ sobre presupuesto", fallas + 1
+        print(f"{nombre:<34}{n1:>7}{n2:>7}{maximo:>6}  {estado}")
+        if args.verbose or estado != "✅":
+            for s in sentencias:
+                print(f"      {s}")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+import socket
+import threading
+
+# --- UTILIDADES COMUNES PARA LOS BENCHMARKS ---
+# Los scripts se corren desde la raíz del repo: python benchmarks/<script>.py
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def levantar_servidor(app, puerto=None):
+    """Arranca una app ASGI con uvicorn en un hilo. Devuelve la URL base."""
+    import uvicorn
+    puerto = puerto or puerto_libre()
+    config = uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning")
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{puerto}"
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    i = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[i]
@@ -0,0 +1,218 @@
+import os
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from models import Match
+
+# --- CUADROS DEL TORNEO (ELIMINACIÓN, CONSOLACIÓN Y GRUPOS) ---
+# El cuadro completo se planifica en memoria y se guarda en DOS sentencias:
+# un INSERT con todos los partidos (RETURNING de los ids) y un UPDATE
+# executemany con los enlaces de avance. Da igual que sean 3 o 512 inscritos.
+#
+# Eliminación directa: el tamaño del cuadro es la potencia de 2 siguiente y
+# los cabezas de serie se reparten con el orden clásico (1 y 2 solo se
+# cruzan en la final). Los byes no son partidos: quien no tiene rival en la
+# ronda 1 ya arranca en su partido de la ronda 2. Cada partido sabe a dónde
+# va su ganador (next_match_id/next_position) y, si hay consolación, su
+# perdedor (loser_match_id/loser_position); match_engine.py los mueve al
+# registrar el resultado.
+#
+# Consolación (plate): los perdedores de la ronda 1 juegan su propio cuadro,
+# con la misma lógica de byes.
+#
+# Grupos: todos contra todos (método del círculo) en grupos de
+# CUADROS_GRUPO_TAMANO, repartidos en serpiente para equilibrar el nivel.
+
+CUADROS_GRUPO_TAMANO = int(os.getenv("CUADROS_GRUPO_TAMANO", "4"))
+
+PRINCIPAL = "principal"
+CONSOLACION = "consolacion"
+NOMBRES_RONDA = ["Final", "Semifinal", "Cuartos de final", "Octavos de final"]
+
+
+def _potencia(n):
+    tamano = 1
+    while tamano < n:
+        tamano *= 2
+    return tamano
+
+# Posiciones de los cabezas de serie en la ronda 1 (cuadro de `tamano`):
+# 2 -> [1, 2], 4 -> [1, 4, 2, 3], 8 -> [1, 8, 4, 5, 2, 7, 3, 6]...
+def orden_de_siembra(tamano):
+    orden = [1]
+    while len(orden) < tamano:
+        espejo = 2 * len(orden) + 1
+        orden = [x for semilla in orden for x in (semilla, espejo - semilla)]
+    return orden
+
+def _letra(i):
+    # 0 -> A, 25 -> Z, 26 -> AA (por si hay más de 26 grupos)
+    letras = ""
+    i += 1
+    while i:
+        i, resto = divmod(i - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+# --- PLAN EN MEMORIA ---
+# plan: (cuadro, ronda, slot) -> fila del partido. Los enlaces apuntan a
+# claves del plan; se traducen a ids después del INSERT.
+def _fila(cuadro, ronda, slot):
+    return {"bracket": cuadro, "round": ronda, "slot": slot, "player_1_id": None, "player_2_id": None,
+            "siguiente": None, "perdedor": None}
+
+def _poner(plan, entrante, destino):
+    # entrante: ("jugador", player_id) o ("perdedor", clave del partido de donde sale)
+    clave, posicion = destino
+    tipo, valor = entrante
+    if tipo == "jugador":
+        plan[clave][f"player_{posicion}_id"] = valor
+    else:
+        plan[valor]["perdedor"] = destino
+
+def _llave(plan, cuadro, entrantes):
+    tamano = _potencia(len(entrantes))
+    rondas = tamano.bit_length() - 1
+    # 1. Rondas 2..final, ya enlazadas entre sí
+    for ronda in range(2, rondas + 1):
+        for slot in range(tamano >> ronda):
+            plan[(cuadro, ronda, slot)] = _fila(cuadro, ronda, slot)
+            if ronda < rondas:
+                plan[(cuadro, ronda, slot)]["siguiente"] = ((cuadro, ronda + 1, slot // 2), slot % 2 + 1)
+    # 2. Ronda 1: solo las parejas con dos entrantes; contra un bye se pasa directo
+    orden = orden_de_siembra(tamano)
+    jugados = []
+    for slot in range(tamano // 2):
+        a, b = orden[2 * slot], orden[2 * slot + 1]
+        destino = ((cuadro, 2, slot // 2), slot % 2 + 1) if rondas > 1 else None
+        if b > len(entrantes):
+            _poner(plan, entrantes[a - 1], destino)
+            continue
+        clave = (cuadro, 1, slot)
+        plan[clave] = _fila(cuadro, 1, slot)
+        plan[clave]["siguiente"] = destino
+        _poner(plan, entrantes[a - 1], (clave, 1))
+        _poner(plan, entrantes[b - 1], (clave, 2))
+        jugados.append(clave)
+    return jugados
+
+def planificar_eliminacion(ids_sembrados, consolacion=True):
+    """ids_sembrados: player_ids del mejor al peor cabeza de serie."""
+    plan = {}
+    jugados = _llave(plan, PRINCIPAL, [("jugador", pid) for pid in ids_sembrados])
+    if consolacion and len(jugados) >= 2:
+        _llave(plan, CONSOLACION, [("perdedor", clave) for clave in jugados])
+    return plan
+
+def planificar_grupos(ids_sembrados, tamano=CUADROS_GRUPO_TAMANO):
+    cantidad = max(1, -(-len(ids_sembrados) // max(2, tamano)))
+    grupos = [[] for _ in range(cantidad)]
+    for i, pid in enumerate(ids_sembrados):
+        vuelta, j = divmod(i, cantidad)
+        grupos[j if vuelta % 2 == 0 else cantidad - 1 - j].append(pid)
+
+    plan = {}
+    for g, miembros in enumerate(grupos):
+        cuadro = f"grupo {_letra(g)}"
+        rueda = miembros + ([None] if len(miembros) % 2 else [])
+        k = len(rueda)
+        for ronda in range(1, k):
+            slot = 0
+            for i in range(k // 2):
+                a, b = rueda[i], rueda[k - 1 - i]
+                if a is not None and b is not None:
+                    plan[(cuadro, ronda, slot)] = dict(_fila(cuadro, ronda, slot), player_1_id=a, player_2_id=b)
+                    slot += 1
+            # El primero queda fijo y el resto gira una posición
+            rueda = [rueda[0], rueda[-1]] + rueda[1:-1]
+    return plan
+
+
+# --- GUARDAR: UN INSERT + UN UPDATE ---
+def crear_partidos(db: Session, torneo_id, plan):
+    """
+    Inserta el plan sin commit. Devuelve [(id, p1, p2, cuadro, ronda, slot)]
+    en orden de id (p1/p2 en None si todavía no se conocen).
+    """
+    if not plan:
+        return []
+    filas = [{"tournament_id": torneo_id, "score": "VS", "is_finished": False, "bracket": f["bracket"],
+              "round": f["round"], "slot": f["slot"], "player_1_id": f["player_1_id"], "player_2_id": f["player_2_id"]}
+             for f in plan.values()]
+    # (cuadro, ronda, slot) es único dentro del torneo: no dependemos del orden del RETURNING.
+    # render_nulls: sin él, el ORM parte el INSERT según qué columnas vienen en None
+    ids = {(r.bracket, r.round, r.slot): r.id for r in db.execute(
+        insert(Match).returning(Match.id, Match.bracket, Match.round, Match.slot), filas,
+        execution_options={"render_nulls": True})}
+
+    enlaces = []
+    for clave, f in plan.items():
+        if f["siguiente"] or f["perdedor"]:
+            siguiente, perdedor = f["siguiente"] or (None, None), f["perdedor"] or (None, None)
+            enlaces.append({"id": ids[clave],
+                            "next_match_id": ids.get(siguiente[0]), "next_position": siguiente[1],
+                            "loser_match_id": ids.get(perdedor[0]), "loser_position": perdedor[1]})
+    if enlaces:
+        db.execute(update(Match), enlaces)
+    return sorted((ids[c], f["player_1_id"], f["player_2_id"], f["bracket"], f["round"], f["slot"])
+                  for c, f in plan.items())
+
+
+# --- AVANCE AL REGISTRAR UN RESULTADO ---
+def avanzar(db: Session, match, ganador_id, perdedor_id):
+    """
+    Pone al ganador en su próximo partido (y al perdedor en la consolación).
+    Sin commit. Devuelve [(match_id, posicion, player_id)].
+    """
+    movimientos = [(destino, posicion, jugador) for destino, posicion, jugador in
+                   ((match.next_match_id, match.next_position, ganador_id),
+                    (match.loser_match_id, match.loser_position, perdedor_id)) if destino]
+    for destino, posicion, jugador in movimientos:
+        columna = Match.player_1_id if posicion == 1 else Match.player_2_id
+        db.execute(update(Match).where(Match.id == destino, Match.is_finished == False)
+                   .values({columna: jugador}).execution_options(synchronize_session=False))
+    return movimientos
+
+
+# --- ÁRBOL PARA LA TV ---
+def _orden_cuadro(cuadro):
+    cuadro = cuadro or PRINCIPAL
+    return (0 if cuadro == PRINCIPAL else 1 if cuadro == CONSOLACION else 2, cuadro)
+
+def ordenar(partidos):
+    # Partidos de la vista (dicts con "cuadro", "ronda", "slot"): principal, consolación, grupos
+    return sorted(partidos, key=lambda p: (_orden_cuadro(p["cuadro"]), p["ronda"] or 1, p["slot"] or 0, p["id"]))
+
+def _titulo(cuadro, ronda, rondas, solo_principal):
+    if cuadro.startswith("grupo"):
+        return f"Grupo {cuadro.split(' ', 1)[1]} · Fecha {ronda}"
+    desde_el_final = rondas - ronda
+    nombre = NOMBRES_RONDA[desde_el_final] if desde_el_final < len(NOMBRES_RONDA) else f"Ronda {ronda}"
+    if cuadro == CONSOLACION:
+        return f"Consolación · {nombre}"
+    return nombre if solo_principal else f"Principal · {nombre}"
+
+def secciones(partidos):
+    """
+    Partidos ya ordenados (ver ordenar) -> [{"id", "titulo", "partidos": [match_id...]}],
+    una sección por ronda de cada cuadro. La estructura no cambia al jugar:
+    los resultados y avances solo rellenan los partidos.
+    """
+    rondas, cuadros = {}, set()
+    for p in partidos:
+        cuadro = p["cuadro"] or PRINCIPAL
+        cuadros.add(cuadro)
+        rondas[cuadro] = max(rondas.get(cuadro, 1), p["ronda"] or 1)
+    solo_principal = cuadros <= {PRINCIPAL}
+
+    salida, por_clave = [], {}
+    for p in partidos:
+        cuadro, ronda = p["cuadro"] or PRINCIPAL, p["ronda"] or 1
+        clave = f"{cuadro}-{ronda}"
+        if clave not in por_clave:
+            # Partidos de antes de los cuadros completos (sin cuadro): "Ronda N"
+            titulo = _titulo(cuadro, ronda, rondas[cuadro], solo_principal) if p["cuadro"] else f"Ronda {ronda}"
+            por_clave[clave] = {"id": clave, "titulo": titulo, "partidos": []}
+            salida.append(por_clave[clave])
+        por_clave[clave]["partidos"].append(p["id"])
+    return salida
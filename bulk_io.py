@@ -0,0 +1,513 @@
+import io
+import os
+import sys
+import csv
+import gzip
+import json
+import time
+import codecs
+import argparse
+from datetime import datetime
+from sqlalchemy import select, insert, update, and_, or_, tuple_
+from sqlalchemy.orm import Session, aliased
+from models import Club, Player, WhatsAppUser, Match
+import events
+
+# --- IMPORTACIÓN Y EXPORTACIÓN MASIVA (CSV / NDJSON) ---
+# Dar de alta un club era crear jugadores de a un mensaje de WhatsApp (una
+# búsqueda, un INSERT y un commit por jugador). Aquí las filas llegan en
+# streaming (archivo, stdin o el cuerpo de un POST) y se escriben por lotes:
+# cada lote es UNA transacción con unas pocas sentencias, sin importar
+# cuántas filas traiga. La memoria depende del lote (y de cuántos jugadores
+# tiene el club), no del tamaño del archivo.
+#
+# Alta idempotente ("upsert"):
+#   clubes:    por nombre
+#   jugadores: por (club, nombre), como crear_jugador; el dueño por teléfono
+#   partidos:  por (jugador_1, jugador_2, fecha); los jugadores que no
+#              existan se crean en el club
+# Los INSERT van con COPY en PostgreSQL con psycopg2 (cursor.copy_expert es
+# de ese driver) y con executemany en los demás (SQLite, otros drivers).
+#
+#   python bulk_io.py importar jugadores club3.csv --club 3
+#   python bulk_io.py importar partidos historial.ndjson.gz --club 3 --replay
+#   python bulk_io.py exportar partidos --club 3 --formato ndjson > historial.ndjson
+
+IMPORT_LOTE = int(os.getenv("IMPORT_LOTE", "5000"))
+EXPORT_PAGINA = int(os.getenv("EXPORT_PAGINA", "5000"))
+IMPORT_MAX_ERRORES = 20   # Mensajes de error que se devuelven (el conteo es completo)
+
+FORMATOS = ("csv", "ndjson")
+COLUMNAS = {
+    "clubes": ["id", "nombre", "telefono_admin", "canchas", "abre", "cierra", "minutos_partido", "minutos_descanso"],
+    "jugadores": ["id", "club_id", "nombre", "categoria", "elo", "victorias", "derrotas", "telefono", "avatar_url"],
+    "partidos": ["id", "club_id", "fecha", "jugador_1", "jugador_2", "ganador", "score"],
+}
+TIPOS = tuple(COLUMNAS)
+
+
+class ErrorImportacion(Exception):
+    """El archivo entero no se puede leer (formato, tipo o una línea rota)."""
+
+
+# --- LECTURA EN STREAMING ---
+def lineas_de_bytes(trozos, encoding="utf-8-sig"):
+    """Trozos de bytes (cuerpo HTTP) -> líneas de texto, sin juntar el cuerpo entero."""
+    decodificador = codecs.getincrementaldecoder(encoding)()
+    resto = ""
+    for trozo in trozos:
+        partes = (resto + decodificador.decode(trozo)).split("\n")
+        resto = partes.pop()
+        for parte in partes:
+            yield parte + "\n"
+    resto += decodificador.decode(b"", final=True)
+    if resto:
+        yield resto
+
+def desde_async(trozos):
+    # Dentro de un hilo de anyio (run_in_threadpool): pide cada trozo al event loop
+    from anyio import from_thread
+    while True:
+        try:
+            yield from_thread.run(trozos.__anext__)
+        except StopAsyncIteration:
+            return
+
+def leer_filas(lineas, formato):
+    if formato not in FORMATOS:
+        raise ErrorImportacion(f"Formato desconocido: {formato} (csv o ndjson)")
+    if formato == "csv":
+        # DictReader también lee campos entre comillas con saltos de línea
+        yield from csv.DictReader(lineas)
+        return
+    for numero, linea in enumerate(lineas, 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            raise ErrorImportacion(f"Línea {numero}: JSON inválido ({e})")
+        if not isinstance(fila, dict):
+            raise ErrorImportacion(f"Línea {numero}: se esperaba un objeto JSON")
+        yield fila
+
+def abrir(ruta):
+    if ruta == "-":
+        return sys.stdin
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "rt", encoding="utf-8-sig", newline="")
+    return open(ruta, encoding="utf-8-sig", newline="")
+
+def formato_de(ruta):
+    nombre = ruta[:-3] if ruta.endswith(".gz") else ruta
+    return "ndjson" if nombre.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+# --- VALORES DE UNA FILA ---
+def _texto(fila, clave):
+    valor = fila.get(clave)
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+def _entero(fila, clave):
+    valor = _texto(fila, clave)
+    try:
+        return None if valor is None else int(float(valor))
+    except ValueError:
+        raise ValueError(f"{clave} no es un número: {valor!r}")
+
+def _telefono(fila, clave):
+    valor = _texto(fila, clave) or ""
+    return "".join(c for c in valor if c.isdigit()) or None
+
+def _fecha(fila, clave):
+    valor = _texto(fila, clave)
+    if valor is None:
+        return None
+    fecha = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    # La BD guarda UTC sin zona (como datetime.utcnow)
+    return fecha.replace(tzinfo=None) - fecha.utcoffset() if fecha.tzinfo else fecha
+
+def _club_de(fila, club_id):
+    # Con --club (o la URL del club) todas las filas son de ese club
+    propio = _entero(fila, "club_id")
+    if club_id is not None:
+        if propio is not None and propio != club_id:
+            raise ValueError(f"club_id {propio} distinto del club {club_id}")
+        return club_id
+    if propio is None:
+        raise ValueError("falta club_id")
+    return propio
+
+def _solo_con_valor(valores):
+    # En el upsert, una columna vacía del archivo no pisa lo que hay en la BD
+    return {k: v for k, v in valores.items() if v is not None}
+
+
+# --- ESCRITURA POR LOTES ---
+def _insertar(db: Session, tabla, filas):
+    if not filas:
+        return
+    dialecto = db.get_bind().dialect
+    if dialecto.name == "postgresql" and dialecto.driver == "psycopg2":
+        _copiar(db, tabla, filas)
+    else:
+        db.execute(insert(tabla), filas)
+
+def _copiar(db: Session, tabla, filas):
+    # COPY ... FROM STDIN: una sola ida y vuelta por lote. Las filas traen
+    # todas las columnas (COPY no aplica los default de SQLAlchemy).
+    columnas = list(filas[0])
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow(["\\N" if fila[c] is None else fila[c] for c in columnas])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {tabla.name} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                           buffer)
+    finally:
+        cursor.close()
+
+def _validar_clubes(db: Session, club_ids, conocidos):
+    faltan = set(club_ids) - conocidos
+    if faltan:
+        conocidos.update(db.scalars(select(Club.id).where(Club.id.in_(faltan))))
+    return conocidos
+
+def _duenos(db: Session, telefonos):
+    # {teléfono: id de WhatsAppUser}, creando los que falten (2-3 sentencias por lote)
+    if not telefonos:
+        return {}
+    consulta = select(WhatsAppUser.phone_number, WhatsAppUser.id).where(WhatsAppUser.phone_number.in_(telefonos))
+    ids = dict(db.execute(consulta).all())
+    nuevos = [{"phone_number": t, "created_at": datetime.utcnow()} for t in telefonos if t not in ids]
+    if nuevos:
+        _insertar(db, WhatsAppUser.__table__, nuevos)
+        ids.update(db.execute(consulta).all())
+    return ids
+
+def _jugadores_por_nombre(db: Session, claves):
+    # {(club_id, nombre): player_id} con el índice (club_id, name)
+    por_club = {}
+    for club_id, nombre in claves:
+        por_club.setdefault(club_id, set()).add(nombre)
+    if not por_club:
+        return {}
+    filtro = or_(*(and_(Player.club_id == c, Player.name.in_(nombres)) for c, nombres in por_club.items()))
+    ids = {}
+    for pid, club_id, nombre in db.execute(select(Player.id, Player.club_id, Player.name)
+                                           .where(filtro).order_by(Player.id)):
+        ids.setdefault((club_id, nombre), pid)   # nombres repetidos: el más antiguo, como crear_jugador
+    return ids
+
+def _jugador_nuevo(club_id, nombre, categoria=None, elo=None, victorias=None, derrotas=None,
+                   avatar_url=None, owner_id=None):
+    return {"name": nombre, "club_id": club_id, "category": categoria or "General", "elo": elo or 1200,
+            "wins": victorias or 0, "losses": derrotas or 0, "avatar_url": avatar_url, "owner_id": owner_id}
+
+
+# Cada fila se interpreta por separado: un error (número mal escrito, un
+# ganador que no jugó) descarta solo esa fila
+def _fila_club(fila, club_id):
+    nombre = _texto(fila, "nombre")
+    if not nombre:
+        raise ValueError("falta nombre")
+    return nombre, {"admin_phone": _telefono(fila, "telefono_admin"), "courts": _entero(fila, "canchas"),
+                    "opens_at": _texto(fila, "abre"), "closes_at": _texto(fila, "cierra"),
+                    "match_minutes": _entero(fila, "minutos_partido"),
+                    "rest_minutes": _entero(fila, "minutos_descanso")}
+
+def _fila_jugador(fila, club_id):
+    nombre = _texto(fila, "nombre")
+    if not nombre:
+        raise ValueError("falta nombre")
+    return (_club_de(fila, club_id), nombre), {
+        "category": _texto(fila, "categoria"), "elo": _entero(fila, "elo"),
+        "wins": _entero(fila, "victorias"), "losses": _entero(fila, "derrotas"),
+        "avatar_url": _texto(fila, "avatar_url"), "telefono": _telefono(fila, "telefono")}
+
+def _fila_partido(fila, club_id):
+    club = _club_de(fila, club_id)
+    j1, j2, ganador = _texto(fila, "jugador_1"), _texto(fila, "jugador_2"), _texto(fila, "ganador")
+    if not j1 or not j2 or j1 == j2:
+        raise ValueError("jugador_1 y jugador_2 deben ser dos jugadores distintos")
+    if ganador not in (j1, j2):
+        raise ValueError(f"ganador '{ganador}' no es jugador_1 ni jugador_2")
+    return club, j1, j2, ganador, _texto(fila, "score"), _fecha(fila, "fecha") or datetime.utcnow()
+
+
+def _lote_clubes(db: Session, filas, conocidos, jugadores):
+    datos = {}
+    for nombre, valores in filas:
+        if nombre in datos:
+            datos[nombre].update(_solo_con_valor(valores))
+        else:
+            datos[nombre] = valores
+    existentes = dict(db.execute(select(Club.name, Club.id).where(Club.name.in_(datos))).all())
+    cambios = [{"id": existentes[n], **_solo_con_valor(v)} for n, v in datos.items() if n in existentes]
+    cambios = [c for c in cambios if len(c) > 1]
+    nuevos = [{"name": n, "created_at": datetime.utcnow(), **v} for n, v in datos.items() if n not in existentes]
+    if cambios:
+        db.execute(update(Club), cambios)
+    _insertar(db, Club.__table__, nuevos)
+    ids = dict(db.execute(select(Club.name, Club.id).where(Club.name.in_(datos))).all())
+    return {"creados": len(nuevos), "actualizados": len(cambios), "clubes": set(ids.values())}
+
+def _lote_jugadores(db: Session, filas, conocidos, jugadores):
+    datos = {}
+    for clave, valores in filas:
+        # El mismo jugador dos veces en el lote: se juntan (gana el último valor no vacío)
+        if clave in datos:
+            datos[clave].update(_solo_con_valor(valores))
+        else:
+            datos[clave] = valores
+    _validar_clubes(db, {c for c, _ in datos}, conocidos)
+    sin_club = [clave for clave in datos if clave[0] not in conocidos]
+    for clave in sin_club:
+        del datos[clave]
+
+    duenos = _duenos(db, {v["telefono"] for v in datos.values() if v["telefono"]})
+    existentes = _jugadores_por_nombre(db, datos)
+    cambios, nuevos = [], []
+    for (club, nombre), v in datos.items():
+        owner_id = duenos.get(v["telefono"])
+        if (club, nombre) in existentes:
+            cambio = _solo_con_valor({"category": v["category"], "elo": v["elo"], "wins": v["wins"],
+                                      "losses": v["losses"], "avatar_url": v["avatar_url"], "owner_id": owner_id})
+            if cambio:
+                cambios.append({"id": existentes[(club, nombre)], **cambio})
+        else:
+            nuevos.append(_jugador_nuevo(club, nombre, v["category"], v["elo"], v["wins"], v["losses"],
+                                         v["avatar_url"], owner_id))
+    if cambios:
+        db.execute(update(Player), cambios)
+    _insertar(db, Player.__table__, nuevos)
+    return {"creados": len(nuevos), "actualizados": len(cambios), "sin_club": len(sin_club),
+            "clubes": {c for c, _ in datos}}
+
+def _lote_partidos(db: Session, partidos, conocidos, jugadores):
+    _validar_clubes(db, {p[0] for p in partidos}, conocidos)
+    sin_club = sum(1 for p in partidos if p[0] not in conocidos)
+    partidos = [p for p in partidos if p[0] in conocidos]
+
+    # 1. Jugadores por nombre (los de lotes anteriores ya se conocen); los
+    # que falten se crean en el club
+    claves = {(p[0], nombre) for p in partidos for nombre in (p[1], p[2])}
+    ids = {clave: jugadores[clave] for clave in claves if clave in jugadores}
+    ids.update(_jugadores_por_nombre(db, claves - ids.keys()))
+    faltan = sorted(claves - ids.keys())
+    if faltan:
+        _insertar(db, Player.__table__, [_jugador_nuevo(club, nombre) for club, nombre in faltan])
+        ids.update(_jugadores_por_nombre(db, faltan))
+
+    # 2. Sin duplicados: ni los ya importados ni los repetidos en el lote
+    filas_bd = {}
+    for club, j1, j2, ganador, score, fecha in partidos:
+        clave = (ids[(club, j1)], ids[(club, j2)], fecha)
+        filas_bd[clave] = {"player_1_id": clave[0], "player_2_id": clave[1], "winner_id": ids[(club, ganador)],
+                           "score": score, "timestamp": fecha, "is_finished": True, "version": 0}
+    existentes = set()
+    if filas_bd:
+        columnas = tuple_(Match.player_1_id, Match.player_2_id, Match.timestamp)
+        existentes = set(db.execute(select(Match.player_1_id, Match.player_2_id, Match.timestamp)
+                                    .where(columnas.in_(list(filas_bd)))).all())
+    nuevos = [f for clave, f in filas_bd.items() if clave not in existentes]
+    _insertar(db, Match.__table__, nuevos)
+    return {"creados": len(nuevos), "omitidos": len(partidos) - len(nuevos), "jugadores_creados": len(faltan),
+            "sin_club": sin_club, "clubes": {p[0] for p in partidos}, "jugadores": ids}
+
+# tipo -> (interpretar una fila, escribir un lote)
+TIPOS_IMPORTACION = {"clubes": (_fila_club, _lote_clubes), "jugadores": (_fila_jugador, _lote_jugadores),
+                     "partidos": (_fila_partido, _lote_partidos)}
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for numero, fila in enumerate(filas, 1):
+        lote.append((numero, fila))
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def _interpretar(lote, interpretar, club_id, resumen):
+    validas = []
+    for numero, fila in lote:
+        try:
+            validas.append(interpretar(fila, club_id))
+        except ValueError as e:
+            resumen["errores"] += 1
+            if len(resumen["mensajes_error"]) < IMPORT_MAX_ERRORES:
+                resumen["mensajes_error"].append(f"fila {numero}: {e}")
+    return validas
+
+
+def importar(tipo, filas, club_id=None, lote=IMPORT_LOTE, replay=False):
+    """
+    Importa filas (dicts de CSV o NDJSON) en lotes de `lote`, un commit por
+    lote. club_id fija el club de todas las filas. Con replay=True recalcula
+    el ranking de los clubes tocados (elo_replay). Devuelve un resumen.
+    """
+    from database import SessionLocal, con_reintentos
+    if tipo not in TIPOS_IMPORTACION:
+        raise ErrorImportacion(f"Tipo desconocido: {tipo} ({', '.join(TIPOS)})")
+    t0 = time.perf_counter()
+    resumen = {"tipo": tipo, "filas": 0, "creados": 0, "actualizados": 0, "omitidos": 0, "sin_club": 0,
+               "errores": 0, "lotes": 0, "mensajes_error": []}
+    if tipo == "partidos":
+        resumen["jugadores_creados"] = 0
+    interpretar, escribir = TIPOS_IMPORTACION[tipo]
+    clubes, conocidos = set(), set()   # clubes tocados / que existen en la BD
+    # (club, nombre) -> id de lotes ya confirmados: crece con los jugadores
+    # del club, no con las filas del archivo
+    jugadores = {}
+    for numerado in _lotes(filas, lote):
+        resumen["filas"] += len(numerado)
+        validas = _interpretar(numerado, interpretar, club_id, resumen)
+        if not validas:
+            continue
+        db = SessionLocal()
+        try:
+            # Si la BD estaba ocupada el lote se repite entero (es idempotente)
+            hecho = con_reintentos(db, lambda: escribir(db, validas, set(conocidos), jugadores))
+        finally:
+            db.close()
+        clubes |= hecho.pop("clubes")
+        jugadores.update(hecho.pop("jugadores", {}))
+        conocidos |= clubes
+        for clave, valor in hecho.items():
+            resumen[clave] += valor
+        resumen["lotes"] += 1
+
+    # Los cachés del club (contexto, ranking, TVs) se recargan una sola vez
+    for club in sorted(clubes):
+        events.publicar(club, events.IMPORTACION, importados=tipo)
+    if replay and clubes:
+        from elo_replay import recalcular
+        db = SessionLocal()
+        try:
+            resumen["replay"] = recalcular(db, club_ids=sorted(clubes))
+        finally:
+            db.close()
+    resumen["clubes"] = sorted(clubes)
+    resumen["segundos"] = round(time.perf_counter() - t0, 3)
+    return resumen
+
+
+# --- EXPORTACIÓN (STREAMING, PAGINADA POR ID) ---
+def _consulta_exportar(tipo, club_id):
+    if tipo == "clubes":
+        consulta = select(Club.id, Club.id, Club.name, Club.admin_phone, Club.courts, Club.opens_at,
+                          Club.closes_at, Club.match_minutes, Club.rest_minutes)
+        return consulta.where(Club.id == club_id) if club_id is not None else consulta, Club.id
+    if tipo == "jugadores":
+        consulta = (select(Player.id, Player.id, Player.club_id, Player.name, Player.category, Player.elo,
+                           Player.wins, Player.losses, WhatsAppUser.phone_number, Player.avatar_url)
+                    .outerjoin(WhatsAppUser, WhatsAppUser.id == Player.owner_id))
+        return consulta.where(Player.club_id == club_id) if club_id is not None else consulta, Player.id
+    # Partidos terminados con ganador, por orden de id: se recorre la tabla
+    # una vez en total (no una por página) aunque el club tenga pocos
+    p1, p2, ganador = aliased(Player), aliased(Player), aliased(Player)
+    consulta = (select(Match.id, Match.id, p1.club_id, Match.timestamp, p1.name, p2.name, ganador.name, Match.score)
+                .join(p1, p1.id == Match.player_1_id).join(p2, p2.id == Match.player_2_id)
+                .join(ganador, ganador.id == Match.winner_id)
+                .where(Match.is_finished == True))
+    return consulta.where(p1.club_id == club_id) if club_id is not None else consulta, Match.id
+
+def _paginas(tipo, club_id, desde, limite, pagina):
+    from database import sesion_lectura
+    consulta, columna_id = _consulta_exportar(tipo, club_id)
+    ultimo, restantes = desde, limite
+    while restantes is None or restantes > 0:
+        cuantos = pagina if restantes is None else min(pagina, restantes)
+        # Una sesión corta por página: no se retiene una conexión mientras el cliente lee
+        with sesion_lectura() as db:
+            filas = db.execute(consulta.where(columna_id > ultimo).order_by(columna_id).limit(cuantos)).all()
+        if not filas:
+            return
+        ultimo = filas[-1][0]
+        if restantes is not None:
+            restantes -= len(filas)
+        yield [fila[1:] for fila in filas]
+        if len(filas) < cuantos:
+            return
+
+def _valor_exportado(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+def exportar(tipo, club_id=None, formato="csv", desde=0, limite=None, pagina=EXPORT_PAGINA):
+    """
+    Generador de texto: una página de filas por trozo, en orden de id.
+    Para seguir después de un corte, desde = último id recibido. Lo
+    exportado se vuelve a importar tal cual (el id se ignora).
+    """
+    if tipo not in COLUMNAS:
+        raise ErrorImportacion(f"Tipo desconocido: {tipo} ({', '.join(TIPOS)})")
+    if formato not in FORMATOS:
+        raise ErrorImportacion(f"Formato desconocido: {formato} (csv o ndjson)")
+    columnas = COLUMNAS[tipo]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    if formato == "csv":
+        escritor.writerow(columnas)
+    for filas in _paginas(tipo, club_id, desde, limite, pagina):
+        for fila in filas:
+            valores = [_valor_exportado(v) for v in fila]
+            if formato == "csv":
+                escritor.writerow(valores)
+            else:
+                buffer.write(json.dumps(dict(zip(columnas, valores)), ensure_ascii=False) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Importa o exporta clubes, jugadores y partidos (CSV o NDJSON).")
+    sub = parser.add_subparsers(dest="orden", required=True)
+    imp = sub.add_parser("importar")
+    imp.add_argument("tipo", choices=TIPOS)
+    imp.add_argument("archivo", help="ruta (.csv, .ndjson, .jsonl, opcionalmente .gz) o - para stdin")
+    imp.add_argument("--club", type=int, default=None, help="club de todas las filas (si no, columna club_id)")
+    imp.add_argument("--formato", choices=FORMATOS, default=None, help="por defecto, según la extensión")
+    imp.add_argument("--lote", type=int, default=IMPORT_LOTE)
+    imp.add_argument("--replay", action="store_true", help="recalcula el ranking de los clubes importados")
+    exp = sub.add_parser("exportar")
+    exp.add_argument("tipo", choices=TIPOS)
+    exp.add_argument("--club", type=int, default=None)
+    exp.add_argument("--formato", choices=FORMATOS, default="csv")
+    exp.add_argument("--desde", type=int, default=0, help="exporta ids mayores a este")
+    exp.add_argument("--limite", type=int, default=None)
+    exp.add_argument("--salida", default="-", help="ruta (.gz comprime) o - para stdout")
+    args = parser.parse_args()
+
+    if args.orden == "importar":
+        with abrir(args.archivo) as archivo:
+            formato = args.formato or formato_de(args.archivo)
+            resumen = importar(args.tipo, leer_filas(archivo, formato), args.club, args.lote, args.replay)
+        print(json.dumps(resumen, ensure_ascii=False, indent=2), file=sys.stderr)
+        sys.exit(1 if resumen["errores"] else 0)
+
+    if args.salida == "-":
+        salida = sys.stdout
+    elif args.salida.endswith(".gz"):
+        salida = gzip.open(args.salida, "wt", encoding="utf-8", newline="")
+    else:
+        salida = open(args.salida, "w", encoding="utf-8", newline="")
+    try:
+        for trozo in exportar(args.tipo, args.club, args.formato, args.desde, args.limite):
+            salida.write(trozo)
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+
+if __name__ == "__main__":
+    main()
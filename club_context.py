@@ -0,0 +1,280 @@
+import os
+import time
+import threading
+from sqlalchemy.orm import Session
+from models import Player, Tournament, Match, WhatsAppUser
+from enrollments import ids_inscritos
+from leaderboard import Tabla
+import events
+
+# --- FOTO DEL CLUB EN MEMORIA (CONTEXTO PARA LA IA) ---
+# En vez de consultar torneo + ranking en cada mensaje, cada club tiene una
+# "foto" que se carga una vez y se actualiza con los eventos de escritura.
+# Leer top-N, el puesto de un jugador o sus partidos pendientes no toca la BD.
+#
+# Si llega un evento que no sabemos aplicar, la foto se descarta y se vuelve
+# a cargar en la siguiente lectura. CONTEXTO_TTL es la red de seguridad para
+# cambios hechos por otro proceso. Cargar un club no frena a los demás: la
+# consulta corre fuera del lock global.
+
+CONTEXTO_TTL = float(os.getenv("CONTEXTO_TTL", "300"))
+CONTEXTO_TOP_N = int(os.getenv("CONTEXTO_TOP_N", "3"))
+# Línea del contexto que depende de quien escribe (el resto es del club)
+PROPIOS = "- Jugadores de este celular:"
+
+
+def parte_del_club(texto):
+    return "\n".join(linea for linea in texto.split("\n") if not linea.startswith(PROPIOS))
+
+
+class ClubSnapshot:
+    def __init__(self, club_id):
+        self.club_id = club_id
+        self.cargado_en = time.monotonic()
+        self.torneo = None                 # {"id", "name", "category", "status"}
+        self.inscritos: set[int] = set()
+        self.jugadores: dict[int, dict] = {}   # id -> {"name", "elo", "category", "telefono"}
+        self.por_telefono: dict[str, set[int]] = {}
+        self.tabla = Tabla()   # ranking ordenado: puesto y top sin reordenar
+        self.pendientes: dict[int, tuple[int, int]] = {}   # match_id -> (p1, p2)
+        self.pendiente_de: dict[int, int] = {}   # player_id -> match_id pendiente
+        self.huecos: dict[int, list] = {}   # match_id -> [p1, p2] del cuadro con algún rival por definir
+
+    # --- CARGA INICIAL (única vez que se consulta la BD) ---
+    @classmethod
+    def cargar(cls, db: Session, club_id):
+        foto = cls(club_id)
+        torneo = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status != "finished").first()
+        if torneo:
+            foto.torneo = {"id": torneo.id, "name": torneo.name, "category": torneo.category, "status": torneo.status}
+            foto.inscritos = set(ids_inscritos(db, torneo))
+            for m in db.query(Match.id, Match.player_1_id, Match.player_2_id).filter(
+                    Match.tournament_id == torneo.id, Match.is_finished == False):
+                foto._agregar_partido(m.id, m.player_1_id, m.player_2_id)
+
+        filas = (db.query(Player.id, Player.name, Player.elo, Player.category, WhatsAppUser.phone_number)
+                 .outerjoin(WhatsAppUser, Player.owner_id == WhatsAppUser.id)
+                 .filter(Player.club_id == club_id))
+        for f in filas:
+            foto._agregar_jugador(f.id, f.name, f.elo, f.category, f.phone_number)
+        return foto
+
+    def _agregar_jugador(self, player_id, nombre, elo, categoria, telefono=None):
+        self.jugadores[player_id] = {"name": nombre, "elo": elo if elo is not None else 1200,
+                                     "category": categoria, "telefono": telefono}
+        self.tabla.agregar(player_id, nombre, elo, categoria)
+        if telefono:
+            self.por_telefono.setdefault(telefono, set()).add(player_id)
+
+    def _agregar_pendiente(self, match_id, p1, p2):
+        self.pendientes[match_id] = (p1, p2)
+        self.pendiente_de[p1] = match_id
+        self.pendiente_de[p2] = match_id
+
+    def _agregar_partido(self, match_id, p1, p2):
+        # Partido del cuadro: pendiente si ya tiene los dos jugadores, si no, hueco
+        if p1 is not None and p2 is not None:
+            self._agregar_pendiente(match_id, p1, p2)
+        else:
+            self.huecos[match_id] = [p1, p2]
+
+    def _avanzar(self, match_id, posicion, player_id):
+        # Idempotente: la foto pudo cargarse con el avance ya hecho
+        if match_id in self.pendientes:
+            return True
+        hueco = self.huecos.get(match_id)
+        if hueco is None:
+            return False
+        hueco[posicion - 1] = player_id
+        if None not in hueco:
+            del self.huecos[match_id]
+            self._agregar_pendiente(match_id, *hueco)
+        return True
+
+    def _quitar_pendiente(self, match_id):
+        for pid in self.pendientes.pop(match_id, ()):
+            if self.pendiente_de.get(pid) == match_id:
+                del self.pendiente_de[pid]
+
+    # --- ACTUALIZACIÓN POR EVENTOS ---
+    # Devuelve False si el evento no se pudo aplicar (hay que recargar)
+    def aplicar(self, evento):
+        tipo = evento["tipo"]
+        if tipo == events.JUGADOR_CREADO:
+            # Idempotente: la foto pudo cargarse justo después del commit
+            if evento["player_id"] in self.jugadores:
+                return True
+            self._agregar_jugador(evento["player_id"], evento["nombre"], evento.get("elo"),
+                                  evento.get("categoria"), evento.get("telefono"))
+        elif tipo == events.TORNEO_CREADO:
+            self.torneo = {"id": evento["torneo_id"], "name": evento.get("nombre"),
+                           "category": evento.get("categoria"), "status": evento.get("status", "inscription")}
+            self.inscritos = set()
+            self.pendientes, self.pendiente_de, self.huecos = {}, {}, {}
+        elif tipo == events.INSCRIPCION:
+            if not self.torneo or self.torneo["id"] != evento["torneo_id"]:
+                return False
+            self.inscritos.add(evento["player_id"])
+        elif tipo == events.CUADROS_GENERADOS:
+            if "partidos" not in evento:
+                return False
+            for match_id, p1, p2, *_ in evento["partidos"]:
+                self._agregar_partido(match_id, p1, p2)
+        elif tipo == events.TORNEO_ESTADO:
+            if not self.torneo or self.torneo["id"] != evento["torneo_id"]:
+                return False
+            if evento["status"] == "finished":
+                self.torneo, self.inscritos = None, set()
+                self.pendientes, self.pendiente_de, self.huecos = {}, {}, {}
+            else:
+                self.torneo["status"] = evento["status"]
+        elif tipo == events.PARTIDO_REGISTRADO:
+            if "elos" not in evento:
+                return False
+            self._quitar_pendiente(evento.get("match_id"))
+            for match_id, posicion, player_id, *_ in evento.get("avances", ()):
+                if not self._avanzar(match_id, posicion, player_id):
+                    return False
+            for pid, elo in evento["elos"].items():
+                if int(pid) in self.jugadores:
+                    self.jugadores[int(pid)]["elo"] = elo
+                    self.tabla.mover(int(pid), elo)
+        else:
+            return False
+        return True
+
+    # --- LECTURAS SIN BD (puesto en O(log n)) ---
+    def top(self, n=CONTEXTO_TOP_N):
+        return [(j["id"], self.jugadores[j["id"]]) for j in self.tabla.pagina(0, n)]
+
+    def puesto(self, player_id):
+        return self.tabla.puesto(player_id)
+
+    def jugadores_de(self, telefono):
+        return self.por_telefono.get(telefono, set())
+
+    def partido_pendiente(self, player_id):
+        match_id = self.pendiente_de.get(player_id)
+        if match_id is None:
+            return None
+        p1, p2 = self.pendientes[match_id]
+        return match_id, (p2 if p1 == player_id else p1)
+
+    @property
+    def inscripcion_abierta(self):
+        return bool(self.torneo and self.torneo["status"] == "inscription")
+
+    def nombre(self, player_id):
+        jugador = self.jugadores.get(player_id)
+        return jugador["name"] if jugador else f"Jugador {player_id}"
+
+    def texto(self, telefono=None, top_n=CONTEXTO_TOP_N):
+        info_torneo = "No hay torneos activos."
+        if self.torneo:
+            info_torneo = (f"TORNEO ACTIVO: '{self.torneo['name']}' ({self.torneo['category'] or 'General'}). "
+                           f"Estado: {self.torneo['status']}. Inscritos: {len(self.inscritos)}.")
+        ranking_txt = ", ".join(f"{j['name']} ({j['elo']})" for _, j in self.top(top_n))
+        lineas = [f"CLUB ID {self.club_id}:", f"- {info_torneo}", f"- Top {top_n}: {ranking_txt}"]
+
+        # Lo que le importa a quien escribe: sus jugadores, puesto y próximo rival
+        propios = []
+        for pid in sorted(self.jugadores_de(telefono)) if telefono else []:
+            j = self.jugadores[pid]
+            detalle = f"{j['name']} (#{self.puesto(pid)}, {j['elo']} pts"
+            if pid in self.inscritos:
+                detalle += ", inscrito"
+            pendiente = self.partido_pendiente(pid)
+            if pendiente:
+                detalle += f", partido pendiente vs {self.nombre(pendiente[1])}"
+            propios.append(detalle + ")")
+        if propios:
+            lineas.append(f"{PROPIOS} {'; '.join(propios)}")
+        return "\n".join(lineas)
+
+
+class ContextoClubes:
+    def __init__(self, ttl=CONTEXTO_TTL):
+        self.ttl = ttl
+        self.fotos: dict[int, ClubSnapshot] = {}
+        self.lock = threading.RLock()
+        # Carga en frío FUERA del lock global (una por club a la vez): mientras
+        # tanto los eventos de ese club se guardan y se aplican a la foto nueva
+        self.locks_carga: dict[int, threading.Lock] = {}
+        self.durante_carga: dict[int, list] = {}
+        self.contadores = {"cargas": 0, "lecturas": 0, "eventos": 0, "descartes": 0}
+
+    def _vigente(self, foto):
+        return foto is not None and time.monotonic() - foto.cargado_en <= self.ttl
+
+    # No llamar con self.lock tomado: la carga espera el lock del club
+    def obtener(self, db: Session, club_id) -> ClubSnapshot:
+        with self.lock:
+            self.contadores["lecturas"] += 1
+            foto = self.fotos.get(club_id)
+            if self._vigente(foto):
+                return foto
+            lock_carga = self.locks_carga.setdefault(club_id, threading.Lock())
+
+        with lock_carga:
+            # Quien esperaba la carga de otro hilo ya la encuentra hecha
+            with self.lock:
+                foto = self.fotos.get(club_id)
+                if self._vigente(foto):
+                    return foto
+                self.durante_carga[club_id] = []
+            try:
+                foto = ClubSnapshot.cargar(db, club_id)
+            finally:
+                with self.lock:
+                    eventos = self.durante_carga.pop(club_id)
+            with self.lock:
+                self.contadores["cargas"] += 1
+                # None = alguien descartó el club durante la carga: no se guarda
+                if None not in eventos and all(foto.aplicar(e) for e in eventos):
+                    self.fotos[club_id] = foto
+                else:
+                    self.fotos.pop(club_id, None)
+            return foto
+
+    # El texto se arma con el lock tomado: aplicar() muta la misma foto desde
+    # los hilos del worker y recorrerla a medias puede romper la iteración.
+    # obtener() va antes y sin el lock: puede cargar de la BD.
+    def resumen(self, db: Session, club_id, telefono=None):
+        foto = self.obtener(db, club_id)
+        with self.lock:
+            return foto.texto(telefono), foto.inscripcion_abierta
+
+    def texto(self, db: Session, club_id, telefono=None):
+        return self.resumen(db, club_id, telefono)[0]
+
+    def aplicar(self, evento):
+        with self.lock:
+            if evento["club_id"] in self.durante_carga:
+                # Se aplica a la foto que se está cargando cuando termine
+                self.contadores["eventos"] += 1
+                self.durante_carga[evento["club_id"]].append(evento)
+                return
+            foto = self.fotos.get(evento["club_id"])
+            if foto is None:
+                return
+            self.contadores["eventos"] += 1
+            if not foto.aplicar(evento):
+                self.descartar(evento["club_id"])
+
+    def descartar(self, club_id=None):
+        with self.lock:
+            self.contadores["descartes"] += 1
+            if club_id is None:
+                self.fotos.clear()
+            else:
+                self.fotos.pop(club_id, None)
+            for club, eventos in self.durante_carga.items():
+                if club_id is None or club == club_id:
+                    eventos.append(None)
+
+    def metricas(self):
+        return {"clubes_en_memoria": len(self.fotos), **self.contadores}
+
+# Instancia global para usar en todo el proyecto
+contextos = ContextoClubes()
+events.suscribir(contextos.aplicar)
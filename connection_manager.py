@@ -1,27 +1,173 @@
+import os
+import time
+import asyncio
+from collections import deque
 from fastapi import WebSocket
 
 # --- GESTOR DE WEBSOCKETS MULTI-CANAL (SAAS) ---
+# Cada TV conectada tiene su propia cola de salida y su propia tarea
+# escritora. broadcast() solo encola (no espera a nadie), así una pantalla
+# lenta o medio muerta no frena a las demás:
+#   - cola llena -> la TV no da abasto y se expulsa (al reconectar pide la foto)
+#   - send_text que tarda más de WS_ENVIO_TIMEOUT (lo mira el vigilante) o falla -> se expulsa
+#   - sin noticias de la TV en WS_TIMEOUT (no contesta el ping) -> se expulsa
+# Todo esto corre en el event loop: broadcast() se llama desde el loop.
+
+WS_COLA_MAX = int(os.getenv("WS_COLA_MAX", "64"))
+WS_ENVIO_TIMEOUT = float(os.getenv("WS_ENVIO_TIMEOUT", "5"))
+WS_PING_INTERVALO = float(os.getenv("WS_PING_INTERVALO", "20"))
+WS_TIMEOUT = float(os.getenv("WS_TIMEOUT", "60"))
+PING = '{"tipo":"ping"}'
+
+
+class Conexion:
+    def __init__(self, websocket: WebSocket, club_id: int, maxsize):
+        self.websocket = websocket
+        self.club_id = club_id
+        self.cola = asyncio.Queue(maxsize=maxsize)   # (encolado_en, mensaje)
+        self.ultimo_visto = time.monotonic()
+        self.enviando_desde = None   # monotonic del send_text en curso (para el vigilante)
+        self.escritor = None
+        self.abierta = True
+
+
 class ConnectionManager:
-    def __init__(self):
-        # Diccionario: { club_id: [lista_de_conexiones] }
-        self.active_connections: dict[int, list[WebSocket]] = {}
+    def __init__(self, cola_max=WS_COLA_MAX, envio_timeout=WS_ENVIO_TIMEOUT,
+                 ping_intervalo=WS_PING_INTERVALO, timeout=WS_TIMEOUT):
+        # Diccionario: { club_id: {conexiones} } + índice por socket para soltar en O(1)
+        self.active_connections: dict[int, set[Conexion]] = {}
+        self.por_socket: dict[WebSocket, Conexion] = {}
+        self.cola_max = cola_max
+        self.envio_timeout = envio_timeout
+        self.ping_intervalo = ping_intervalo
+        self.timeout = timeout
+        self.vigilante = None
+        self.lags = deque(maxlen=2000)   # últimos retrasos cola -> socket (segundos)
+        self.contadores = {"conexiones": 0, "desconexiones": 0, "encolados": 0, "enviados": 0,
+                           "descartados": 0, "expulsados_lentos": 0, "expulsados_error": 0,
+                           "expulsados_sin_latido": 0}
+
+    # --- CICLO DE VIDA ---
+    async def start(self):
+        if self.vigilante is None:
+            self.vigilante = asyncio.create_task(self._vigilar())
+
+    async def stop(self):
+        if self.vigilante:
+            self.vigilante.cancel()
+            await asyncio.gather(self.vigilante, return_exceptions=True)
+            self.vigilante = None
+        await asyncio.gather(*(self._cerrar(c, 1001) for c in list(self.por_socket.values())),
+                             return_exceptions=True)
 
     async def connect(self, websocket: WebSocket, club_id: int):
         await websocket.accept()
-        if club_id not in self.active_connections:
-            self.active_connections[club_id] = []
-        self.active_connections[club_id].append(websocket)
+        conexion = Conexion(websocket, club_id, self.cola_max)
+        self.active_connections.setdefault(club_id, set()).add(conexion)
+        self.por_socket[websocket] = conexion
+        conexion.escritor = asyncio.create_task(self._escribir(conexion))
+        self.contadores["conexiones"] += 1
+        return conexion
+
+    def disconnect(self, websocket: WebSocket, club_id: int = None):
+        conexion = self.por_socket.pop(websocket, None)
+        if conexion is None:
+            return None
+        conexion.abierta = False
+        conexiones = self.active_connections.get(conexion.club_id)
+        if conexiones is not None:
+            conexiones.discard(conexion)
+            if not conexiones:
+                del self.active_connections[conexion.club_id]
+        if conexion.escritor and conexion.escritor is not asyncio.current_task():
+            conexion.escritor.cancel()
+        self.contadores["desconexiones"] += 1
+        return conexion
+
+    # La TV habló (pong u otro mensaje): sigue viva
+    def visto(self, websocket: WebSocket):
+        conexion = self.por_socket.get(websocket)
+        if conexion:
+            conexion.ultimo_visto = time.monotonic()
+
+    # --- FAN-OUT: solo encola, nunca espera a un socket ---
+    def broadcast(self, message: str, club_id: int):
+        # Solo enviamos mensaje a las TVs de ESTE club específico.
+        # Devuelve en cuántas colas quedó el mensaje.
+        ahora = time.monotonic()
+        encolados = 0
+        for conexion in list(self.active_connections.get(club_id, ())):
+            try:
+                conexion.cola.put_nowait((ahora, message))
+                encolados += 1
+            except asyncio.QueueFull:
+                self.contadores["descartados"] += 1
+                self._expulsar(conexion, "expulsados_lentos", 1013)
+        self.contadores["encolados"] += encolados
+        return encolados
+
+    async def _escribir(self, conexion: Conexion):
+        try:
+            while True:
+                encolado_en, mensaje = await conexion.cola.get()
+                # Sin wait_for por mensaje (crea una tarea cada vez): el vigilante
+                # corta los envíos que pasan de envio_timeout
+                conexion.enviando_desde = time.monotonic()
+                await conexion.websocket.send_text(mensaje)
+                conexion.enviando_desde = None
+                self.lags.append(time.monotonic() - encolado_en)
+                self.contadores["enviados"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket roto: soltarla sin afectar a las demás
+            self._expulsar(conexion, "expulsados_error", 1011)
+
+    def _expulsar(self, conexion: Conexion, motivo, codigo):
+        if self.disconnect(conexion.websocket) is not None:
+            self.contadores[motivo] += 1
+            asyncio.get_running_loop().create_task(self._cerrar(conexion, codigo))
+
+    async def _cerrar(self, conexion: Conexion, codigo):
+        self.disconnect(conexion.websocket)
+        try:
+            await asyncio.wait_for(conexion.websocket.close(code=codigo), self.envio_timeout)
+        except Exception:
+            pass
+
+    # --- VIGILANTE: envíos colgados, ping periódico y TVs que no contestan ---
+    async def _vigilar(self):
+        tic = max(0.05, self.envio_timeout / 2)
+        if self.ping_intervalo > 0:
+            tic = min(tic, self.ping_intervalo)
+        ultimo_ping = time.monotonic()
+        while True:
+            await asyncio.sleep(tic)
+            ahora = time.monotonic()
+            for conexion in list(self.por_socket.values()):
+                if conexion.enviando_desde is not None and ahora - conexion.enviando_desde > self.envio_timeout:
+                    self._expulsar(conexion, "expulsados_error", 1011)
+                elif self.ping_intervalo > 0 and ahora - conexion.ultimo_visto > self.timeout:
+                    self._expulsar(conexion, "expulsados_sin_latido", 1001)
+            if self.ping_intervalo > 0 and ahora - ultimo_ping >= self.ping_intervalo:
+                ultimo_ping = ahora
+                for club_id in list(self.active_connections):
+                    self.broadcast(PING, club_id)
 
-    def disconnect(self, websocket: WebSocket, club_id: int):
-        if club_id in self.active_connections:
-            if websocket in self.active_connections[club_id]:
-                self.active_connections[club_id].remove(websocket)
+    def total(self):
+        return len(self.por_socket)
 
-    async def broadcast(self, message: str, club_id: int):
-        # Solo enviamos mensaje a las TVs de ESTE club específico
-        if club_id in self.active_connections:
-            for connection in self.active_connections[club_id]:
-                await connection.send_text(message)
+    def metricas(self):
+        lags = sorted(self.lags)
+        p = lambda q: round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 2) if lags else 0.0
+        return {
+            "conexiones_activas": self.total(),
+            "por_club": {club_id: len(c) for club_id, c in self.active_connections.items()},
+            "en_colas": sum(c.cola.qsize() for c in self.por_socket.values()),
+            "cola_mas_llena": max((c.cola.qsize() for c in self.por_socket.values()), default=0),
+            "lag_ms_p50": p(0.5), "lag_ms_p99": p(0.99), "lag_ms_max": round(lags[-1] * 1000, 2) if lags else 0.0,
+            **self.contadores,
+        }
 
 # Instancia global para usar en todo el proyecto
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
@@ -1,25 +1,276 @@
 import os
-from sqlalchemy import create_engine
+import time
+import random
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError, DBAPIError
 from sqlalchemy.orm import sessionmaker
+from observability import instrumentar_engine
 
 # 1. Obtener la dirección de la base de datos (Nube o Local)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./club_squash.db")
+# Réplica de solo lectura para las vistas de las TVs (opcional)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
 
-# 2. Ajuste técnico para Render (PostgreSQL)
-if DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
-    engine = create_engine(DATABASE_URL)
-else:
-    # Configuración para SQLite (Local)
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# --- CONFIGURACIÓN DEL POOL Y DEL MOTOR ---
+# El pool tiene que alcanzar para los hilos del executor (EXECUTOR_WORKERS=16)
+# más las rutas síncronas de FastAPI; si no, los hilos se quedan esperando
+# conexión en vez de trabajar.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))        # Segundos esperando conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # Render corta conexiones ociosas
+DB_PRE_PING = os.getenv("DB_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))   # Solo PostgreSQL
+# Tras un cambio en un club, sus vistas se leen del primario durante estos
+# segundos (la réplica puede ir atrasada)
+DB_REPLICA_RETRASO = float(os.getenv("DB_REPLICA_RETRASO", "5"))
+# DB_ASYNC=1 necesita sqlalchemy[asyncio] (greenlet), aiosqlite y asyncpg (requirements.txt)
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
 
-# 3. Crear el generador de sesiones
+# SQLite: WAL deja leer mientras alguien escribe; busy_timeout espera el
+# candado en vez de fallar al instante con "database is locked".
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "64"))
+
+
+# 2. Ajuste técnico para Render (PostgreSQL) y drivers por modo
+def normalizar_url(url, asincrono=False):
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        driver = "asyncpg" if asincrono else "psycopg2"
+        return "postgresql+" + driver + "://" + url.split("://", 1)[1]
+    if asincrono and url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+def _es_sqlite_en_memoria(url):
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+def _opciones_engine(url, asincrono=False):
+    opciones = {"pool_pre_ping": DB_PRE_PING}
+    if url.startswith("sqlite"):
+        if not asincrono:
+            opciones["connect_args"] = {"check_same_thread": False}
+        if _es_sqlite_en_memoria(url):
+            return opciones   # una sola conexión por hilo: no hay pool que dimensionar
+    else:
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            if asincrono:
+                opciones["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+            else:
+                opciones["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+        opciones["pool_recycle"] = DB_POOL_RECYCLE
+    opciones.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return opciones
+
+
+def _configurar_sqlite(engine, url):
+    # pysqlite maneja mal las transacciones (y los SAVEPOINT de begin_nested):
+    # le quitamos el control y emitimos nosotros el BEGIN. Las escrituras con
+    # contención piden execution_options(sqlite_begin="IMMEDIATE") para tomar
+    # el candado de escritura al inicio y esperar en vez de chocar.
+    en_memoria = _es_sqlite_en_memoria(url)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not en_memoria:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_begin(conn):
+        modo = conn.get_execution_options().get("sqlite_begin", "")
+        conn.exec_driver_sql(f"BEGIN {modo}".strip())
+
+
+# --- MÉTRICAS DEL POOL ---
+# Cuántas conexiones están prestadas ahora, el pico y cuántas se abrieron o
+# invalidaron. Si en_uso se queda pegado en la capacidad, subir DB_POOL_SIZE.
+class MedidorPool:
+    def __init__(self, nombre, engine):
+        self.nombre = nombre
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.en_uso = 0
+        self.contadores = {"prestamos": 0, "pico_en_uso": 0, "conexiones_abiertas": 0, "invalidadas": 0}
+        event.listen(engine, "checkout", self._prestada)
+        event.listen(engine, "checkin", self._devuelta)
+        event.listen(engine, "connect", self._abierta)
+        event.listen(engine, "invalidate", self._invalidada)
+
+    def _prestada(self, *args):
+        with self.lock:
+            self.en_uso += 1
+            self.contadores["prestamos"] += 1
+            self.contadores["pico_en_uso"] = max(self.contadores["pico_en_uso"], self.en_uso)
+
+    def _devuelta(self, *args):
+        with self.lock:
+            self.en_uso = max(0, self.en_uso - 1)
+
+    def _abierta(self, *args):
+        with self.lock:
+            self.contadores["conexiones_abiertas"] += 1
+
+    def _invalidada(self, *args):
+        with self.lock:
+            self.contadores["invalidadas"] += 1
+
+    def metricas(self):
+        pool = self.engine.pool
+        capacidad = None
+        if hasattr(pool, "size") and hasattr(pool, "_max_overflow"):
+            capacidad = pool.size() + max(0, pool._max_overflow)
+        with self.lock:
+            salida = {"motor": self.engine.dialect.name, "pool": type(pool).__name__, "en_uso": self.en_uso,
+                      "capacidad": capacidad, **self.contadores}
+        if capacidad:
+            salida["uso_pct"] = round(100 * self.en_uso / capacidad, 1)
+        return salida
+
+
+# 3. Fábrica de motores (principal, réplica y asíncrono usan la misma config)
+def crear_engine(url, nombre="principal"):
+    url = normalizar_url(url)
+    engine = create_engine(url, **_opciones_engine(url))
+    if url.startswith("sqlite"):
+        _configurar_sqlite(engine, url)
+    medidores[nombre] = MedidorPool(nombre, engine)
+    instrumentar_engine(engine, nombre)
+    return engine
+
+def crear_engine_async(url, nombre="async"):
+    # Requiere sqlalchemy[asyncio] y el driver: asyncpg (PostgreSQL) o aiosqlite (SQLite)
+    from sqlalchemy.ext.asyncio import create_async_engine
+    url = normalizar_url(url, asincrono=True)
+    engine = create_async_engine(url, **_opciones_engine(url, asincrono=True))
+    if url.startswith("sqlite"):
+        _configurar_sqlite(engine.sync_engine, url)
+    medidores[nombre] = MedidorPool(nombre, engine.sync_engine)
+    instrumentar_engine(engine.sync_engine, nombre)
+    return engine
+
+medidores: dict[str, MedidorPool] = {}
+
+engine = crear_engine(DATABASE_URL)
+engine_lectura = crear_engine(DATABASE_READ_URL, "replica") if DATABASE_READ_URL else engine
+
+# 4. Crear el generador de sesiones
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura) \
+    if DATABASE_READ_URL else SessionLocal
+
+# Sesiones asíncronas para las vistas de solo lectura (DB_ASYNC=1): la
+# consulta no ocupa un hilo del pool mientras espera a la BD. El motor se
+# crea al primer uso (y apunta a la réplica si hay).
+_async = {}
+
+def nueva_sesion_async():
+    if "fabrica" not in _async:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        motor = crear_engine_async(DATABASE_READ_URL or DATABASE_URL)
+        _async["engine"] = motor
+        _async["fabrica"] = async_sessionmaker(motor, autoflush=False, expire_on_commit=False)
+    return _async["fabrica"]()
+
+async def cerrar_async():
+    if "engine" in _async:
+        await _async.pop("engine").dispose()
+        _async.pop("fabrica", None)
+
+def metricas_pool():
+    return {nombre: medidor.metricas() for nombre, medidor in medidores.items()}
 
-# 4. Función para que los otros archivos pidan la base de datos
+
+# 5. Función para que los otros archivos pidan la base de datos
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_db_lectura():
+    db = SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# --- UNIDAD DE TRABAJO ---
+# Una sesión por tarea: commit si todo salió bien, rollback si algo falló y
+# siempre close (la conexión vuelve al pool). Reemplaza los next(get_db()).
+@contextmanager
+def unidad_de_trabajo():
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Solo lectura: réplica si hay, salvo que se pida el primario (fresca=True)
+@contextmanager
+def sesion_lectura(fresca=False):
+    db = SessionLocal() if fresca else SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def sesion_async():
+    db = nueva_sesion_async()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# 6. Transacción de escritura con reintento si la BD estaba ocupada
+# ("database is locked" en SQLite, deadlock/serialización en PostgreSQL).
+# trabajo() hace los cambios SIN commit; aquí se hace el commit.
+REINTENTOS_BLOQUEO = 12
+
+def es_bloqueo(error):
+    mensaje = str(getattr(error, "orig", error)).lower()
+    codigo = getattr(getattr(error, "orig", None), "pgcode", None)
+    return "locked" in mensaje or "deadlock" in mensaje or codigo in ("40001", "40P01")
+
+def empezar_escritura(db):
+    # SQLite: BEGIN IMMEDIATE toma el candado de escritura al empezar (si hay
+    # otro escritor, espera busy_timeout en vez de fallar al subir de lectura
+    # a escritura). Solo vale al abrir la transacción: si la sesión ya leyó
+    # algo, sigue la que está (quien llama debe empezar antes de leer).
+    if db.get_bind().dialect.name == "sqlite" and not db.in_transaction():
+        db.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+def con_reintentos(db, trabajo):
+    for intento in range(REINTENTOS_BLOQUEO):
+        try:
+            empezar_escritura(db)
+            resultado = trabajo()
+            db.commit()
+            return resultado
+        except (OperationalError, DBAPIError) as e:
+            db.rollback()
+            if not es_bloqueo(e) or intento == REINTENTOS_BLOQUEO - 1:
+                raise
+            time.sleep(random.uniform(0, min(0.5, 0.01 * (2 ** intento))))
+        except Exception:
+            db.rollback()
+            raise
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import events
+
+# --- CACHÉ DE DECISIONES DE LA IA ---
+# Mensajes iguales (o casi) con el mismo contexto del club y el mismo rol
+# producen la misma decisión: no hace falta pagar otra llamada a OpenAI.
+#
+# Clave = texto normalizado + hash del contexto + rol + versión del club.
+# Cada evento del club sube su versión, así que lo anterior deja de servir
+# al instante y termina saliendo por TTL/LRU. El contexto que entra al hash
+# es solo la parte del club (ver ai_service.decidir): así socios distintos
+# comparten entrada. Si el mensaje habla de quien escribe ("me", "mi",
+# "inscríbeme"...), entran también sus jugadores y la entrada es por celular.
+#
+# Single-flight: si llegan N peticiones idénticas a la vez, solo una va a la
+# IA y las demás esperan su resultado.
+
+DECISION_CACHE_BACKEND = os.getenv("DECISION_CACHE_BACKEND", "memoria")  # memoria | sqlite
+DECISION_CACHE_PATH = os.getenv("DECISION_CACHE_PATH", "./decision_cache.db")
+DECISION_CACHE_TTL = float(os.getenv("DECISION_CACHE_TTL", "600"))
+DECISION_CACHE_MAX = int(os.getenv("DECISION_CACHE_MAX", "5000"))
+# SQLite: el COUNT(*) para recortar al máximo se hace cada tantas escrituras
+# (entre recortes la tabla puede pasarse del máximo en hasta ese número)
+DECISION_CACHE_PODA_CADA = int(os.getenv("DECISION_CACHE_PODA_CADA", str(max(1, DECISION_CACHE_MAX // 20))))
+
+
+def normalizar_texto(texto):
+    texto = unicodedata.normalize("NFD", (texto or "").lower())
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    texto = re.sub(r"[^\w\s-]", " ", texto)
+    return " ".join(texto.split())
+
+
+# Primera persona: la respuesta depende de los jugadores de quien escribe.
+# Mejor pasarse (solo cuesta un fallo de caché) que quedarse corto: una
+# respuesta sobre "mi partido" no puede servirse a otro socio.
+_PRIMERA_PERSONA = re.compile(
+    r"\b(?:me|mi|mis|yo|mio|mia|mios|mias|conmigo|nos|nuestr[oa]s?|"
+    r"juego|jugue|juegue|gane|perdi|tengo|voy|estoy|soy|quiero|puedo|necesito|debo|quede|sigo|"
+    r"\w{3,}me|\w{2,}nos|\w{3,}mos)\b")
+
+def es_personal(texto):
+    return _PRIMERA_PERSONA.search(normalizar_texto(texto)) is not None
+
+
+# --- BACKENDS ---
+# Interfaz mínima: obtener(clave) -> dict | None, guardar(clave, valor, ttl),
+# version(club_id), subir_version(club_id), tamano(), limpiar().
+# La versión del club vive en el backend para que un backend compartido
+# también se invalide cuando el cambio ocurre en otro worker.
+# bloqueante=True: hace I/O, así que desde el event loop se llama en un hilo.
+
+class MemoriaBackend:
+    bloqueante = False
+
+    def __init__(self, max_items=DECISION_CACHE_MAX):
+        self.max_items = max_items
+        self.datos: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.versiones: dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.expulsiones = 0
+        self.expiraciones = 0
+
+    def obtener(self, clave):
+        with self.lock:
+            item = self.datos.get(clave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira < time.time():
+                del self.datos[clave]
+                self.expiraciones += 1
+                return None
+            self.datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor, ttl):
+        with self.lock:
+            self.datos[clave] = (time.time() + ttl, valor)
+            self.datos.move_to_end(clave)
+            while len(self.datos) > self.max_items:
+                self.datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def version(self, club_id):
+        return self.versiones.get(club_id, 0)
+
+    def subir_version(self, club_id):
+        with self.lock:
+            self.versiones[club_id] = self.versiones.get(club_id, 0) + 1
+
+    def tamano(self):
+        return len(self.datos)
+
+    def limpiar(self):
+        with self.lock:
+            self.datos.clear()
+
+
+class SQLiteBackend:
+    # Compartido entre procesos/workers de uvicorn en la misma máquina
+    bloqueante = True
+
+    def __init__(self, ruta=DECISION_CACHE_PATH, max_items=DECISION_CACHE_MAX, poda_cada=DECISION_CACHE_PODA_CADA):
+        self.ruta = ruta
+        self.max_items = max_items
+        self.poda_cada = poda_cada
+        self.escrituras = 0
+        self.local = threading.local()
+        self.expulsiones = 0
+        self.expiraciones = 0
+        with self._conexion() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS decision_cache (
+                clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL, usado REAL NOT NULL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS ix_decision_cache_usado ON decision_cache (usado)")
+            con.execute("""CREATE TABLE IF NOT EXISTS decision_cache_versiones (
+                club_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)""")
+
+    def _conexion(self):
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def obtener(self, clave):
+        con = self._conexion()
+        fila = con.execute("SELECT valor, expira FROM decision_cache WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            return None
+        ahora = time.time()
+        if fila[1] < ahora:
+            con.execute("DELETE FROM decision_cache WHERE clave = ?", (clave,))
+            self.expiraciones += 1
+            return None
+        con.execute("UPDATE decision_cache SET usado = ? WHERE clave = ?", (ahora, clave))
+        return json.loads(fila[0])
+
+    def guardar(self, clave, valor, ttl):
+        con = self._conexion()
+        ahora = time.time()
+        con.execute("INSERT OR REPLACE INTO decision_cache (clave, valor, expira, usado) VALUES (?, ?, ?, ?)",
+                    (clave, json.dumps(valor, ensure_ascii=False), ahora + ttl, ahora))
+        self.escrituras += 1
+        if self.escrituras % self.poda_cada:
+            return
+        sobrante = self.tamano() - self.max_items
+        if sobrante > 0:
+            con.execute("""DELETE FROM decision_cache WHERE clave IN (
+                SELECT clave FROM decision_cache ORDER BY usado LIMIT ?)""", (sobrante,))
+            self.expulsiones += sobrante
+
+    def version(self, club_id):
+        fila = self._conexion().execute(
+            "SELECT version FROM decision_cache_versiones WHERE club_id = ?", (club_id,)).fetchone()
+        return fila[0] if fila else 0
+
+    def subir_version(self, club_id):
+        self._conexion().execute("""INSERT INTO decision_cache_versiones (club_id, version) VALUES (?, 1)
+            ON CONFLICT(club_id) DO UPDATE SET version = version + 1""", (club_id,))
+
+    def tamano(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM decision_cache").fetchone()[0]
+
+    def limpiar(self):
+        self._conexion().execute("DELETE FROM decision_cache")
+
+
+# --- EL CACHÉ ---
+class DecisionCache:
+    def __init__(self, backend, ttl=DECISION_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.en_vuelo: dict[str, asyncio.Future] = {}
+        self.contadores = {"aciertos": 0, "fallos": 0, "coalescidas": 0, "invalidaciones": 0}
+
+    def invalidar_club(self, club_id):
+        self.backend.subir_version(club_id)
+        self.contadores["invalidaciones"] += 1
+
+    # Las lecturas/escrituras de un backend en disco no deben frenar el loop
+    async def _backend(self, metodo, *args):
+        fn = getattr(self.backend, metodo)
+        if self.backend.bloqueante:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def clave(self, texto, contexto, rol, club_id=None):
+        huella_contexto = hashlib.sha1((contexto or "").encode()).hexdigest()[:16]
+        version = await self._backend("version", club_id)
+        base = f"{club_id}|{version}|{rol}|{huella_contexto}|{normalizar_texto(texto)}"
+        return hashlib.sha1(base.encode()).hexdigest()
+
+    async def obtener_o_calcular(self, clave, calcular, cacheable=lambda valor: True):
+        """
+        Devuelve la decisión cacheada o ejecuta `calcular()` (corrutina) una
+        sola vez aunque haya varias peticiones idénticas en vuelo.
+        """
+        valor = await self._backend("obtener", clave)
+        if valor is not None:
+            self.contadores["aciertos"] += 1
+            return dict(valor)
+
+        vuelo = self.en_vuelo.get(clave)
+        if vuelo is not None:
+            self.contadores["coalescidas"] += 1
+            return dict(await asyncio.shield(vuelo))
+
+        self.contadores["fallos"] += 1
+        vuelo = asyncio.get_running_loop().create_future()
+        self.en_vuelo[clave] = vuelo
+        try:
+            valor = await calcular()
+            if cacheable(valor):
+                await self._backend("guardar", clave, valor, self.ttl)
+            vuelo.set_result(valor)
+            return dict(valor)
+        except BaseException as e:
+            vuelo.set_exception(e)
+            vuelo.exception()  # Evita el aviso "exception was never retrieved"
+            raise
+        finally:
+            del self.en_vuelo[clave]
+
+    async def metricas(self):
+        consultas = self.contadores["aciertos"] + self.contadores["fallos"]
+        return {
+            "backend": type(self.backend).__name__,
+            "tamano": await self._backend("tamano"),
+            "expulsiones": self.backend.expulsiones,
+            "expiraciones": self.backend.expiraciones,
+            "tasa_aciertos": round(self.contadores["aciertos"] / consultas, 3) if consultas else 0.0,
+            "en_vuelo": len(self.en_vuelo),
+            **self.contadores,
+        }
+
+
+def crear_backend(nombre=DECISION_CACHE_BACKEND):
+    if nombre == "sqlite":
+        return SQLiteBackend()
+    return MemoriaBackend()
+
+# Instancia global para usar en todo el proyecto
+cache = DecisionCache(crear_backend())
+
+# Cualquier cambio en el club invalida sus decisiones cacheadas
+@events.suscribir
+def _invalidar_por_evento(evento):
+    cache.invalidar_club(evento["club_id"])
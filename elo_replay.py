@@ -0,0 +1,322 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models import Player, Match
+import events
+
+# --- RECÁLCULO COMPLETO DEL RANKING (REPLAY) ---
+# Si cambia el K, el Elo inicial o el redondeo de elo.calculate_elo, hay que
+# rehacer TODOS los puntos desde el historial de partidos.
+#
+# Truco: los partidos de un club se reparten en "olas" donde ningún jugador
+# aparece dos veces. Cada jugador ve sus partidos en orden cronológico (ola
+# creciente), así que actualizar una ola entera con NumPy da EXACTAMENTE lo
+# mismo que ir partido por partido. Los clubes no comparten jugadores: se
+# juntan en grupos (una ola abarca todos los clubes del grupo) y cada grupo
+# va a su propio proceso.
+#
+# Ojo: para el Elo por defecto las olas NO son más rápidas que el bucle con
+# calculate_elo (~1.4M partidos/s ambos, ver benchmarks/bench_replay.py):
+# armar las olas es Python puro. El motor está para los modelos enchufables
+# (K por categoría, K provisional, Glicko), no por velocidad. Y el tiempo
+# real de recalcular se va en leer y escribir la BD.
+#
+#   python elo_replay.py --k 32 --procesos 4
+#   python elo_replay.py --glicko --dry-run
+
+REPLAY_PROCESOS = int(os.getenv("REPLAY_PROCESOS", str(os.cpu_count() or 1)))
+REPLAY_LOTE_ESCRITURA = 5000
+# Con menos partidos que esto todo se calcula en el proceso actual: el
+# cálculo va a ~1M partidos/s y arrancar procesos + serializar cuesta más
+REPLAY_MIN_PARALELO = int(os.getenv("REPLAY_MIN_PARALELO", "5000000"))
+
+
+# --- MODELOS DE RATING ---
+# Un modelo sabe crear el estado inicial (arrays por jugador) y actualizar
+# una ola de partidos: índices de ganadores y perdedores sin repetidos.
+
+class ModeloElo:
+    """
+    Elo clásico, igual que elo.calculate_elo con los valores por defecto.
+
+    k_por_categoria: {"Primera": 24, ...} usa el K de la categoría del jugador.
+    k_provisional / partidos_provisionales: K distinto mientras el jugador
+    tenga menos de N partidos (los nuevos suben o bajan más rápido).
+    """
+    def __init__(self, k=32, inicial=1200, redondear=True, k_por_categoria=None,
+                 k_provisional=None, partidos_provisionales=0):
+        self.k = k
+        self.inicial = inicial
+        self.redondear = redondear
+        self.k_por_categoria = k_por_categoria or {}
+        self.k_provisional = k_provisional
+        self.partidos_provisionales = partidos_provisionales
+
+    def estado_inicial(self, n, categorias):
+        k_base = np.array([self.k_por_categoria.get(c, self.k) for c in categorias], dtype=np.float64)
+        return {"rating": np.full(n, float(self.inicial)), "jugados": np.zeros(n, dtype=np.int64), "k": k_base}
+
+    def _k(self, estado, idx):
+        k = estado["k"][idx]
+        if self.k_provisional is not None and self.partidos_provisionales:
+            k = np.where(estado["jugados"][idx] < self.partidos_provisionales, float(self.k_provisional), k)
+        return k
+
+    def actualizar(self, estado, g, p):
+        rating = estado["rating"]
+        rg, rp = rating[g], rating[p]
+        esperado = 1 / (1 + 10 ** ((rp - rg) / 400))
+        cambio_g = self._k(estado, g) * (1 - esperado)
+        cambio_p = self._k(estado, p) * (1 - esperado)
+        if self.redondear:
+            # np.round redondea al par, igual que round() de Python
+            cambio_g, cambio_p = np.round(cambio_g), np.round(cambio_p)
+        rating[g] = rg + cambio_g
+        rating[p] = rp - cambio_p
+
+    def ratings_finales(self, estado):
+        return estado["rating"]
+
+
+class ModeloGlicko:
+    """
+    Glicko-1: cada jugador tiene rating y desviación (RD). Cada partido es
+    su propio periodo; antes de jugar, la RD crece un poco (c) hasta rd_max.
+    """
+    Q = np.log(10) / 400
+
+    def __init__(self, inicial=1200, rd_inicial=350, rd_min=30, rd_max=350, c=15):
+        self.inicial = inicial
+        self.rd_inicial = rd_inicial
+        self.rd_min = rd_min
+        self.rd_max = rd_max
+        self.c = c
+
+    def estado_inicial(self, n, categorias):
+        return {"rating": np.full(n, float(self.inicial)), "rd": np.full(n, float(self.rd_inicial)),
+                "jugados": np.zeros(n, dtype=np.int64)}
+
+    def _g(self, rd):
+        return 1 / np.sqrt(1 + 3 * self.Q ** 2 * rd ** 2 / np.pi ** 2)
+
+    def _nuevo(self, r, rd, r_rival, rd_rival, resultado):
+        g = self._g(rd_rival)
+        esperado = 1 / (1 + 10 ** (-g * (r - r_rival) / 400))
+        d2 = 1 / (self.Q ** 2 * g ** 2 * esperado * (1 - esperado))
+        denominador = 1 / rd ** 2 + 1 / d2
+        return r + self.Q / denominador * g * (resultado - esperado), np.sqrt(1 / denominador)
+
+    def actualizar(self, estado, g, p):
+        rating, rd = estado["rating"], estado["rd"]
+        rd_g = np.minimum(np.sqrt(rd[g] ** 2 + self.c ** 2), self.rd_max)
+        rd_p = np.minimum(np.sqrt(rd[p] ** 2 + self.c ** 2), self.rd_max)
+        rg, rp = rating[g], rating[p]
+        rating[g], nuevo_rd_g = self._nuevo(rg, rd_g, rp, rd_p, 1.0)
+        rating[p], nuevo_rd_p = self._nuevo(rp, rd_p, rg, rd_g, 0.0)
+        rd[g] = np.maximum(nuevo_rd_g, self.rd_min)
+        rd[p] = np.maximum(nuevo_rd_p, self.rd_min)
+
+    def ratings_finales(self, estado):
+        return np.round(estado["rating"])
+
+
+# --- EL MOTOR (NumPy puro, sin BD) ---
+def calcular_olas(ganadores, perdedores, n_jugadores):
+    """Ola de cada partido: 1 + la última ola de cualquiera de sus dos jugadores."""
+    # Listas de Python: acceder elemento a elemento a un array NumPy es más lento
+    ultima = [0] * n_jugadores
+    olas = []
+    for a, b in zip(ganadores.tolist(), perdedores.tolist()):
+        ola = max(ultima[a], ultima[b]) + 1
+        ultima[a] = ultima[b] = ola
+        olas.append(ola)
+    return np.array(olas, dtype=np.int64)
+
+def replay_club(ganadores, perdedores, categorias, modelo):
+    """
+    ganadores/perdedores: arrays de índices densos (0..n-1) en orden cronológico.
+    categorias: lista con la categoría de cada índice.
+    Devuelve (ratings, victorias, derrotas) como arrays por índice.
+    """
+    n = len(categorias)
+    estado = modelo.estado_inicial(n, categorias)
+    victorias = np.bincount(ganadores, minlength=n)
+    derrotas = np.bincount(perdedores, minlength=n)
+    if len(ganadores):
+        olas = calcular_olas(ganadores, perdedores, n)
+        orden = np.argsort(olas, kind="stable")
+        g_ord, p_ord = ganadores[orden], perdedores[orden]
+        cortes = np.flatnonzero(np.diff(olas[orden])) + 1
+        for g, p in zip(np.split(g_ord, cortes), np.split(p_ord, cortes)):
+            modelo.actualizar(estado, g, p)
+            estado["jugados"][g] += 1
+            estado["jugados"][p] += 1
+    return modelo.ratings_finales(estado), victorias, derrotas
+
+def replay_grupo(paquetes, modelo):
+    """
+    Varios clubes a la vez: se concatenan en un solo espacio de índices, así
+    cada ola junta partidos de TODOS los clubes del grupo (olas más grandes
+    = NumPy más eficiente). Como los clubes no comparten jugadores, el
+    resultado es el mismo que procesarlos por separado.
+
+    paquetes: lista de (club_id, ids, categorias, ganadores, perdedores).
+    """
+    desplazamiento, categorias, ganadores, perdedores = 0, [], [], []
+    for _, ids, cats, g, p in paquetes:
+        categorias += cats
+        ganadores.append(g + desplazamiento)
+        perdedores.append(p + desplazamiento)
+        desplazamiento += len(ids)
+    vacio = np.array([], dtype=np.int64)
+    ratings, victorias, derrotas = replay_club(np.concatenate(ganadores or [vacio]),
+                                               np.concatenate(perdedores or [vacio]), categorias, modelo)
+    salida, inicio = [], 0
+    for club_id, ids, *_ in paquetes:
+        fin = inicio + len(ids)
+        salida.append((club_id, ids, ratings[inicio:fin], victorias[inicio:fin], derrotas[inicio:fin]))
+        inicio = fin
+    return salida
+
+def _replay_grupo_serializado(args):
+    paquetes, modelo = args
+    return replay_grupo(paquetes, modelo)
+
+def repartir(paquetes, grupos):
+    # Reparte clubes en grupos de carga parecida (más partidos primero)
+    cubetas = [[] for _ in range(max(1, grupos))]
+    carga = [0] * len(cubetas)
+    for paquete in sorted(paquetes, key=lambda x: len(x[3]), reverse=True):
+        i = carga.index(min(carga))
+        cubetas[i].append(paquete)
+        carga[i] += len(paquete[3])
+    return [c for c in cubetas if c]
+
+
+# --- LECTURA DE LA BD (STREAMING) Y ESCRITURA MASIVA ---
+def _jugadores_por_club(db: Session, club_ids=None):
+    consulta = db.query(Player.id, Player.club_id, Player.category)
+    if club_ids:
+        consulta = consulta.filter(Player.club_id.in_(club_ids))
+    clubes = {}
+    for pid, club_id, categoria in consulta.yield_per(10000):
+        clubes.setdefault(club_id, ([], []))
+        clubes[club_id][0].append(pid)
+        clubes[club_id][1].append(categoria or "General")
+    return clubes
+
+def _partidos_en_orden(db: Session, club_ids=None):
+    # Solo partidos terminados con ganador; el club sale del ganador
+    consulta = (db.query(Player.club_id, Match.winner_id, Match.player_1_id, Match.player_2_id)
+                .join(Player, Player.id == Match.winner_id)
+                .filter(Match.is_finished == True, Match.winner_id != None))
+    if club_ids:
+        consulta = consulta.filter(Player.club_id.in_(club_ids))
+    return consulta.order_by(Player.club_id, Match.timestamp, Match.id).yield_per(10000)
+
+def _paquetes(db: Session, club_ids=None, omitidos=None):
+    # Genera un paquete (arrays NumPy) por club, leyendo los partidos en streaming
+    jugadores = _jugadores_por_club(db, club_ids)
+    actual, ganadores, perdedores = None, [], []
+    omitidos = omitidos if omitidos is not None else {}
+
+    def paquete(club_id):
+        ids, categorias = jugadores.pop(club_id, ([], []))
+        indice = {pid: i for i, pid in enumerate(ids)}
+        # Rival de otro club (raro): el partido se omite. Si se agregara aquí,
+        # su fila se escribiría también desde este club y pisaría su rating real
+        pares = [(indice[a], indice[b]) for a, b in zip(ganadores, perdedores) if a in indice and b in indice]
+        omitidos["entre_clubes"] = omitidos.get("entre_clubes", 0) + len(ganadores) - len(pares)
+        g = np.fromiter((a for a, _ in pares), dtype=np.int64, count=len(pares))
+        p = np.fromiter((b for _, b in pares), dtype=np.int64, count=len(pares))
+        return club_id, ids, categorias, g, p
+
+    for club_id, ganador, p1, p2 in _partidos_en_orden(db, club_ids):
+        if club_id != actual:
+            if actual is not None:
+                yield paquete(actual)
+            actual, ganadores, perdedores = club_id, [], []
+        ganadores.append(ganador)
+        perdedores.append(p2 if ganador == p1 else p1)
+    if actual is not None:
+        yield paquete(actual)
+    # Clubes sin partidos: todos vuelven al rating inicial
+    for club_id in list(jugadores):
+        ganadores, perdedores = [], []
+        yield paquete(club_id)
+
+def recalcular(db: Session, modelo=None, club_ids=None, procesos=REPLAY_PROCESOS, escribir=True):
+    """
+    Recalcula Elo, victorias y derrotas de los clubes indicados (o todos)
+    a partir del historial de partidos. Devuelve un resumen con tiempos.
+    """
+    modelo = modelo or ModeloElo()
+    t0 = time.perf_counter()
+    omitidos = {"entre_clubes": 0}
+    paquetes = list(_paquetes(db, club_ids, omitidos))
+    partidos = sum(len(x[3]) for x in paquetes)
+    t_lectura = time.perf_counter() - t0
+
+    # Pocos partidos: no vale la pena arrancar procesos
+    grupos = repartir(paquetes, procesos if partidos >= REPLAY_MIN_PARALELO else 1)
+    if len(grupos) > 1:
+        with ProcessPoolExecutor(max_workers=len(grupos)) as pool:
+            resultados = [r for grupo in pool.map(_replay_grupo_serializado, [(g, modelo) for g in grupos])
+                          for r in grupo]
+    else:
+        resultados = [r for g in grupos for r in replay_grupo(g, modelo)]
+    t_calculo = time.perf_counter() - t0 - t_lectura
+
+    filas = [{"id": pid, "elo": int(round(r)), "wins": int(v), "losses": int(d)}
+             for _, ids, ratings, victorias, derrotas in resultados
+             for pid, r, v, d in zip(ids, ratings, victorias, derrotas)]
+    if escribir:
+        for i in range(0, len(filas), REPLAY_LOTE_ESCRITURA):
+            db.execute(update(Player), filas[i:i + REPLAY_LOTE_ESCRITURA])
+        db.commit()
+        for club_id, *_ in resultados:
+            events.publicar(club_id, events.RANKING_RECALCULADO)
+
+    return {"clubes": len(resultados), "jugadores": len(filas), "partidos": partidos,
+            "omitidos_entre_clubes": omitidos["entre_clubes"],
+            "segundos_lectura": round(t_lectura, 3), "segundos_calculo": round(t_calculo, 3),
+            "segundos_total": round(time.perf_counter() - t0, 3),
+            "escrito": escribir}
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula el ranking desde el historial de partidos.")
+    parser.add_argument("--k", type=float, default=32)
+    parser.add_argument("--inicial", type=float, default=1200)
+    parser.add_argument("--sin-redondeo", action="store_true")
+    parser.add_argument("--k-provisional", type=float, default=None)
+    parser.add_argument("--partidos-provisionales", type=int, default=0)
+    parser.add_argument("--k-categoria", action="append", default=[], metavar="CATEGORIA=K")
+    parser.add_argument("--glicko", action="store_true")
+    parser.add_argument("--clubes", default="", help="ids separados por coma (vacío = todos)")
+    parser.add_argument("--procesos", type=int, default=REPLAY_PROCESOS)
+    parser.add_argument("--dry-run", action="store_true", help="calcula pero no escribe")
+    args = parser.parse_args()
+
+    if args.glicko:
+        modelo = ModeloGlicko(inicial=args.inicial)
+    else:
+        modelo = ModeloElo(k=args.k, inicial=args.inicial, redondear=not args.sin_redondeo,
+                           k_por_categoria={c: float(k) for c, k in (x.split("=", 1) for x in args.k_categoria)},
+                           k_provisional=args.k_provisional, partidos_provisionales=args.partidos_provisionales)
+    club_ids = [int(x) for x in args.clubes.split(",") if x.strip()]
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(recalcular(db, modelo, club_ids or None, args.procesos, escribir=not args.dry_run))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+from models import Enrollment, Player, Tournament
+from database import con_reintentos
+
+# --- INSCRIPCIONES (TABLA enrollments) ---
+# Inscribir es un solo INSERT ... ON CONFLICT DO NOTHING: si dos personas
+# inscriben a la vez (o Meta reintenta el webhook), la restricción única
+# deja una sola fila y nadie pisa a nadie.
+#
+# Compatibilidad: torneos creados antes de la migración 0002 que por alguna
+# razón no tengan filas (p.ej. escritos por una versión vieja durante el
+# despliegue) se siguen leyendo de smart_data["inscritos"].
+
+def _insert(db: Session):
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        return postgresql.insert(Enrollment)
+    if dialecto == "sqlite":
+        return sqlite.insert(Enrollment)
+    return None
+
+def _de_blob(torneo: Tournament):
+    return list((torneo.smart_data or {}).get("inscritos", []))
+
+
+# 1. Inscribir (idempotente, con commit). Devuelve True si es nueva.
+def inscribir(db: Session, torneo_id, player_id, seed=None):
+    def trabajo():
+        insert = _insert(db)
+        if insert is not None:
+            stmt = insert.values(tournament_id=torneo_id, player_id=player_id, seed=seed) \
+                         .on_conflict_do_nothing(index_elements=["tournament_id", "player_id"])
+            return db.execute(stmt).rowcount == 1
+        # Otros motores: comprobar y agregar (la restricción única sigue protegiendo)
+        if db.query(Enrollment.id).filter_by(tournament_id=torneo_id, player_id=player_id).first():
+            return False
+        db.add(Enrollment(tournament_id=torneo_id, player_id=player_id, seed=seed))
+        db.flush()
+        return True
+    return con_reintentos(db, trabajo)
+
+# 2. Ids inscritos, en orden de inscripción (cabezas de serie primero)
+def ids_inscritos(db: Session, torneo: Tournament):
+    ids = [fila[0] for fila in db.query(Enrollment.player_id).filter(Enrollment.tournament_id == torneo.id)
+           .order_by(Enrollment.seed.is_(None), Enrollment.seed, Enrollment.id)]
+    return ids or _de_blob(torneo)
+
+# 3. Jugadores inscritos en una sola consulta
+# (opciones: p.ej. joinedload(Player.owner) si se va a avisar a los dueños)
+def jugadores_inscritos(db: Session, torneo: Tournament, *opciones):
+    jugadores = (db.query(Player).options(*opciones).join(Enrollment, Enrollment.player_id == Player.id)
+                 .filter(Enrollment.tournament_id == torneo.id)
+                 .order_by(Enrollment.seed.is_(None), Enrollment.seed, Enrollment.id).all())
+    if jugadores:
+        return jugadores
+    ids = _de_blob(torneo)
+    return db.query(Player).options(*opciones).filter(Player.id.in_(ids)).all() if ids else []
+
+# 4. Orden de siembra para los cuadros: cabezas de serie explícitas (seed) y
+# después el resto por Elo, en la misma consulta
+def jugadores_sembrados(db: Session, torneo: Tournament, *opciones):
+    jugadores = (db.query(Player).options(*opciones).join(Enrollment, Enrollment.player_id == Player.id)
+                 .filter(Enrollment.tournament_id == torneo.id)
+                 .order_by(Enrollment.seed.is_(None), Enrollment.seed, Player.elo.desc(), Enrollment.id).all())
+    if jugadores:
+        return jugadores
+    ids = _de_blob(torneo)
+    sueltos = db.query(Player).options(*opciones).filter(Player.id.in_(ids)).all() if ids else []
+    return sorted(sueltos, key=lambda j: (-(j.elo or 1200), j.id))
@@ -0,0 +1,42 @@
+import threading
+
+# --- BUS DE EVENTOS DEL CLUB ---
+# Cada escritura que cambia el estado de un club (jugador creado, inscripción,
+# partido, cambio de estado del torneo) se publica aquí DESPUÉS del commit.
+# Los cachés se suscriben para invalidarse o actualizarse solos.
+#
+# Los suscriptores se llaman en el mismo hilo que publica (normalmente un hilo
+# del executor de la cola), así que deben ser rápidos y thread-safe.
+
+JUGADOR_CREADO = "jugador_creado"
+TORNEO_CREADO = "torneo_creado"
+TORNEO_ESTADO = "torneo_estado"
+INSCRIPCION = "inscripcion"
+PARTIDO_REGISTRADO = "partido_registrado"
+CUADROS_GENERADOS = "cuadros_generados"
+RANKING_RECALCULADO = "ranking_recalculado"
+IMPORTACION = "importacion"   # carga masiva (bulk_io.py): los cachés del club se recargan
+
+_suscriptores = []
+_lock = threading.Lock()
+
+def suscribir(fn):
+    # Se puede usar como decorador: @events.suscribir
+    with _lock:
+        if fn not in _suscriptores:
+            _suscriptores.append(fn)
+    return fn
+
+def desuscribir(fn):
+    with _lock:
+        if fn in _suscriptores:
+            _suscriptores.remove(fn)
+
+def publicar(club_id, tipo, **datos):
+    evento = {"club_id": club_id, "tipo": tipo, **datos}
+    for fn in list(_suscriptores):
+        try:
+            fn(evento)
+        except Exception as e:
+            print(f"❌ Error en suscriptor de eventos ({tipo}): {e}")
+    return evento
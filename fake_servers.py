@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from backplane import leer_resp, codificar_resp
+
+# --- SERVIDOR FALSO DE GRAPH API + OPENAI (SIN INTERNET) ---
+# Para pruebas locales y benchmarks:
+#   uvicorn fake_servers:app --port 9100
+#   GRAPH_API_URL=http://127.0.0.1:9100 OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn main:app
+#
+# FAKE_LATENCY_MS: latencia simulada por petición
+# FAKE_429_RATE: probabilidad (0-1) de responder 429 con Retry-After
+
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "50"))
+FAKE_429_RATE = float(os.getenv("FAKE_429_RATE", "0"))
+FAKE_RETRY_AFTER = os.getenv("FAKE_RETRY_AFTER", "1")
+
+app = FastAPI()
+stats = {"graph": 0, "openai": 0, "rate_limited": 0, "inicio": time.time()}
+
+async def _simular():
+    await asyncio.sleep(FAKE_LATENCY_MS / 1000)
+    if FAKE_429_RATE and random.random() < FAKE_429_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse(status_code=429, headers={"Retry-After": FAKE_RETRY_AFTER},
+                            content={"error": {"message": "rate limited", "code": 429}})
+    return None
+
+@app.post("/{version}/{phone_id}/messages")
+async def graph_messages(version: str, phone_id: str, request: Request):
+    error = await _simular()
+    if error: return error
+    body = await request.json()
+    stats["graph"] += 1
+    return {"messaging_product": "whatsapp",
+            "contacts": [{"input": body.get("to"), "wa_id": body.get("to")}],
+            "messages": [{"id": f"wamid.fake{stats['graph']}"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    error = await _simular()
+    if error: return error
+    body = await request.json()
+    stats["openai"] += 1
+    texto = body["messages"][-1]["content"]
+    decision = {"pensamiento": "fake", "accion": "chat", "datos": {},
+                "respuesta_whatsapp": f"Recibido: {texto}"}
+    return {
+        "id": f"chatcmpl-fake{stats['openai']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": json.dumps(decision)}}],
+        "usage": {"prompt_tokens": 300, "completion_tokens": 40, "total_tokens": 340},
+    }
+
+@app.get("/stats")
+async def ver_stats():
+    return stats
+
+
+# --- STAND-IN DE REDIS (RESP) PARA EL BACKPLANE ---
+#   python fake_servers.py resp 6399             (TCP)
+#   python fake_servers.py resp /tmp/tv.sock     (socket local)
+#   BACKPLANE_URL=redis://127.0.0.1:6399  o  BACKPLANE_URL=unix:///tmp/tv.sock
+# Entiende PING, INCR, GET, PUBLISH y SUBSCRIBE: lo justo para backplane.py.
+def _bulk(datos):
+    return f"${len(datos)}\r\n".encode() + datos + b"\r\n"
+
+class FakeResp:
+    def __init__(self):
+        self.valores: dict[bytes, int] = {}
+        self.canales: dict[bytes, set] = {}
+
+    async def atender(self, reader, writer):
+        suscrito = set()
+        try:
+            while True:
+                partes = await leer_resp(reader)
+                comando = partes[0].upper()
+                if comando == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif comando == b"INCR":
+                    self.valores[partes[1]] = self.valores.get(partes[1], 0) + 1
+                    writer.write(f":{self.valores[partes[1]]}\r\n".encode())
+                elif comando == b"GET":
+                    valor = self.valores.get(partes[1])
+                    writer.write(b"$-1\r\n" if valor is None else _bulk(str(valor).encode()))
+                elif comando == b"PUBLISH":
+                    receptores = list(self.canales.get(partes[1], ()))
+                    for otro in receptores:
+                        otro.write(codificar_resp("message", partes[1], partes[2]))
+                    writer.write(f":{len(receptores)}\r\n".encode())
+                elif comando == b"SUBSCRIBE":
+                    for i, canal in enumerate(partes[1:], 1):
+                        self.canales.setdefault(canal, set()).add(writer)
+                        suscrito.add(canal)
+                        writer.write(b"*3\r\n" + _bulk(b"subscribe") + _bulk(canal) + f":{i}\r\n".encode())
+                else:
+                    writer.write(f"-ERR comando no soportado {comando.decode()}\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError):
+            pass
+        finally:
+            for canal in suscrito:
+                self.canales.get(canal, set()).discard(writer)
+            writer.close()
+
+async def servir_resp(direccion="6399"):
+    servidor = FakeResp()
+    if str(direccion).isdigit():
+        return await asyncio.start_server(servidor.atender, "127.0.0.1", int(direccion))
+    return await asyncio.start_unix_server(servidor.atender, direccion)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "resp":
+        async def _correr():
+            servidor = await servir_resp(sys.argv[2] if len(sys.argv) > 2 else "6399")
+            print(f"🧪 Stand-in RESP escuchando en {sys.argv[2] if len(sys.argv) > 2 else '6399'}")
+            async with servidor:
+                await servidor.serve_forever()
+        asyncio.run(_correr())
+    else:
+        import uvicorn
+        uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 9100)
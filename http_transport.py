@@ -0,0 +1,143 @@
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import httpx
+
+# --- TRANSPORTE HTTP ASÍNCRONO (WHATSAPP + OPENAI) ---
+# Un cliente httpx por destino: conexiones keep-alive reutilizadas, timeouts,
+# límite de concurrencia y reintentos con backoff exponencial + jitter.
+# Si el destino responde 429 con Retry-After, TODO el destino se pausa.
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "20"))
+
+# Concurrencia máxima por destino (se puede ajustar por variable de entorno)
+LIMITES = {
+    "graph": int(os.getenv("GRAPH_MAX_CONCURRENCY", "20")),
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENCY", "10")),
+}
+
+# Códigos que vale la pena reintentar
+REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class Destino:
+    def __init__(self, nombre, limite):
+        self.nombre = nombre
+        self.limite = limite
+        self.semaforo = asyncio.Semaphore(limite)
+        self.pausa_hasta = 0.0   # time.monotonic() hasta el que no enviamos (429)
+        self.cliente: httpx.AsyncClient | None = None
+        self.contadores = {"peticiones": 0, "reintentos": 0, "errores": 0, "rate_limited": 0}
+
+    def obtener_cliente(self):
+        if self.cliente is None or self.cliente.is_closed:
+            self.cliente = httpx.AsyncClient(
+                timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.limite, max_keepalive_connections=self.limite),
+            )
+        return self.cliente
+
+    async def esperar_pausa(self):
+        restante = self.pausa_hasta - time.monotonic()
+        if restante > 0:
+            await asyncio.sleep(restante)
+
+    def pausar(self, segundos):
+        self.contadores["rate_limited"] += 1
+        self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + segundos)
+
+
+_destinos: dict[str, Destino] = {}
+
+def destino(nombre) -> Destino:
+    if nombre not in _destinos:
+        _destinos[nombre] = Destino(nombre, LIMITES.get(nombre, 10))
+    return _destinos[nombre]
+
+def cliente(nombre) -> httpx.AsyncClient:
+    return destino(nombre).obtener_cliente()
+
+async def cerrar_clientes():
+    for d in _destinos.values():
+        if d.cliente is not None:
+            await d.cliente.aclose()
+            d.cliente = None
+
+def metricas():
+    return {n: {"limite": d.limite, "en_uso": d.limite - d.semaforo._value, **d.contadores}
+            for n, d in _destinos.items()}
+
+
+# --- BACKOFF ---
+def leer_retry_after(headers):
+    valor = headers.get("retry-after") if headers else None
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+        return max(0.0, (fecha - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def calcular_espera(intento, retry_after=None):
+    if retry_after is not None:
+        return min(retry_after, HTTP_BACKOFF_MAX)
+    # "Full jitter": aleatorio entre 0 y el tope exponencial
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** intento)))
+
+
+# --- PETICIONES ---
+async def con_reintentos(nombre, llamada, max_reintentos=HTTP_MAX_RETRIES):
+    """
+    Ejecuta `llamada()` (corrutina sin argumentos) respetando el límite de
+    concurrencia del destino y reintentando errores transitorios.
+
+    `llamada` puede devolver un httpx.Response (se revisa el status) o lanzar
+    una excepción; si la excepción trae `.response` (p.ej. openai.RateLimitError)
+    también se lee su Retry-After.
+    """
+    d = destino(nombre)
+    intento = 0
+    while True:
+        await d.esperar_pausa()
+        d.contadores["peticiones"] += 1
+        try:
+            async with d.semaforo:
+                resultado = await llamada()
+        except Exception as e:
+            respuesta = getattr(e, "response", None)
+            status = getattr(respuesta, "status_code", None)
+            transitorio = isinstance(e, (httpx.TransportError, asyncio.TimeoutError)) or status in REINTENTABLES
+            if not transitorio or intento >= max_reintentos:
+                d.contadores["errores"] += 1
+                raise
+            retry_after = leer_retry_after(respuesta.headers) if respuesta is not None else None
+        else:
+            status = getattr(resultado, "status_code", None)
+            if status not in REINTENTABLES or intento >= max_reintentos:
+                if status is not None and status >= 400:
+                    d.contadores["errores"] += 1
+                return resultado
+            retry_after = leer_retry_after(resultado.headers)
+
+        espera = calcular_espera(intento, retry_after)
+        if status == 429:
+            d.pausar(espera)
+        d.contadores["reintentos"] += 1
+        intento += 1
+        await asyncio.sleep(espera)
+
+async def post(nombre, url, **kwargs) -> httpx.Response:
+    c = cliente(nombre)
+    return await con_reintentos(nombre, lambda: c.post(url, **kwargs))
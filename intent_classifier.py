@@ -0,0 +1,229 @@
+import re
+import time
+import unicodedata
+
+# --- VÍA RÁPIDA: INTENCIONES SIN LLAMAR A LA IA ---
+# Los comandos típicos ("genera los cuadros", "Ana le ganó a Luis 3-1"...)
+# se resuelven con reglas en microsegundos y producen el MISMO dict que
+# devolvería consultar_alejandro: {"accion", "datos", "respuesta_whatsapp"}.
+# Si el mensaje es ambiguo devolvemos None y decide la IA.
+
+CATEGORIAS = ["primera", "segunda", "tercera", "cuarta", "quinta", "damas", "senior", "juvenil", "infantil", "general"]
+
+# Un nombre: 1 a 4 palabras de letras (con tildes, ñ, guiones o apóstrofes)
+_PALABRA = r"[^\W\d_][^\W\d_'\-]*"
+_NOMBRE = rf"{_PALABRA}(?:\s+{_PALABRA}){{0,3}}"
+_CATEGORIA = rf"(?:\s*[,(]?\s*(?:en\s+|de\s+)?(?:la\s+)?(?:categor[ií]a\s+)?(?P<categoria>{'|'.join(CATEGORIAS)})\)?)?"
+_SCORE = r"(?:\s*[,(]?\s*(?P<score>\d{1,2}\s*[-a]\s*\d{1,2})\)?)?"
+
+REGLAS = [
+    # Saludos y agradecimientos: respuesta fija
+    ("saludo", re.compile(r"(?:hola|buen[oa]s(?:\s+(?:d[ií]as|tardes|noches))?|hey|qu[eé]\s+m[aá]s)\s*(?:alejandro)?", re.I)),
+    ("gracias", re.compile(r"(?:muchas\s+)?gracias(?:\s+alejandro)?|ok(?:ay)?|listo|perfecto|vale", re.I)),
+
+    # Admin: generar cuadros
+    ("generar_cuadros", re.compile(
+        r"(?:por\s+favor\s+)?(?:genera(?:r)?|arma(?:r)?|haz|hacer|sortea(?:r)?|crea(?:r)?)\s+(?:los\s+|el\s+|las\s+)?"
+        r"(?:cuadros?|llaves?|brackets?|sorteo|emparejamientos?)(?:\s+del\s+torneo)?"
+        r"(?:\s+(?:por|en|de|con)\s+(?P<formato>grupos))?(?:\s+(?P<sin_consolacion>sin\s+consolaci[oó]n))?"
+        r"(?:\s+por\s+favor)?", re.I)),
+
+    # Admin: crear torneo "Crea un torneo llamado Copa Pasto categoría Primera"
+    # o con el nombre entre comillas. Sin eso ("abre un torneo de primera",
+    # "crea un torneo para mañana") decide la IA: crear_torneo cierra el activo.
+    ("crear_torneo", re.compile(
+        rf"(?:crea(?:r)?|abre|abrir|nuevo)\s+(?:un\s+)?torneo\s+"
+        rf"(?:(?:llamado|que\s+se\s+llame)\s+['\"]?(?P<nombre>[^'\",()]+?)['\"]?|['\"](?P<citado>[^'\"]+)['\"])"
+        rf"{_CATEGORIA}", re.I)),
+
+    # Inscripción explícita con nombre: "inscribe a Ana Pérez", "inscribir a Ana"
+    ("inscribir_en_torneo", re.compile(
+        rf"(?:inscr[ií]be(?:me)?|inscribir(?:me)?|anota(?:r)?|apunta(?:r)?|quiero\s+inscribir)\s+(?:a\s+)?(?P<nombre>{_NOMBRE})"
+        rf"(?:\s+(?:en|al)\s+(?:el\s+)?torneo)?", re.I)),
+
+    # Crear jugador explícito: "crear jugador Ana Pérez segunda", "registra a Ana"
+    ("crear_jugador", re.compile(
+        rf"(?:crea(?:r)?|registra(?:r)?|agrega(?:r)?|nuev[oa])\s+(?:al?\s+)?(?:el\s+|la\s+)?(?:jugador(?:a)?\s+)?(?P<nombre>{_NOMBRE}?)"
+        rf"{_CATEGORIA}", re.I)),
+
+    # Resultado: "Ana le ganó a Luis 3-1" / "Ana gana a Luis 3 a 0"
+    ("registrar_partido", re.compile(
+        rf"(?P<ganador>{_NOMBRE}?)\s+(?:le\s+)?gan(?:[oó]|a)\s+(?:a\s+)?(?P<perdedor>{_NOMBRE}?){_SCORE}", re.I)),
+    # "Ganó Ana contra Luis 3-2"
+    ("registrar_partido", re.compile(
+        rf"gan(?:[oó]|a)\s+(?P<ganador>{_NOMBRE}?)\s+(?:contra|vs\.?|a)\s+(?P<perdedor>{_NOMBRE}?){_SCORE}", re.I)),
+
+    # Un nombre suelto ("Daniel Martinez") NO es regla: "Nos Vemos" o "Feliz
+    # Navidad" se ven igual. Sin verbo explícito decide la IA.
+]
+
+ACCIONES_ADMIN = {"crear_torneo", "generar_cuadros"}
+
+# "Relámpago de Navidad", "Copa del Sur": conectores que sí caben en el nombre de un torneo
+CONECTORES_TORNEO = frozenset({"de", "del", "la", "el", "los", "las", "y", "en", "al"})
+
+# Palabras que NUNCA pueden ser un nombre: si aparecen, mejor que decida la IA
+PALABRAS_RESERVADAS = {
+    "torneo", "cuadros", "cuadro", "ranking", "puntos", "partido", "partidos", "resultado", "como", "cuando",
+    "donde", "que", "quien", "cual", "por", "para", "quiero", "necesito", "ayuda", "reiniciar", "borrar",
+    "cancelar", "jugador", "jugadora", "inscribir", "inscribirme", "hola", "gracias", "no", "si", "me", "yo",
+    "el", "la", "los", "las", "un", "una", "vs", "contra", "le", "gano", "ganó", "perdio", "perdió", "y",
+    # Posesivos, determinantes y parentescos: "registra a mi hijo" no es un jugador llamado "Mi Hijo"
+    "mi", "mis", "tu", "tus", "su", "sus", "nuestro", "nuestra", "este", "esta", "estos", "estas", "ese", "esa",
+    "eso", "esto", "aquel", "aquella", "otro", "otra", "mio", "mia", "alguien", "nadie", "todos", "todo", "nada",
+    "algo", "de", "del", "al", "con", "sin", "en", "hijo", "hija", "esposo", "esposa", "amigo", "amiga",
+    # Verbos y adverbios comunes: "Ana Gana Mucho", "Mañana Juego"
+    "gana", "ganar", "pierde", "perdi", "juego", "juega", "jugar", "jugamos", "voy", "va", "vamos", "es",
+    "son", "fue", "hay", "tengo", "tiene", "puedo", "puede", "quiere", "hace", "mucho", "poco", "muy", "bien",
+    "mal", "mas", "menos", "siempre", "nunca", "ya", "hoy", "manana", "ayer", "tarde", "temprano", "ahora",
+    "luego", "despues", "antes", "aqui", "alla", "tambien", "favor", "porfa", "hora", "semana",
+}
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKC", texto or "").strip()
+    texto = re.sub(r"\s+", " ", texto)
+    return texto.strip(" .!¡¿?")
+
+def _sin_tildes(palabra):
+    return "".join(c for c in unicodedata.normalize("NFD", palabra) if unicodedata.category(c) != "Mn")
+
+def _es_nombre(nombre, maximo=4, permitidas=frozenset()):
+    palabras = nombre.split()
+    if not palabras or len(palabras) > maximo:
+        return False
+    reservadas = PALABRAS_RESERVADAS - permitidas
+    return not any(_sin_tildes(p.lower()) in reservadas or p.lower() in reservadas for p in palabras)
+
+def _formatear_nombre(nombre):
+    # Respetamos como lo escribieron, salvo que venga todo en minúsculas/mayúsculas
+    nombre = " ".join(nombre.split())
+    if nombre.islower() or nombre.isupper():
+        nombre = " ".join(p.capitalize() for p in nombre.split())
+    return nombre
+
+def _categoria(m):
+    cat = m.groupdict().get("categoria")
+    return cat.capitalize() if cat else "General"
+
+
+def clasificar(texto, rol="JUGADOR", inscripcion_abierta=False):
+    """
+    Devuelve el dict de decisión si el mensaje es inequívoco, o None.
+
+    rol: "ADMIN" o "JUGADOR" (las acciones de admin se niegan a jugadores).
+    inscripcion_abierta: si hay un torneo en inscripción (ninguna regla lo
+    usa hoy; se mantiene en la firma que comparte con ai_service.decidir).
+    """
+    limpio = normalizar(texto)
+    if not limpio or len(limpio) > 120:
+        return None
+
+    # La primera regla que encaja decide; si no se atreve (None), va a la IA
+    for accion, patron in REGLAS:
+        m = patron.fullmatch(limpio)
+        if not m:
+            continue
+        decision = _construir(accion, m, rol, inscripcion_abierta)
+        if decision is not None:
+            decision["pensamiento"] = f"fast-path:{accion}"
+        return decision
+    return None
+
+def _construir(accion, m, rol, inscripcion_abierta):
+    if accion == "saludo":
+        return {"accion": "chat", "datos": {},
+                "respuesta_whatsapp": "¡Hola! Soy Alejandro 🎾 ¿Te inscribo en el torneo o registramos un resultado?"}
+    if accion == "gracias":
+        return {"accion": "chat", "datos": {}, "respuesta_whatsapp": "¡Con gusto! 💪"}
+
+    if accion in ACCIONES_ADMIN and rol != "ADMIN":
+        return {"accion": "chat", "datos": {},
+                "respuesta_whatsapp": "🔒 Solo el administrador del club puede hacer eso."}
+
+    if accion == "generar_cuadros":
+        datos = {"formato": "grupos"} if m.group("formato") else {}
+        if m.group("sin_consolacion"):
+            datos["consolacion"] = False
+        return {"accion": "generar_cuadros", "datos": datos, "respuesta_whatsapp": "⚔️ Generando cuadros..."}
+
+    if accion == "crear_torneo":
+        nombre = (m.group("nombre") or m.group("citado") or "").strip()
+        if not _es_nombre(nombre, maximo=6, permitidas=CONECTORES_TORNEO):
+            return None
+        categoria = _categoria(m)
+        return {"accion": "crear_torneo", "datos": {"nombre": nombre, "categoria": categoria},
+                "respuesta_whatsapp": f"🏆 Torneo '{nombre}' ({categoria}) creado. ¡Inscripciones abiertas!"}
+
+    if accion == "inscribir_en_torneo":
+        nombre = m.group("nombre")
+        if not _es_nombre(nombre):
+            return None
+        nombre = _formatear_nombre(nombre)
+        return {"accion": "inscribir_en_torneo", "datos": {"nombre_jugador": nombre},
+                "respuesta_whatsapp": f"✅ {nombre} inscrito."}
+
+    if accion == "crear_jugador":
+        nombre = m.group("nombre")
+        if not nombre or not _es_nombre(nombre):
+            return None
+        nombre = _formatear_nombre(nombre)
+        categoria = _categoria(m)
+        return {"accion": "crear_jugador", "datos": {"nombre": nombre, "categoria": categoria},
+                "respuesta_whatsapp": f"✅ Jugador {nombre} registrado ({categoria})."}
+
+    if accion == "registrar_partido":
+        ganador, perdedor = m.group("ganador"), m.group("perdedor")
+        if not (ganador and perdedor and _es_nombre(ganador) and _es_nombre(perdedor)):
+            return None
+        ganador, perdedor = _formatear_nombre(ganador), _formatear_nombre(perdedor)
+        if ganador.lower() == perdedor.lower():
+            return None
+        score = re.sub(r"\s*(?:-|a)\s*", "-", m.group("score")) if m.group("score") else ""
+        return {"accion": "registrar_partido",
+                "datos": {"ganador": ganador, "perdedor": perdedor, "score": score},
+                "respuesta_whatsapp": f"📝 Resultado: {ganador} le ganó a {perdedor} {score}".strip() + "."}
+
+    return None
+
+
+# --- ESTADÍSTICAS ---
+class EstadisticasFastPath:
+    def __init__(self):
+        self.aciertos = 0          # Resueltos sin IA
+        self.fallos = 0            # Pasaron a la IA
+        self.tiempo_local = 0.0    # Segundos gastados clasificando
+        self.latencia_llm = 0.0    # Media móvil de lo que tarda la IA
+        self.llamadas_llm = 0
+
+    def registrar_local(self, segundos, acierto):
+        self.tiempo_local += segundos
+        if acierto:
+            self.aciertos += 1
+        else:
+            self.fallos += 1
+
+    def registrar_llm(self, segundos):
+        self.llamadas_llm += 1
+        # Media exponencial: se adapta si la IA se pone lenta
+        alfa = 0.1 if self.llamadas_llm > 1 else 1.0
+        self.latencia_llm += alfa * (segundos - self.latencia_llm)
+
+    def resumen(self):
+        total = self.aciertos + self.fallos
+        return {
+            "mensajes": total,
+            "aciertos": self.aciertos,
+            "tasa_aciertos": round(self.aciertos / total, 3) if total else 0.0,
+            "us_por_mensaje": round(self.tiempo_local / total * 1e6, 1) if total else 0.0,
+            "latencia_llm_ms": round(self.latencia_llm * 1000, 1),
+            "segundos_ahorrados": round(self.aciertos * self.latencia_llm, 2),
+        }
+
+stats = EstadisticasFastPath()
+
+def clasificar_con_stats(texto, rol="JUGADOR", inscripcion_abierta=False):
+    t0 = time.perf_counter()
+    decision = clasificar(texto, rol, inscripcion_abierta)
+    stats.registrar_local(time.perf_counter() - t0, decision is not None)
+    return decision
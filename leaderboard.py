@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import bisect
+import threading
+from sqlalchemy.orm import Session
+from models import Club, Player
+
+# --- TABLA DE POSICIONES POR CLUB (EN MEMORIA) ---
+# Cada club tiene su ranking ya ordenado: una lista de (-elo, id) por
+# categoría más una con todos. Un partido mueve a dos jugadores (sacar y
+# volver a insertar con bisect), no reordena el club entero.
+#   - puesto de un jugador: bisect, O(log n)
+#   - página del top / "los que están cerca de mí": bisect + slice
+#
+# La tabla se carga perezosamente (primera lectura del club) y se mantiene
+# con los deltas de las TVs (ver live_updates.py): "jugador" y "ranking" traen
+# valores absolutos, así que aplicarlos dos veces no hace daño y llegan a
+# todos los workers por el backplane. Un "resync" (recálculo completo) la
+# descarta. LEADERBOARD_TTL es la red de seguridad.
+
+LEADERBOARD_TTL = float(os.getenv("LEADERBOARD_TTL", "3600"))
+RANKING_POR_PAGINA = int(os.getenv("RANKING_POR_PAGINA", "50"))
+RANKING_POR_PAGINA_MAX = 200
+
+
+def _categoria(categoria):
+    return (categoria or "General").strip().lower()
+
+
+class Tabla:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jugadores: dict[int, dict] = {}   # id -> {"id", "name", "elo", "category"}
+        self.orden: dict[str, list[tuple[int, int]]] = {}   # categoría -> [(-elo, id)]
+        self.todos: list[tuple[int, int]] = []
+
+    @staticmethod
+    def _clave(jugador):
+        return (-jugador["elo"], jugador["id"])
+
+    def _listas(self, jugador):
+        return self.todos, self.orden.setdefault(_categoria(jugador["category"]), [])
+
+    def _sacar(self, jugador):
+        clave = self._clave(jugador)
+        for lista in self._listas(jugador):
+            i = bisect.bisect_left(lista, clave)
+            if i < len(lista) and lista[i] == clave:
+                del lista[i]
+
+    def _poner(self, jugador):
+        clave = self._clave(jugador)
+        for lista in self._listas(jugador):
+            bisect.insort(lista, clave)
+
+    def _lista(self, categoria):
+        return self.todos if categoria is None else self.orden.get(_categoria(categoria), [])
+
+    # --- ESCRITURAS ---
+    def agregar(self, player_id, nombre, elo, categoria):
+        with self.lock:
+            anterior = self.jugadores.get(player_id)
+            if anterior:
+                self._sacar(anterior)
+            jugador = {"id": player_id, "name": nombre, "elo": elo if elo is not None else 1200,
+                       "category": categoria or "General"}
+            self.jugadores[player_id] = jugador
+            self._poner(jugador)
+
+    def mover(self, player_id, elo):
+        # False si no conocemos al jugador (la tabla está incompleta)
+        with self.lock:
+            jugador = self.jugadores.get(player_id)
+            if jugador is None:
+                return False
+            if jugador["elo"] != elo:
+                self._sacar(jugador)
+                jugador["elo"] = elo
+                self._poner(jugador)
+            return True
+
+    # --- LECTURAS ---
+    def total(self, categoria=None):
+        with self.lock:
+            return len(self._lista(categoria))
+
+    def puesto(self, player_id, categoria=None):
+        with self.lock:
+            jugador = self.jugadores.get(player_id)
+            if jugador is None:
+                return None
+            lista = self._lista(categoria)
+            clave = self._clave(jugador)
+            i = bisect.bisect_left(lista, clave)
+            return i + 1 if i < len(lista) and lista[i] == clave else None
+
+    def pagina(self, desde=0, cuantos=None, categoria=None):
+        with self.lock:
+            lista = self._lista(categoria)
+            hasta = len(lista) if cuantos is None else desde + cuantos
+            return [dict(self.jugadores[pid], puesto=desde + i + 1)
+                    for i, (_, pid) in enumerate(lista[desde:hasta])]
+
+    def alrededor(self, player_id, radio=5, categoria=None):
+        puesto = self.puesto(player_id, categoria)
+        if puesto is None:
+            return []
+        desde = max(0, puesto - 1 - radio)
+        return self.pagina(desde, puesto - desde + radio, categoria)
+
+    def ordenados(self, categoria=None):
+        # Para la TV: lo mismo que ORDER BY elo DESC, id (sin "puesto")
+        with self.lock:
+            return [dict(self.jugadores[pid]) for _, pid in self._lista(categoria)]
+
+
+class Leaderboards:
+    def __init__(self, ttl=LEADERBOARD_TTL):
+        self.ttl = ttl
+        self.tablas: dict[int, tuple[float, Tabla]] = {}
+        self.versiones: dict[int, int] = {}   # cambios vistos por club (para cargas que se cruzan con un delta)
+        self.lock = threading.Lock()
+        self.contadores = {"lecturas": 0, "cargas": 0, "deltas": 0, "descartes": 0}
+
+    # 1. La tabla del club (None si el club no existe)
+    def obtener(self, db: Session, club_id):
+        with self.lock:
+            self.contadores["lecturas"] += 1
+            guardada = self.tablas.get(club_id)
+            if guardada and time.monotonic() - guardada[0] < self.ttl:
+                return guardada[1]
+        for intento in range(3):
+            with self.lock:
+                version = self.versiones.get(club_id, 0)
+            tabla = self._cargar(db, club_id)
+            with self.lock:
+                self.contadores["cargas"] += 1
+                # Si llegó un delta mientras consultábamos, la carga puede ser vieja: repetir
+                if self.versiones.get(club_id, 0) == version or intento == 2:
+                    if tabla is not None:
+                        self.tablas[club_id] = (time.monotonic(), tabla)
+                    return tabla
+
+    def _cargar(self, db: Session, club_id):
+        # Club y jugadores en una consulta: sin filas = el club no existe
+        filas = (db.query(Club.id, Player.id.label("player_id"), Player.name, Player.elo, Player.category)
+                 .outerjoin(Player, Player.club_id == Club.id).filter(Club.id == club_id).all())
+        if not filas:
+            return None
+        tabla = Tabla()
+        for f in filas:
+            if f.player_id is not None:
+                tabla.agregar(f.player_id, f.name, f.elo, f.category)
+        return tabla
+
+    # 2. Oyente de los deltas de las TVs (en el event loop, de cualquier worker)
+    def recibir_delta(self, club_id, seq, mensaje):
+        if not mensaje.startswith(('{"tipo":"ranking"', '{"tipo":"jugador"', '{"tipo":"resync"')):
+            return
+        delta = json.loads(mensaje)
+        with self.lock:
+            self.versiones[club_id] = self.versiones.get(club_id, 0) + 1
+            self.contadores["deltas"] += 1
+            guardada = self.tablas.get(club_id)
+        if guardada is None:
+            return
+        tabla = guardada[1]
+        if delta["tipo"] == "jugador":
+            j = delta["jugador"]
+            tabla.agregar(j["id"], j["name"], j.get("elo"), j.get("category"))
+        elif delta["tipo"] == "ranking":
+            if not all([tabla.mover(int(pid), elo) for pid, elo in delta["elos"].items()]):
+                self.descartar(club_id)
+        else:
+            self.descartar(club_id)
+
+    def descartar(self, club_id=None):
+        with self.lock:
+            self.contadores["descartes"] += 1
+            if club_id is None:
+                self.tablas.clear()
+            else:
+                self.tablas.pop(club_id, None)
+
+    def metricas(self):
+        return {"clubes_en_memoria": len(self.tablas), **self.contadores}
+
+# Instancia global para usar en todo el proyecto
+leaderboards = Leaderboards()
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, aliased
+from models import Match, Club, Tournament, Player
+from connection_manager import manager
+from backplane import crear_backplane
+from enrollments import jugadores_inscritos
+from leaderboard import leaderboards
+from brackets import ordenar, secciones
+import events
+from observability import tramo, contexto_de_traza
+
+# --- TVs EN VIVO: DELTAS POR WEBSOCKET ---
+# Antes cada cambio mandaba "update" y cada TV hacía location.reload(): con N
+# pantallas, cada evento eran N consultas + N renders de Jinja. Ahora cada
+# evento del bus se traduce a deltas JSON tipados con un número de secuencia
+# por club ({"seq", "tipo", ...}) y la página los aplica sobre el DOM.
+#
+# Si una TV ve un salto en seq (se perdió un mensaje, se reconectó) o recibe
+# algo que no sabe aplicar, pide /club/{id}/snapshot. La vista se calcula UNA
+# vez por seq y se comparte entre todas las pantallas que la pidan.
+#
+# Los eventos llegan desde hilos del executor y pasan al event loop en orden
+# (call_soon_threadsafe es FIFO). Allí una sola tarea pide la seq al backplane
+# y publica; cada worker entrega lo que recibe del backplane a sus TVs
+# (ver backplane.py para el caso de varios workers). Si el mensaje que generó
+# el evento está en una traza, sus deltas se publican en el contexto de esa
+# traza: con el backplane en memoria la "difusion" queda anotada en ella.
+
+VISTA_TTL = float(os.getenv("VISTA_TTL", "30"))
+
+
+# --- LO QUE PINTA LA TV (única parte que consulta la BD) ---
+def _jugador(p):
+    return {"id": p.id, "name": p.name, "elo": p.elo if p.elo is not None else 1200, "category": p.category}
+
+def _partido(m, n1=None, n2=None):
+    return {"id": m.id, "p1": m.player_1_id, "p2": m.player_2_id, "n1": n1, "n2": n2, "ganador": m.winner_id,
+            "score": m.score, "terminado": bool(m.is_finished), "cuadro": m.bracket, "ronda": m.round, "slot": m.slot}
+
+def _partidos_con_nombres(db: Session, torneo_id):
+    # Partidos + nombres de los dos jugadores en una sola consulta (rivales por definir: NULL)
+    j1, j2 = aliased(Player), aliased(Player)
+    filas = (db.query(Match, j1.name, j2.name)
+             .outerjoin(j1, Match.player_1_id == j1.id).outerjoin(j2, Match.player_2_id == j2.id)
+             .filter(Match.tournament_id == torneo_id))
+    return ordenar([_partido(m, n1, n2) for m, n1, n2 in filas])
+
+def vista_club(db: Session, club_id):
+    # Club + torneo activo en una sola consulta
+    fila = (db.query(Club, Tournament)
+            .outerjoin(Tournament, and_(Tournament.club_id == Club.id, Tournament.status != "finished"))
+            .filter(Club.id == club_id).first())
+    if not fila:
+        return None
+    club, torneo = fila
+    estado = {"club_id": club_id, "club": club.name, "modo": "ranking", "titulo": f"Ranking - {club.name}",
+              "torneo": None, "jugadores": [], "partidos": [], "secciones": []}
+
+    if torneo:
+        estado["torneo"] = {"id": torneo.id, "name": torneo.name, "category": torneo.category or "General",
+                            "status": torneo.status}
+        if torneo.status == "inscription":
+            estado["modo"] = "torneo_inscripcion"
+            estado["titulo"] = f"Inscritos: {torneo.name} ({torneo.category or 'General'})"
+            estado["jugadores"] = [_jugador(p) for p in jugadores_inscritos(db, torneo)]
+        elif torneo.status == "playing":
+            estado["modo"] = "torneo_brackets"
+            estado["titulo"] = f"En Juego: {torneo.name}"
+            # Árbol ya armado (una sección por ronda de cada cuadro): la TV solo lo pinta
+            estado["partidos"] = _partidos_con_nombres(db, torneo.id)
+            estado["secciones"] = secciones(estado["partidos"])
+    else:
+        # Ya ordenado en memoria (leaderboard.py): sin ORDER BY sobre todo el club
+        tabla = leaderboards.obtener(db, club_id)
+        estado["jugadores"] = tabla.ordenados() if tabla else []
+    return estado
+
+
+# --- EVENTO DEL BUS -> DELTAS PARA LAS TVs ---
+def traducir(evento):
+    tipo = evento["tipo"]
+    if tipo == events.JUGADOR_CREADO:
+        return [{"tipo": "jugador", "jugador": {"id": evento["player_id"], "name": evento["nombre"],
+                                               "elo": evento.get("elo") or 1200, "category": evento.get("categoria")}}]
+    if tipo == events.INSCRIPCION and "nombre" in evento:
+        return [{"tipo": "inscripcion", "torneo_id": evento["torneo_id"],
+                 "jugador": {"id": evento["player_id"], "name": evento["nombre"], "elo": evento.get("elo") or 1200,
+                             "category": evento.get("categoria")}}]
+    if tipo == events.CUADROS_GENERADOS and "partidos" in evento:
+        nombres = evento.get("nombres", {})
+        partidos = ordenar([{"id": m, "p1": p1, "p2": p2, "n1": nombres.get(p1), "n2": nombres.get(p2), "ganador": None,
+                             "score": "VS", "terminado": False, "cuadro": cuadro, "ronda": ronda, "slot": slot}
+                            for m, p1, p2, cuadro, ronda, slot in evento["partidos"]])
+        return [{"tipo": "cuadros", "torneo_id": evento["torneo_id"], "partidos": partidos,
+                 "secciones": secciones(partidos)}]
+    if tipo == events.PARTIDO_REGISTRADO and "elos" in evento:
+        deltas = []
+        if evento.get("torneo_id"):
+            deltas.append({"tipo": "resultado", "torneo_id": evento["torneo_id"], "match_id": evento["match_id"],
+                           "ganador_id": evento["ganador_id"], "perdedor_id": evento["perdedor_id"],
+                           "score": evento.get("score"),
+                           "avances": [{"match_id": m, "posicion": pos, "player_id": pid, "nombre": nombre}
+                                       for m, pos, pid, nombre in evento.get("avances", ())]})
+        deltas.append({"tipo": "ranking", "elos": {str(pid): elo for pid, elo in evento["elos"].items()}})
+        return deltas
+    if tipo == events.TORNEO_CREADO:
+        return [{"tipo": "torneo", "torneo": {"id": evento["torneo_id"], "name": evento.get("nombre"),
+                                             "category": evento.get("categoria") or "General",
+                                             "status": evento.get("status", "inscription")}}]
+    if tipo == events.TORNEO_ESTADO:
+        return [{"tipo": "torneo_estado", "torneo_id": evento["torneo_id"], "status": evento["status"]}]
+    # Recálculo completo u otro evento sin delta fino: que la TV pida la foto
+    return [{"tipo": "resync"}]
+
+
+class EnVivo:
+    def __init__(self, conexiones, backplane=None, vista_ttl=VISTA_TTL):
+        self.conexiones = conexiones
+        self.backplane = backplane or crear_backplane()
+        self.vista_ttl = vista_ttl
+        self.seqs: dict[int, int] = {}   # última seq vista por club (venga del worker que venga)
+        self.lock = threading.Lock()
+        self.loop = None
+        self.salida = None
+        self.tarea = None
+        self.vistas: dict[int, tuple[int, float, dict]] = {}   # club_id -> (seq, cuándo, vista)
+        self.locks_vista: dict[int, threading.Lock] = {}
+        self.locks_async: dict[int, asyncio.Lock] = {}
+        self.cambios: dict[int, float] = {}   # club_id -> cuándo llegó su último delta
+        self.oyentes = []   # fn(club_id, seq, mensaje): otras estructuras que viven de los deltas
+        self.contadores = {"eventos": 0, "deltas": 0, "publicados": 0, "errores_backplane": 0,
+                           "envios": 0, "vistas_pedidas": 0, "vistas_calculadas": 0}
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.salida = asyncio.Queue()
+        await self.backplane.start(self._entregar)
+        self.tarea = asyncio.create_task(self._publicar())
+
+    async def stop(self):
+        self.loop = None
+        if self.tarea:
+            self.tarea.cancel()
+            await asyncio.gather(self.tarea, return_exceptions=True)
+            self.tarea = None
+        await self.backplane.stop()
+
+    def escuchar(self, oyente):
+        if oyente not in self.oyentes:
+            self.oyentes.append(oyente)
+
+    def seq(self, club_id):
+        with self.lock:
+            return self.seqs.get(club_id, 0)
+
+    # 1. Suscriptor del bus (corre en el hilo que publicó)
+    def recibir(self, evento):
+        club_id = evento["club_id"]
+        deltas = traducir(evento)
+        contexto = contexto_de_traza()
+        with self.lock:
+            self.contadores["eventos"] += 1
+            self.contadores["deltas"] += len(deltas)
+            # Encolar dentro del lock: el orden de los eventos es el orden de publicación
+            if self.loop is not None:
+                try:
+                    self.loop.call_soon_threadsafe(self.salida.put_nowait, (club_id, deltas, contexto))
+                except RuntimeError:
+                    pass   # el loop ya se cerró (apagando)
+
+    # 2. Una sola tarea publica: pide la seq al backplane y manda el delta a todos los workers
+    async def _publicar(self):
+        while True:
+            club_id, deltas, contexto = await self.salida.get()
+            if contexto is None:
+                await self._publicar_deltas(club_id, deltas)
+            else:
+                await asyncio.create_task(self._publicar_deltas(club_id, deltas), context=contexto)
+
+    async def _publicar_deltas(self, club_id, deltas):
+        for delta in deltas:
+            try:
+                delta["seq"] = await self.backplane.siguiente_seq(club_id)
+                mensaje = json.dumps(delta, separators=(",", ":"))
+                if len(mensaje) > self.backplane.max_payload:
+                    # No cabe en el canal: que las TVs pidan la foto
+                    mensaje = json.dumps({"tipo": "resync", "seq": delta["seq"]}, separators=(",", ":"))
+                await self.backplane.publicar(club_id, delta["seq"], mensaje)
+                self.contadores["publicados"] += 1
+            except Exception as e:
+                # Las TVs verán el salto de seq en el siguiente delta y pedirán la foto
+                self.contadores["errores_backplane"] += 1
+                print(f"❌ Error publicando en el backplane: {e}")
+
+    # 3. Llega un delta (de este worker o de otro): a las TVs locales
+    def _entregar(self, club_id, seq, mensaje):
+        # Primero los oyentes: quien lea la seq nueva ya ve su efecto
+        for oyente in self.oyentes:
+            try:
+                oyente(club_id, seq, mensaje)
+            except Exception as e:
+                print(f"❌ Error en oyente de deltas: {e}")
+        with self.lock:
+            if seq > self.seqs.get(club_id, 0):
+                self.seqs[club_id] = seq
+            self.cambios[club_id] = time.monotonic()
+        with tramo("difusion"):
+            self.contadores["envios"] += self.conexiones.broadcast(mensaje, club_id)
+
+    # 4. Vista compartida: una consulta por seq, no una por pantalla
+    def _guardada(self, club_id, seq):
+        guardada = self.vistas.get(club_id)
+        if guardada and guardada[0] == seq and time.monotonic() - guardada[1] < self.vista_ttl:
+            return guardada[2]
+        return None
+
+    # Sin BD: la vista de la seq actual si ya está calculada (si no, None)
+    def vista_guardada(self, club_id):
+        estado = self._guardada(club_id, self.seq(club_id))
+        if estado is not None:
+            with self.lock:
+                self.contadores["vistas_pedidas"] += 1
+        return estado
+
+    def vista(self, db: Session, club_id):
+        with self.lock:
+            self.contadores["vistas_pedidas"] += 1
+            candado = self.locks_vista.setdefault(club_id, threading.Lock())
+        with candado:
+            # La seq se lee ANTES de consultar: lo que pase después llega con seq mayor
+            seq = self.seq(club_id)
+            guardada = self._guardada(club_id, seq)
+            if guardada is not None:
+                return guardada
+            estado = vista_club(db, club_id)
+            with self.lock:
+                self.contadores["vistas_calculadas"] += 1
+            if estado is not None:
+                estado["seq"] = seq
+                self.vistas[club_id] = (seq, time.monotonic(), estado)
+            return estado
+
+    # 5. Lo mismo con una sesión asíncrona (DB_ASYNC=1): el candado es del
+    # event loop, un threading.Lock lo congelaría mientras se espera a la BD
+    async def vista_async(self, db, club_id):
+        with self.lock:
+            self.contadores["vistas_pedidas"] += 1
+        candado = self.locks_async.setdefault(club_id, asyncio.Lock())
+        async with candado:
+            seq = self.seq(club_id)
+            guardada = self._guardada(club_id, seq)
+            if guardada is not None:
+                return guardada
+            estado = await db.run_sync(vista_club, club_id)
+            with self.lock:
+                self.contadores["vistas_calculadas"] += 1
+            if estado is not None:
+                estado["seq"] = seq
+                self.vistas[club_id] = (seq, time.monotonic(), estado)
+            return estado
+
+    # ¿Cambió algo en el club hace menos de `segundos`? (para no leer de una réplica atrasada)
+    def cambio_reciente(self, club_id, segundos):
+        with self.lock:
+            cuando = self.cambios.get(club_id)
+        return cuando is not None and time.monotonic() - cuando < segundos
+
+    def descartar(self):
+        with self.lock:
+            self.vistas.clear()
+
+    def metricas(self):
+        return {"clubes_con_eventos": len(self.seqs), "conexiones": self.conexiones.total(), **self.contadores,
+                "backplane": self.backplane.metricas()}
+
+# Instancia global para usar en todo el proyecto
+en_vivo = EnVivo(manager)
+events.suscribir(en_vivo.recibir)
+en_vivo.escuchar(leaderboards.recibir_delta)
@@ -1,78 +1,249 @@
 import os
 import json
+import asyncio
+import time
+import secrets
+import tempfile
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, Request, WebSocket, Depends
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from starlette.concurrency import run_in_threadpool
 
 # --- IMPORTAMOS TUS NUEVOS ÓRGANOS (CORREGIDO) ---
-from database import engine, get_db # <--- AQUÍ QUITAMOS 'Base'
-from models import Base, Player, Match, WhatsAppUser, Club, Tournament # <--- AQUÍ AGREGAMOS 'Base'
+from database import (engine, get_db, unidad_de_trabajo, sesion_lectura, sesion_async, cerrar_async,
+                      metricas_pool, DATABASE_READ_URL, DB_ASYNC, DB_REPLICA_RETRASO)
+from models import Base, Player, Club, Tournament # <--- AQUÍ AGREGAMOS 'Base'
 from connection_manager import manager
-from whatsapp_service import enviar_whatsapp
-from ai_service import generar_contexto_club, consultar_alejandro
-from elo import calculate_elo
+from live_updates import en_vivo
+from page_cache import paginas
+from leaderboard import leaderboards, RANKING_POR_PAGINA, RANKING_POR_PAGINA_MAX
+from whatsapp_service import enviar_whatsapp, cola_envios
+import http_transport
+from ai_service import decidir, stats_fast_path, cache_decisiones
+from club_context import contextos
+from actions import identificar_club, ejecutar_accion
+from message_queue import (MessageQueue, ColaLlena, extraer_mensajes, registrar_entrada,
+                           olvidar_entrada, marcar_procesado, mensajes_pendientes)
+from match_engine import registrar_ronda
+from scheduler import vista_programacion
+from migrations import aplicar_migraciones
+from bulk_io import (importar, exportar, leer_filas, lineas_de_bytes, desde_async, ErrorImportacion,
+                     TIPOS, FORMATOS)
+from observability import (registro, tramo, traza, observar_etapa, vigilante_loop, perfilador, MENSAJES,
+                           OBS_PERFIL)
 
 # --- CONFIGURACIÓN ---
 load_dotenv()
 VERIFY_TOKEN = "alejandro_squash"
+DEBUG_MAX_JUGADORES = 100
+# Importar/exportar por HTTP pisa elo/dueños y expone teléfonos: solo con
+# "Authorization: Bearer <BULK_TOKEN>". Sin la variable quedan apagados (CLI: bulk_io.py)
+BULK_TOKEN = os.getenv("BULK_TOKEN")
 
-# Crear tablas en la BD
-Base.metadata.create_all(bind=engine)
+# Crear tablas en la BD (y columnas nuevas en BDs existentes)
+aplicar_migraciones(engine)
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
+# Plantillas ya compiladas en disco: el primer render tras un reinicio no recompila
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "alejandro_jinja"))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
 
 # --- RUTAS DE INICIO ---
 @app.on_event("startup")
-def startup_event():
-    db = next(get_db()) 
-    if not db.query(Club).filter_by(id=1).first():
-        print("🏗️ Creando Club Demo...")
-        db.add(Club(name="Club Demo", admin_phone="573152405542"))
-        db.commit()
-    db.close()
+async def startup_event():
+    with unidad_de_trabajo() as db:
+        if not db.query(Club).filter_by(id=1).first():
+            print("🏗️ Creando Club Demo...")
+            db.add(Club(name="Club Demo", admin_phone="573152405542"))
+        pendientes = mensajes_pendientes(db)
+
+    # Arrancar workers y recuperar lo que quedó a medias
+    await cola.start()
+    await cola_envios.start()
+    await en_vivo.start()
+    await manager.start()
+    await vigilante_loop.start()
+    en_segundo_plano["reencolar"] = asyncio.create_task(_reencolar(pendientes))
+
+# Lo que quedó "pending" se reencola sin frenar el arranque. Si la cola se
+# llena se espera (backoff) y se reintenta el mismo mensaje: no se abandona
+# el resto hasta el próximo reinicio y el orden por teléfono se mantiene.
+REENCOLAR_ESPERA_MAX = float(os.getenv("REENCOLAR_ESPERA_MAX", "5"))
+en_segundo_plano = {}
+
+async def _reencolar(pendientes):
+    espera = 0.1
+    for mensaje in pendientes:
+        cola.marcar_visto(mensaje["id"])
+        while True:
+            try:
+                await cola.encolar(mensaje)
+                espera = 0.1
+                break
+            except ColaLlena:
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, REENCOLAR_ESPERA_MAX)
+    if pendientes:
+        print(f"♻️ {len(pendientes)} mensajes pendientes reencolados")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for tarea in en_segundo_plano.values():
+        tarea.cancel()
+    await cola.stop()
+    await cola_envios.stop()
+    await en_vivo.stop()
+    await manager.stop()
+    await vigilante_loop.stop()
+    await http_transport.cerrar_clientes()
+    await cerrar_async()
 
 @app.get("/")
 async def home():
     return "Alejandro está vivo. Ve a /club/1 para ver el ranking."
 
 # --- VISTA WEB ---
+# La página trae el estado inicial (con su seq); después la TV se actualiza
+# sola con los deltas del WebSocket (ver live_updates.py).
+# Solo lectura: va a la réplica si hay (DATABASE_READ_URL), salvo justo
+# después de un cambio en el club, y con DB_ASYNC=1 sin ocupar un hilo.
+def _vista_sync(club_id, fresca):
+    with sesion_lectura(fresca=fresca) as db:
+        return en_vivo.vista(db, club_id)
+
+async def _vista(club_id):
+    estado = en_vivo.vista_guardada(club_id)
+    if estado is not None:
+        return estado
+    fresca = bool(DATABASE_READ_URL) and en_vivo.cambio_reciente(club_id, DB_REPLICA_RETRASO)
+    if DB_ASYNC and not fresca:
+        async with sesion_async() as db:
+            return await en_vivo.vista_async(db, club_id)
+    return await run_in_threadpool(_vista_sync, club_id, fresca)
+
+# Render cacheado por seq (ver page_cache.py): ETag fuerte por codificación, 304 y cuerpo ya comprimido
+async def _servir(request: Request, clave, estado, render, tipo):
+    pagina = paginas.buscar(clave, estado) or await run_in_threadpool(paginas.guardar, clave, estado, render, tipo)
+    codificacion = pagina.codificacion(request.headers.get("accept-encoding"))
+    cabeceras = {"ETag": pagina.etags[codificacion], "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if pagina.coincide(request.headers.get("if-none-match"), codificacion):
+        paginas.no_modificado()
+        return Response(status_code=304, headers=cabeceras)
+    if codificacion != "identity":
+        cabeceras["Content-Encoding"] = codificacion
+    return Response(pagina.cuerpos[codificacion], media_type=pagina.tipo, headers=cabeceras)
+
 @app.get("/club/{club_id}")
-async def ver_club(request: Request, club_id: int, db: Session = Depends(get_db)):
-    club = db.query(Club).filter(Club.id == club_id).first()
-    if not club: return "Club no encontrado"
+async def ver_club(request: Request, club_id: int):
+    estado = await _vista(club_id)
+    if not estado: return "Club no encontrado"
+    contexto = {"jugadores": estado["jugadores"], "partidos": estado["partidos"], "titulo": estado["titulo"],
+                "modo": estado["modo"], "club_id": club_id, "estado": estado, "request": request}
+    return await _servir(request, (club_id, "html", estado["modo"]), estado,
+                         lambda: templates.get_template("ranking.html").render(contexto), "text/html; charset=utf-8")
 
-    torneo = db.query(Tournament).filter(Tournament.club_id == club_id, Tournament.status != "finished").first()
-    
-    jugadores = []
-    partidos_torneo = []
-    titulo = f"Ranking - {club.name}"
-    modo = "ranking"
+# Foto completa para resincronizar una TV que detectó un salto de seq
+@app.get("/club/{club_id}/snapshot")
+async def snapshot_club(request: Request, club_id: int):
+    estado = await _vista(club_id)
+    if not estado:
+        return JSONResponse(status_code=404, content={"error": "Club no encontrado"})
+    return await _servir(request, (club_id, "json", estado["modo"]), estado,
+                         lambda: json.dumps(estado, ensure_ascii=False, separators=(",", ":")), "application/json")
 
-    if torneo:
-        datos = torneo.smart_data if torneo.smart_data else {}
-        cat_torneo = torneo.category if hasattr(torneo, 'category') else "General"
-        
-        if torneo.status == "inscription":
-            modo = "torneo_inscripcion"
-            titulo = f"Inscritos: {torneo.name} ({cat_torneo})"
-            ids = datos.get("inscritos", [])
-            if ids:
-                jugadores = db.query(Player).filter(Player.id.in_(ids)).all()
-        
-        elif torneo.status == "playing":
-            modo = "torneo_brackets"
-            titulo = f"En Juego: {torneo.name}"
-            partidos_torneo = db.query(Match).filter(Match.tournament_id == torneo.id).all()
-    else:
-        jugadores = db.query(Player).filter(Player.club_id == club_id).order_by(Player.elo.desc()).all()
-
-    return templates.TemplateResponse("ranking.html", {
-        "request": request, "jugadores": jugadores, "partidos": partidos_torneo,
-        "titulo": titulo, "modo": modo, "club_id": club_id
-    })
+# --- PROGRAMACIÓN: CANCHA Y HORA DE CADA PARTIDO (ver scheduler.py) ---
+def _programacion(club_id):
+    with sesion_lectura() as db:
+        club = db.query(Club.name).filter(Club.id == club_id).first()
+        return (club.name, vista_programacion(db, club_id)) if club else (None, None)
+
+@app.get("/club/{club_id}/programacion")
+async def ver_programacion(request: Request, club_id: int):
+    nombre, partidos = await run_in_threadpool(_programacion, club_id)
+    if nombre is None:
+        return "Club no encontrado"
+    return templates.TemplateResponse(request, "partidos.html", {"partidos": partidos, "club": nombre, "club_id": club_id})
+
+@app.get("/programacion")
+async def ver_programacion_demo(request: Request):
+    return await ver_programacion(request, 1)
+
+# --- RANKING EN JSON (PAGINADO, DESDE LA TABLA EN MEMORIA) ---
+@app.get("/club/{club_id}/ranking")
+def ranking_club(club_id: int, pagina: int = 1, por_pagina: int = RANKING_POR_PAGINA,
+                 categoria: str | None = None, db: Session = Depends(get_db)):
+    tabla = leaderboards.obtener(db, club_id)
+    if tabla is None:
+        return JSONResponse(status_code=404, content={"error": "Club no encontrado"})
+    pagina, por_pagina = max(1, pagina), max(1, min(por_pagina, RANKING_POR_PAGINA_MAX))
+    total = tabla.total(categoria)
+    return {"club_id": club_id, "categoria": categoria, "pagina": pagina, "por_pagina": por_pagina,
+            "total": total, "paginas": (total + por_pagina - 1) // por_pagina,
+            "jugadores": tabla.pagina((pagina - 1) * por_pagina, por_pagina, categoria)}
+
+# Puesto de un jugador y los que tiene alrededor ("radio" arriba y abajo)
+@app.get("/club/{club_id}/ranking/{player_id}")
+def puesto_jugador(club_id: int, player_id: int, radio: int = 5, categoria: str | None = None,
+                   db: Session = Depends(get_db)):
+    tabla = leaderboards.obtener(db, club_id)
+    puesto = tabla.puesto(player_id, categoria) if tabla else None
+    if puesto is None:
+        return JSONResponse(status_code=404, content={"error": "Jugador no encontrado en este ranking"})
+    radio = max(0, min(radio, RANKING_POR_PAGINA_MAX // 2))
+    return {"club_id": club_id, "player_id": player_id, "categoria": categoria, "puesto": puesto,
+            "total": tabla.total(categoria), "alrededor": tabla.alrededor(player_id, radio, categoria)}
+
+# --- RESULTADOS EN BLOQUE (UNA RONDA ENTERA, UN SOLO COMMIT) ---
+@app.post("/club/{club_id}/resultados")
+async def registrar_resultados(club_id: int, request: Request):
+    data = await request.json()
+    resultados = data.get("resultados", []) if isinstance(data, dict) else data
+    salida = await cola.run_sync(_con_sesion, registrar_ronda, club_id, resultados)
+    return {"resultados": salida}
+
+# --- IMPORTACIÓN / EXPORTACIÓN MASIVA (ver bulk_io.py) ---
+# El cuerpo se lee en streaming y se escribe por lotes: se puede subir el
+# historial entero de un club sin que el servidor lo tenga en memoria.
+def _sin_permiso_masivo(request: Request):
+    if not BULK_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "Importar/exportar por HTTP está apagado (BULK_TOKEN)"})
+    if not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {BULK_TOKEN}"):
+        return JSONResponse(status_code=401, content={"error": "Token inválido"})
+    return None
+
+@app.post("/club/{club_id}/importar/{tipo}")
+async def importar_club(club_id: int, tipo: str, request: Request, formato: str = "csv", replay: bool = False):
+    if rechazo := _sin_permiso_masivo(request):
+        return rechazo
+    if tipo not in ("jugadores", "partidos"):
+        return JSONResponse(status_code=404, content={"error": "Tipo desconocido (jugadores o partidos)"})
+    trozos = request.stream()
+
+    def trabajo():
+        filas = leer_filas(lineas_de_bytes(desde_async(trozos)), formato)
+        return importar(tipo, filas, club_id=club_id, replay=replay)
+    try:
+        return await run_in_threadpool(trabajo)
+    except ErrorImportacion as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+# Paginado por id: para seguir después de un corte, desde = último id recibido
+@app.get("/club/{club_id}/exportar/{tipo}")
+def exportar_club(request: Request, club_id: int, tipo: str, formato: str = "csv", desde: int = 0,
+                  limite: int | None = None):
+    if rechazo := _sin_permiso_masivo(request):
+        return rechazo
+    if tipo not in TIPOS or formato not in FORMATOS:
+        return JSONResponse(status_code=404, content={"error": "Tipo o formato desconocido"})
+    tipo_contenido = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+    return StreamingResponse(exportar(tipo, club_id, formato, desde, limite), media_type=tipo_contenido,
+                             headers={"Content-Disposition": f'attachment; filename="club{club_id}-{tipo}.{formato}"'})
 
 # --- WEBSOCKETS ---
 @app.websocket("/ws/{club_id}")
@@ -80,30 +251,39 @@ async def websocket_endpoint(websocket: WebSocket, club_id: int):
     await manager.connect(websocket, club_id)
     try:
         while True:
+            # Lo único que manda la TV es "pong": sirve de latido
             await websocket.receive_text()
-    except WebSocketDisconnect:
+            manager.visto(websocket)
+    except Exception:
+        pass
+    finally:
         manager.disconnect(websocket, club_id)
 
 # --- HERRAMIENTAS TÉCNICAS ---
 @app.get("/debug")
 def debug_db(db: Session = Depends(get_db)):
     torneo = db.query(Tournament).first()
-    jugadores = db.query(Player).all()
+    # Solo una muestra: la lista completa de un club sale por /club/{id}/exportar/jugadores
+    jugadores = db.query(Player.id, Player.name, Player.club_id).order_by(Player.id).limit(DEBUG_MAX_JUGADORES).all()
     info_torneo = "No hay torneo"
     if torneo:
         info_torneo = {"nombre": torneo.name, "status": torneo.status, "smart_data": torneo.smart_data}
-    lista_jugadores = [{"id": p.id, "nombre": p.name, "club": p.club_id} for p in jugadores]
-    return {"TORNEO": info_torneo, "JUGADORES": lista_jugadores}
+    lista_jugadores = [{"id": pid, "nombre": nombre, "club": club_id} for pid, nombre, club_id in jugadores]
+    return {"TORNEO": info_torneo, "JUGADORES": lista_jugadores,
+            "TOTAL_JUGADORES": db.query(func.count(Player.id)).scalar()}
 
 @app.get("/nuclear-reset")
 def nuclear_reset():
     Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-    db = next(get_db())
-    if not db.query(Club).filter_by(id=1).first():
-        db.add(Club(name="Club Demo", admin_phone="573152405542"))
-        db.commit()
-    db.close()
+    aplicar_migraciones(engine)
+    contextos.descartar()
+    en_vivo.descartar()
+    leaderboards.descartar()
+    paginas.descartar()
+    cache_decisiones.backend.limpiar()
+    with unidad_de_trabajo() as db:
+        if not db.query(Club).filter_by(id=1).first():
+            db.add(Club(name="Club Demo", admin_phone="573152405542"))
     return {"status": "✅ Base de datos renovada (Modular)."}
 
 # --- WHATSAPP ---
@@ -115,111 +295,119 @@ async def verify_webhook(request: Request):
     return {"error": "Token invalido"}
 
 @app.post("/webhook")
-async def receive_whatsapp(request: Request, db: Session = Depends(get_db)):
-    data = await request.json()
+async def receive_whatsapp(request: Request):
+    # Solo ingesta: validar, guardar, encolar y responder 200 YA.
     try:
-        entry = data['entry'][0]['changes'][0]['value']
-        if 'messages' in entry:
-            message = entry['messages'][0]
-            telefono = message['from']
-            texto_usuario = message['text']['body']
-            print(f"📩 De {telefono}: {texto_usuario}")
-
-            # 1. IDENTIFICAR CLUB
-            club_usuario = db.query(Club).filter(Club.admin_phone == telefono).first()
-            if not club_usuario:
-                padrino = db.query(WhatsAppUser).filter_by(phone_number=telefono).first()
-                if padrino and padrino.players:
-                    club_usuario = padrino.players[0].club
-            if not club_usuario:
-                club_usuario = db.query(Club).filter(Club.id == 1).first()
-
-            # 2. CONSULTAR AL CEREBRO (AI SERVICE)
-            contexto = generar_contexto_club(db, club_usuario.id)
-            decision = consultar_alejandro(texto_usuario, contexto, telefono)
-            
-            print(f"🤖 IA: {decision.get('accion')}")
-
-            respuesta_texto = decision.get('respuesta_whatsapp', "Procesado.")
-            accion = decision.get('accion')
-            datos = decision.get('datos', {})
+        data = await request.json()
+        mensajes = extraer_mensajes(data)
+    except Exception as e:
+        print(f"❌ Payload inválido: {e}")
+        return {"status": "ok"}
+
+    # Ingesta: dedupe + INSERT de la entrada + encolar (lo que demora el 200 a Meta)
+    with tramo("ingesta"):
+        for mensaje in mensajes:
+            if cola.ya_visto(mensaje["id"]):
+                cola.contadores["duplicados"] += 1
+                continue
+            nuevo = await cola.run_sync(_con_sesion, registrar_entrada, mensaje)
+            cola.marcar_visto(mensaje["id"])
+            if not nuevo:
+                cola.contadores["duplicados"] += 1
+                continue
+            try:
+                await cola.encolar(mensaje)
+            except ColaLlena:
+                # Backpressure: devolvemos 503 y Meta reintentará más tarde
+                cola.olvidar(mensaje["id"])
+                await cola.run_sync(_con_sesion, olvidar_entrada, mensaje["id"])
+                return JSONResponse(status_code=503, content={"status": "busy"})
+    return {"status": "ok"}
+
+@app.get("/debug/cola")
+async def metricas_cola():
+    return {"entrada": cola.metricas(), "envios": cola_envios.metricas(), "http": http_transport.metricas(),
+            "fast_path": stats_fast_path.resumen(), "cache_decisiones": await cache_decisiones.metricas(),
+            "contexto": contextos.metricas(), "en_vivo": en_vivo.metricas(), "ranking": leaderboards.metricas(),
+            "paginas": paginas.metricas(),
+            "websockets": manager.metricas(), "bd": metricas_pool()}
+
+# --- MÉTRICAS PARA PROMETHEUS (ver observability.py) ---
+registro.funcion("alejandro_ws_conexiones", "WebSockets de TVs abiertos", manager.total)
+registro.funcion("alejandro_ws_conexiones_club", "WebSockets abiertos por club",
+                 lambda: {(club_id,): len(c) for club_id, c in manager.active_connections.items()}, ("club",))
+registro.funcion("alejandro_ws_en_colas", "Mensajes esperando en las colas de los WebSockets",
+                 lambda: manager.metricas()["en_colas"])
+registro.funcion("alejandro_ws_eventos_total", "Conexiones, envíos y expulsiones de WebSockets",
+                 lambda: {(k,): v for k, v in manager.contadores.items()}, ("tipo",), "counter")
+registro.funcion("alejandro_cola_profundidad", "Mensajes esperando en la cola de entrada",
+                 lambda: sum(q.qsize() for q in cola.shards))
+registro.funcion("alejandro_cola_eventos_total", "Mensajes encolados, procesados, rechazados...",
+                 lambda: {(k,): v for k, v in cola.contadores.items()}, ("tipo",), "counter")
+registro.funcion("alejandro_envios_pendientes", "Avisos esperando en la cola de envíos",
+                 lambda: cola_envios.metricas().get("pendientes"))
+registro.funcion("alejandro_http_en_uso", "Peticiones HTTP en curso por destino",
+                 lambda: {(n,): d["en_uso"] for n, d in http_transport.metricas().items()}, ("destino",))
+registro.funcion("alejandro_bd_conexiones_en_uso", "Conexiones del pool prestadas",
+                 lambda: {(m["motor"] + ":" + nombre,): m["en_uso"] for nombre, m in metricas_pool().items()}, ("pool",))
+
+@app.get("/metrics")
+async def metricas_prometheus():
+    return Response(registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Perfil por muestreo (solo con OBS_PERFIL=1): pilas colapsadas para flamegraph/speedscope
+@app.get("/debug/perfil")
+async def perfil(segundos: float = 5):
+    if not OBS_PERFIL:
+        return JSONResponse(status_code=404, content={"error": "Perfil desactivado (OBS_PERFIL=1)"})
+    return Response(await run_in_threadpool(perfilador.capturar, segundos), media_type="text/plain; charset=utf-8")
+
+# --- WORKER: EL TRABAJO PESADO ---
+def _con_sesion(fn, *args):
+    # Cada paso síncrono es su propia unidad de trabajo (corre en un hilo)
+    with unidad_de_trabajo() as db:
+        return fn(db, *args)
+
+def _preparar_contexto(db: Session, telefono):
+    with tramo("club"):
+        club_usuario = identificar_club(db, telefono)
+    rol = "ADMIN" if club_usuario.admin_phone == telefono else "JUGADOR"
+    with tramo("contexto"):
+        texto, inscripcion_abierta = contextos.resumen(db, club_usuario.id, telefono)
+        return club_usuario.id, texto, rol, inscripcion_abierta
+
+async def procesar_mensaje(mensaje):
+    telefono = mensaje["telefono"]
+    texto_usuario = mensaje["texto"]
+    print(f"📩 De {telefono}: {texto_usuario}")
+    # Cada etapa queda en /metrics; algunos mensajes, además, en una traza JSON (observability.py)
+    with traza(mensaje["id"], telefono=telefono):
+        if "encolado_en" in mensaje:
+            observar_etapa("cola", time.monotonic() - mensaje["encolado_en"])
+        try:
+            # 1. IDENTIFICAR CLUB + CONTEXTO
+            club_id, contexto, rol, inscripcion_abierta = await cola.run_sync(_con_sesion, _preparar_contexto, telefono)
+
+            # 2. CONSULTAR AL CEREBRO (vía rápida o AI SERVICE)
+            with tramo("decision"):
+                decision = await decidir(texto_usuario, contexto, rol, inscripcion_abierta, club_id)
+            print(f"🤖 IA: {decision.get('accion')} ({decision.get('pensamiento', 'llm')})")
 
             # 3. EJECUTAR ACCIÓN (MANOS)
-            if accion == 'crear_jugador':
-                nombre = datos.get('nombre')
-                categoria = datos.get('categoria', 'General')
-                existe = db.query(Player).filter(Player.name == nombre, Player.club_id == club_usuario.id).first()
-                if not existe:
-                    padrino = db.query(WhatsAppUser).filter_by(phone_number=telefono).first()
-                    if not padrino:
-                        padrino = WhatsAppUser(phone_number=telefono)
-                        db.add(padrino); db.commit()
-                    nuevo = Player(name=nombre, category=categoria, owner_id=padrino.id, club_id=club_usuario.id)
-                    db.add(nuevo); db.commit()
-                    await manager.broadcast("update", club_usuario.id)
-
-            elif accion == 'crear_torneo':
-                anteriores = db.query(Tournament).filter(Tournament.club_id == club_usuario.id, Tournament.status != "finished").all()
-                for t in anteriores: t.status = "finished"
-                
-                categoria = datos.get('categoria', 'General')
-                nuevo_torneo = Tournament(
-                    name=datos.get('nombre'), 
-                    category=categoria,
-                    club_id=club_usuario.id, 
-                    status="inscription", 
-                    smart_data={"inscritos": []}
-                )
-                db.add(nuevo_torneo); db.commit()
-                await manager.broadcast("update", club_usuario.id)
-
-            elif accion == 'inscribir_en_torneo':
-                nombre_jugador = datos.get('nombre_jugador') or datos.get('nombre')
-                jugador = db.query(Player).filter(Player.name == nombre_jugador, Player.club_id == club_usuario.id).first()
-                torneo = db.query(Tournament).filter(Tournament.club_id == club_usuario.id, Tournament.status == "inscription").first()
-                
-                if jugador and torneo:
-                    db.refresh(torneo)
-                    datos_actuales = dict(torneo.smart_data) if torneo.smart_data else {"inscritos": []}
-                    lista_inscritos = list(datos_actuales.get("inscritos", []))
-                    
-                    if jugador.id not in lista_inscritos:
-                        lista_inscritos.append(jugador.id)
-                        datos_actuales["inscritos"] = lista_inscritos
-                        torneo.smart_data = datos_actuales
-                        flag_modified(torneo, "smart_data")
-                        db.add(torneo); db.commit(); db.refresh(torneo)
-                        await manager.broadcast("update", club_usuario.id)
-                        respuesta_texto = f"✅ {nombre_jugador} inscrito en {torneo.name}."
-                    else:
-                        respuesta_texto = f"⚠️ {nombre_jugador} ya estaba inscrito."
-                else:
-                    respuesta_texto = "❌ No se pudo inscribir."
-
-            elif accion == 'generar_cuadros':
-                torneo = db.query(Tournament).filter(Tournament.club_id == club_usuario.id, Tournament.status == "inscription").first()
-                if torneo:
-                    ids = torneo.smart_data.get("inscritos", [])
-                    if len(ids) >= 2:
-                        jugadores = db.query(Player).filter(Player.id.in_(ids)).order_by(Player.elo.desc()).all()
-                        n = len(jugadores)
-                        for i in range(n // 2):
-                            p1 = jugadores[i]
-                            p2 = jugadores[n - 1 - i]
-                            match = Match(player_1_id=p1.id, player_2_id=p2.id, tournament_id=torneo.id, score="VS", is_finished=False)
-                            db.add(match)
-                        torneo.status = "playing"
-                        db.commit()
-                        await manager.broadcast("update", club_usuario.id)
-                        respuesta_texto = f"⚔️ ¡Cuadros generados! El torneo {torneo.name} ha comenzado."
-                    else:
-                        respuesta_texto = "⚠️ Necesitas al menos 2 jugadores."
-                else:
-                    respuesta_texto = "❌ No hay torneo en inscripción."
-
-            # 4. RESPONDER
-            enviar_whatsapp(telefono, respuesta_texto)
+            # Las TVs del club reciben los deltas por el bus de eventos
+            with tramo("accion"):
+                respuesta_texto, hubo_cambios, avisos = await cola.run_sync(
+                    _con_sesion, ejecutar_accion, club_id, telefono, decision)
 
-    except Exception as e:
-        print(f"❌ Error procesando: {e}")
-    return {"status": "ok"}
\ No newline at end of file
+            # 4. RESPONDER (y avisos masivos por la cola de envíos)
+            with tramo("envio"):
+                await enviar_whatsapp(telefono, respuesta_texto)
+            await cola_envios.notificar(avisos)
+            await cola.run_sync(_con_sesion, marcar_procesado, mensaje["id"])
+            MENSAJES.sumar("ok")
+        except Exception as e:
+            print(f"❌ Error procesando: {e}")
+            MENSAJES.sumar("error")
+            await cola.run_sync(_con_sesion, marcar_procesado, mensaje["id"], "error")
+
+cola = MessageQueue(procesar_mensaje)
@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, and_, update, insert
+from sqlalchemy.orm import Session
+from models import Player, Match, Tournament, RatingHistory
+from elo import calculate_elo
+from database import con_reintentos
+from brackets import avanzar
+from scheduler import reprogramar
+import events
+
+# --- MOTOR DE RESULTADOS ---
+# Registrar un partido = encontrar el Match pendiente, marcarlo terminado,
+# aplicar calculate_elo, actualizar wins/losses/elo, dejar la huella en
+# rating_history, mover a los jugadores a su próximo partido del cuadro
+# (brackets.avanzar) y reprogramar canchas/horas (scheduler.py). TODO en una
+# sola transacción.
+#
+# Concurrencia: el Match se "reclama" con un UPDATE condicional sobre
+# (id, version, is_finished=False). Si dos personas reportan a la vez, solo
+# una gana el UPDATE; la otra ve rowcount=0 y relee el partido: si dice lo
+# mismo (ganador y score) es "duplicado", si no, ErrorResultado (conflicto).
+#
+# Sin partido pendiente, el último jugado del torneo solo cuenta como
+# duplicado si el reporte coincide; si no (revancha, otro ganador u otro
+# score) se registra como amistoso.
+# Los jugadores se releen con FOR UPDATE (en PostgreSQL) después de reclamar,
+# en orden de id para no generar deadlocks.
+
+# Ventana para considerar duplicado un amistoso idéntico (sin torneo)
+VENTANA_DUPLICADOS = timedelta(minutes=10)
+
+
+class ErrorResultado(Exception):
+    """El resultado no se puede registrar (jugador inexistente, etc.)."""
+
+
+def buscar_jugador(db: Session, club_id, nombre):
+    if not nombre:
+        return None
+    return db.query(Player).filter(Player.club_id == club_id, func.lower(Player.name) == nombre.strip().lower()).first()
+
+# Los dos jugadores en una sola consulta (None si alguno no existe)
+def buscar_pareja(db: Session, club_id, nombre_a, nombre_b):
+    claves = [(n or "").strip().lower() for n in (nombre_a, nombre_b)]
+    por_nombre = {p.name.lower(): p for p in db.query(Player).filter(
+        Player.club_id == club_id, func.lower(Player.name).in_([c for c in claves if c]))}
+    return por_nombre.get(claves[0]), por_nombre.get(claves[1])
+
+# El partido de torneo entre los dos: primero el pendiente, si no, el último jugado
+def _partido_de_torneo(db: Session, club_id, a_id, b_id):
+    entre_ellos = or_(and_(Match.player_1_id == a_id, Match.player_2_id == b_id),
+                      and_(Match.player_1_id == b_id, Match.player_2_id == a_id))
+    return (db.query(Match).join(Tournament, Match.tournament_id == Tournament.id)
+            .filter(Tournament.club_id == club_id, Tournament.status == "playing", entre_ellos)
+            .order_by(Match.is_finished, Match.id.desc()).first())
+
+# Mismo ganador y, si el reporte trae score, mismo score
+def _mismo_resultado(winner_id, score_registrado, ganador_id, score):
+    return winner_id == ganador_id and (not score or (score_registrado or "") == score)
+
+def _amistoso_duplicado(db: Session, ganador_id, perdedor_id, score):
+    desde = datetime.utcnow() - VENTANA_DUPLICADOS
+    return db.query(Match.id).filter(
+        Match.tournament_id == None, Match.winner_id == ganador_id, Match.score == score,
+        or_(Match.player_1_id == ganador_id, Match.player_2_id == ganador_id),
+        or_(Match.player_1_id == perdedor_id, Match.player_2_id == perdedor_id),
+        Match.timestamp >= desde).first() is not None
+
+
+def _aplicar(db: Session, club_id, nombre_ganador, nombre_perdedor, score):
+    """
+    Hace el trabajo SIN commit. Devuelve un dict con el resultado; si
+    "estado" es "registrado", trae también el evento a publicar.
+    """
+    ganador, perdedor = buscar_pareja(db, club_id, nombre_ganador, nombre_perdedor)
+    if not ganador or not perdedor:
+        faltante = nombre_ganador if not ganador else nombre_perdedor
+        raise ErrorResultado(f"No encontré al jugador '{faltante}'.")
+    if ganador.id == perdedor.id:
+        raise ErrorResultado("Un jugador no puede jugar contra sí mismo.")
+    score = (score or "").strip()
+
+    # 1. Reclamar el partido pendiente (o crear un amistoso)
+    match = _partido_de_torneo(db, club_id, ganador.id, perdedor.id)
+    if match is not None and match.is_finished:
+        # Ya lo reportó alguien más: idempotente. Si no coincide, es otro partido (amistoso)
+        if _mismo_resultado(match.winner_id, match.score, ganador.id, score):
+            return {"estado": "duplicado", "match_id": match.id}
+        match = None
+    if match is not None:
+        reclamado = db.execute(
+            update(Match)
+            .where(Match.id == match.id, Match.version == match.version, Match.is_finished == False)
+            .values(is_finished=True, winner_id=ganador.id, score=score or match.score,
+                    timestamp=datetime.utcnow(), version=Match.version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if reclamado == 0:
+            # Otro lo reclamó primero: duplicado solo si dice lo mismo
+            winner_id, score_registrado = db.query(Match.winner_id, Match.score).filter(Match.id == match.id).one()
+            if _mismo_resultado(winner_id, score_registrado, ganador.id, score):
+                return {"estado": "duplicado", "match_id": match.id}
+            quien = ganador.name if winner_id == ganador.id else perdedor.name
+            raise ErrorResultado(f"Ese partido ya se registró con otro resultado (ganó {quien}, {score_registrado}). "
+                                 f"Si hay un error, avisa al administrador.")
+        match_id = match.id
+        # El ganador pasa a su próximo partido del cuadro (y el perdedor a la consolación)
+        avances = avanzar(db, match, ganador.id, perdedor.id)
+    else:
+        if _amistoso_duplicado(db, ganador.id, perdedor.id, score):
+            return {"estado": "duplicado", "match_id": None}
+        amistoso = Match(player_1_id=ganador.id, player_2_id=perdedor.id, winner_id=ganador.id,
+                         score=score, is_finished=True)
+        db.add(amistoso)
+        db.flush()
+        match_id = amistoso.id
+        avances = []
+
+    # 2. Releer jugadores bloqueados y aplicar Elo
+    bloqueados = {p.id: p for p in db.query(Player).filter(Player.id.in_([ganador.id, perdedor.id]))
+                  .order_by(Player.id).with_for_update().populate_existing()}
+    ganador, perdedor = bloqueados[ganador.id], bloqueados[perdedor.id]
+    elo_g, elo_p = ganador.elo if ganador.elo is not None else 1200, perdedor.elo if perdedor.elo is not None else 1200
+    nuevo_g, nuevo_p, puntos = calculate_elo(elo_g, elo_p)
+
+    ganador.elo, perdedor.elo = nuevo_g, nuevo_p
+    ganador.wins = (ganador.wins or 0) + 1
+    perdedor.losses = (perdedor.losses or 0) + 1
+    db.flush()
+    # Las dos huellas en un solo executemany (sin RETURNING: no necesitamos sus ids)
+    db.execute(insert(RatingHistory), [
+        dict(player_id=ganador.id, match_id=match_id, elo_before=elo_g, elo_after=nuevo_g, delta=puntos),
+        dict(player_id=perdedor.id, match_id=match_id, elo_before=elo_p, elo_after=nuevo_p, delta=-puntos),
+    ])
+
+    evento = {"match_id": match_id, "ganador_id": ganador.id, "perdedor_id": perdedor.id, "score": score,
+              "puntos": puntos, "elos": {ganador.id: nuevo_g, perdedor.id: nuevo_p},
+              "torneo_id": match.tournament_id if match is not None else None,
+              "avances": [(destino, posicion, jugador, ganador.name if jugador == ganador.id else perdedor.name)
+                          for destino, posicion, jugador in avances]}
+    return {"estado": "registrado", "match_id": match_id, "ganador": ganador.name, "perdedor": perdedor.name,
+            "puntos": puntos, "elo_ganador": nuevo_g, "elo_perdedor": nuevo_p, "evento": evento}
+
+
+# Un resultado de torneo libera la cancha y decide quién sigue: reprogramar lo pendiente
+def _reprogramar_si_torneo(db: Session, club_id, resultados):
+    if any(r.get("evento", {}).get("torneo_id") for r in resultados):
+        reprogramar(db, club_id)
+
+
+# 1. Un resultado (desde WhatsApp)
+def registrar_resultado(db: Session, club_id, nombre_ganador, nombre_perdedor, score=""):
+    def trabajo():
+        resultado = _aplicar(db, club_id, nombre_ganador, nombre_perdedor, score)
+        _reprogramar_si_torneo(db, club_id, [resultado])
+        return resultado
+
+    resultado = con_reintentos(db, trabajo)
+    if resultado["estado"] == "registrado":
+        events.publicar(club_id, events.PARTIDO_REGISTRADO, **resultado.pop("evento"))
+    return resultado
+
+# 2. Una ronda completa (endpoint masivo): un solo commit
+def registrar_ronda(db: Session, club_id, resultados):
+    """
+    resultados: lista de {"ganador", "perdedor", "score"}.
+    Cada resultado va en un SAVEPOINT: si uno falla (jugador inexistente),
+    los demás siguen; al final se hace UN commit y se publican los eventos.
+    """
+    def trabajo():
+        salida = []
+        for r in resultados:
+            savepoint = db.begin_nested()
+            try:
+                resultado = _aplicar(db, club_id, r.get("ganador"), r.get("perdedor"), r.get("score", ""))
+                savepoint.commit()
+            except ErrorResultado as e:
+                savepoint.rollback()
+                resultado = {"estado": "error", "detalle": str(e)}
+            salida.append(resultado)
+        _reprogramar_si_torneo(db, club_id, salida)
+        return salida
+
+    salida = con_reintentos(db, trabajo)
+    eventos = [r.pop("evento") for r in salida if "evento" in r]
+    for evento in eventos:
+        events.publicar(club_id, events.PARTIDO_REGISTRADO, **evento)
+    return salida
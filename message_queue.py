@@ -0,0 +1,164 @@
+import os
+import time
+import zlib
+import asyncio
+import contextvars
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import InboundMessage
+
+# --- COLA DE MENSAJES DEL WEBHOOK ---
+# Meta exige un 200 rápido: si tardamos, reintenta y duplica el mensaje.
+# El webhook solo valida, guarda y encola; los workers hacen el trabajo pesado.
+
+QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", "8"))          # Shards (1 worker cada uno)
+QUEUE_MAXSIZE = int(os.getenv("QUEUE_MAXSIZE", "200"))        # Capacidad por shard
+QUEUE_PUT_TIMEOUT = float(os.getenv("QUEUE_PUT_TIMEOUT", "0.05"))  # Segundos esperando hueco
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", "16"))   # Hilos para trabajo síncrono
+DEDUPE_MEMORIA = 5000                                         # IDs recientes en RAM
+
+
+class ColaLlena(Exception):
+    """El shard del teléfono está lleno: hay que pedirle a Meta que reintente."""
+
+
+class MessageQueue:
+    def __init__(self, manejador, workers=QUEUE_WORKERS, maxsize=QUEUE_MAXSIZE,
+                 put_timeout=QUEUE_PUT_TIMEOUT, executor_workers=EXECUTOR_WORKERS):
+        # manejador: corrutina async que recibe el dict del mensaje
+        self.manejador = manejador
+        self.num_workers = workers
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="alejandro")
+        self.shards: list[asyncio.Queue] = []
+        self.tareas: list[asyncio.Task] = []
+        self.vistos: OrderedDict[str, None] = OrderedDict()
+        self.contadores = {"encolados": 0, "procesados": 0, "errores": 0, "duplicados": 0, "rechazados": 0}
+
+    # Un teléfono siempre cae en el mismo shard -> sus mensajes se procesan en orden
+    def _shard(self, telefono):
+        return zlib.crc32(str(telefono).encode()) % self.num_workers
+
+    async def start(self):
+        if self.tareas:
+            return
+        self.shards = [asyncio.Queue(maxsize=self.maxsize) for _ in range(self.num_workers)]
+        self.tareas = [asyncio.create_task(self._worker(q)) for q in self.shards]
+
+    async def stop(self):
+        for t in self.tareas:
+            t.cancel()
+        await asyncio.gather(*self.tareas, return_exceptions=True)
+        self.tareas = []
+        self.executor.shutdown(wait=False)
+
+    # Ejecutar trabajo bloqueante (SQLAlchemy, requests...) fuera del event loop.
+    # Con el contexto del que llama: la traza del mensaje sigue en el hilo (observability.py)
+    async def run_sync(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(contextvars.copy_context().run, fn, *args))
+
+    # Deduplicación rápida en memoria (la definitiva es el UNIQUE de la BD)
+    def ya_visto(self, wa_id):
+        return wa_id in self.vistos
+
+    def marcar_visto(self, wa_id):
+        self.vistos[wa_id] = None
+        self.vistos.move_to_end(wa_id)
+        while len(self.vistos) > DEDUPE_MEMORIA:
+            self.vistos.popitem(last=False)
+
+    def olvidar(self, wa_id):
+        self.vistos.pop(wa_id, None)
+
+    async def encolar(self, mensaje):
+        # Backpressure: esperamos un instante por hueco; si no hay, ColaLlena
+        mensaje["encolado_en"] = time.monotonic()
+        cola = self.shards[self._shard(mensaje["telefono"])]
+        try:
+            await asyncio.wait_for(cola.put(mensaje), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.contadores["rechazados"] += 1
+            raise ColaLlena()
+        self.contadores["encolados"] += 1
+
+    async def _worker(self, cola: asyncio.Queue):
+        while True:
+            mensaje = await cola.get()
+            try:
+                await self.manejador(mensaje)
+                self.contadores["procesados"] += 1
+            except Exception as e:
+                self.contadores["errores"] += 1
+                print(f"❌ Error en worker: {e}")
+            finally:
+                cola.task_done()
+
+    def metricas(self):
+        ahora = time.monotonic()
+        profundidad = [q.qsize() for q in self.shards]
+        # Edad del mensaje más viejo esperando (la cabeza de cada shard)
+        edades = [ahora - q._queue[0]["encolado_en"] for q in self.shards if q.qsize()]
+        return {
+            "profundidad_total": sum(profundidad),
+            "profundidad_por_shard": profundidad,
+            "edad_max_segundos": round(max(edades), 3) if edades else 0.0,
+            "capacidad_por_shard": self.maxsize,
+            "workers": self.num_workers,
+            **self.contadores,
+        }
+
+
+# --- INGESTA: EXTRAER, PERSISTIR, DEDUPLICAR ---
+
+# 1. Sacar los mensajes de texto del payload de Meta (puede traer varios)
+def extraer_mensajes(data):
+    mensajes = []
+    for entry in data.get("entry", []) or []:
+        for change in entry.get("changes", []) or []:
+            value = change.get("value", {}) or {}
+            for m in value.get("messages", []) or []:
+                if m.get("type", "text") != "text" or "text" not in m:
+                    continue
+                mensajes.append({
+                    "id": m.get("id") or f"{m.get('from')}:{m.get('timestamp')}",
+                    "telefono": m["from"],
+                    "texto": m["text"]["body"],
+                })
+    return mensajes
+
+# 2. Guardar el mensaje. Devuelve False si ya lo teníamos (reintento de Meta)
+def registrar_entrada(db: Session, mensaje):
+    db.add(InboundMessage(
+        wa_message_id=mensaje["id"],
+        phone_number=mensaje["telefono"],
+        body=mensaje["texto"],
+        status="pending",
+    ))
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+# 3. Si no cupo en la cola lo borramos, para que el reintento de Meta entre
+def olvidar_entrada(db: Session, wa_id):
+    db.query(InboundMessage).filter(InboundMessage.wa_message_id == wa_id).delete()
+    db.commit()
+
+def marcar_procesado(db: Session, wa_id, status="done"):
+    db.query(InboundMessage).filter(InboundMessage.wa_message_id == wa_id).update(
+        {"status": status, "processed_at": datetime.utcnow()}
+    )
+    db.commit()
+
+# 4. Al arrancar: lo que quedó pendiente (caída del servidor) se vuelve a encolar
+def mensajes_pendientes(db: Session):
+    filas = db.query(InboundMessage).filter(InboundMessage.status == "pending").order_by(InboundMessage.id).all()
+    return [{"id": f.wa_message_id, "telefono": f.phone_number, "texto": f.body} for f in filas]
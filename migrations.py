@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+from sqlalchemy import inspect, text
+from models import Base
+
+# --- MIGRACIONES LIGERAS ---
+# create_all crea las tablas nuevas, pero NO agrega columnas/índices a tablas
+# que ya existen (p.ej. la BD de Render). Cada migración es una función
+# idempotente que recibe una conexión; las aplicadas quedan registradas en
+# schema_migrations. Funcionan igual en SQLite y PostgreSQL.
+
+def _columnas(con, tabla):
+    return {c["name"] for c in inspect(con).get_columns(tabla)}
+
+def agregar_columna(con, tabla, columna, definicion):
+    if columna not in _columnas(con, tabla):
+        con.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}"))
+
+
+def crear_indice(con, nombre, tabla, columnas):
+    # IF NOT EXISTS funciona en SQLite y PostgreSQL; en BDs nuevas create_all ya lo creó
+    con.execute(text(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas})"))
+
+
+# --- LISTA DE MIGRACIONES (en orden, nunca se reescriben) ---
+def _0001_match_version(con):
+    # Versión para el bloqueo optimista al registrar resultados
+    agregar_columna(con, "matches", "version", "INTEGER NOT NULL DEFAULT 0")
+
+def _0002_inscripciones(con):
+    # smart_data["inscritos"] -> tabla enrollments (create_all ya la creó).
+    # El blob se deja como está: es la ruta de lectura de compatibilidad.
+    jugadores = {fila[0] for fila in con.execute(text("SELECT id FROM players"))}
+    filas = []
+    for torneo_id, datos, creado in con.execute(text("SELECT id, smart_data, created_at FROM tournaments")):
+        if isinstance(datos, str):
+            datos = json.loads(datos or "{}")
+        vistos = set()
+        for player_id in (datos or {}).get("inscritos", []):
+            if player_id in jugadores and player_id not in vistos:
+                vistos.add(player_id)
+                filas.append({"t": torneo_id, "p": player_id, "f": creado or datetime.utcnow()})
+    if filas:
+        con.execute(text("INSERT INTO enrollments (tournament_id, player_id, created_at) VALUES (:t, :p, :f) "
+                         "ON CONFLICT (tournament_id, player_id) DO NOTHING"), filas)
+    print(f"   {len(filas)} inscripciones copiadas")
+
+def _0003_indices_compuestos(con):
+    # Los mismos que declara models.py (ver __table_args__)
+    crear_indice(con, "ix_players_club_elo", "players", "club_id, elo")
+    crear_indice(con, "ix_players_club_nombre", "players", "club_id, name")
+    crear_indice(con, "ix_players_club_nombre_lower", "players", "club_id, lower(name)")
+    crear_indice(con, "ix_players_owner", "players", "owner_id")
+    crear_indice(con, "ix_tournaments_club_status", "tournaments", "club_id, status")
+    crear_indice(con, "ix_matches_torneo_terminado", "matches", "tournament_id, is_finished")
+    crear_indice(con, "ix_matches_jugadores", "matches", "player_1_id, player_2_id")
+    crear_indice(con, "ix_matches_ganador_fecha", "matches", "winner_id, timestamp")
+
+def _0004_cuadros(con):
+    # Ronda, posición y enlaces de avance de cada partido (ver brackets.py).
+    # Los partidos viejos quedan con NULL: la vista los muestra como "Ronda 1".
+    for columna in ("round", "slot", "next_position", "loser_position"):
+        agregar_columna(con, "matches", columna, "INTEGER")
+    agregar_columna(con, "matches", "bracket", "VARCHAR")
+    agregar_columna(con, "matches", "next_match_id", "INTEGER REFERENCES matches(id)")
+    agregar_columna(con, "matches", "loser_match_id", "INTEGER REFERENCES matches(id)")
+
+def _0005_programacion(con):
+    # Cancha/hora de cada partido y la sede de cada club (ver scheduler.py)
+    agregar_columna(con, "matches", "court", "INTEGER")
+    agregar_columna(con, "matches", "scheduled_at", "TIMESTAMP")
+    for columna in ("courts", "match_minutes", "rest_minutes"):
+        agregar_columna(con, "clubs", columna, "INTEGER")
+    for columna in ("opens_at", "closes_at"):
+        agregar_columna(con, "clubs", columna, "VARCHAR")
+
+MIGRACIONES = [
+    ("0001_match_version", _0001_match_version),
+    ("0002_inscripciones", _0002_inscripciones),
+    ("0003_indices_compuestos", _0003_indices_compuestos),
+    ("0004_cuadros", _0004_cuadros),
+    ("0005_programacion", _0005_programacion),
+]
+
+
+def aplicar_migraciones(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as con:
+        con.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (nombre VARCHAR PRIMARY KEY, aplicada_en TIMESTAMP)"))
+        hechas = {fila[0] for fila in con.execute(text("SELECT nombre FROM schema_migrations"))}
+        for nombre, migracion in MIGRACIONES:
+            if nombre in hechas:
+                continue
+            print(f"🛠️ Migración {nombre}...")
+            migracion(con)
+            con.execute(text("INSERT INTO schema_migrations (nombre, aplicada_en) VALUES (:n, :f)"),
+                        {"n": nombre, "f": datetime.utcnow()})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, JSON, UniqueConstraint, Index, func
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -12,6 +12,14 @@ class Club(Base):
     name = Column(String, unique=True, index=True)
     admin_phone = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Sede para programar partidos (ver scheduler.py). NULL = valores por
+    # defecto del entorno. Horas locales del club, "HH:MM".
+    courts = Column(Integer, nullable=True)
+    opens_at = Column(String, nullable=True)
+    closes_at = Column(String, nullable=True)
+    match_minutes = Column(Integer, nullable=True)
+    rest_minutes = Column(Integer, nullable=True)
     
     players = relationship("Player", back_populates="club")
     tournaments = relationship("Tournament", back_populates="club")
@@ -29,6 +37,14 @@ class WhatsAppUser(Base):
 # --- NIVEL 3: LOS JUGADORES ---
 class Player(Base):
     __tablename__ = "players"
+    # Ranking por club (ORDER BY elo), búsqueda por nombre dentro del club y
+    # "jugadores de este celular" (owner_id). Las BDs viejas los reciben por
+    # la migración 0003.
+    __table_args__ = (
+        Index("ix_players_club_elo", "club_id", "elo"),
+        Index("ix_players_club_nombre", "club_id", "name"),
+        Index("ix_players_owner", "owner_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -48,9 +64,14 @@ class Player(Base):
     owner_id = Column(Integer, ForeignKey("whatsapp_users.id"))
     owner = relationship("WhatsAppUser", back_populates="players")
 
+# buscar_jugador y buscar_pareja comparan lower(name): índice por expresión (SQLite y PostgreSQL)
+Index("ix_players_club_nombre_lower", Player.club_id, func.lower(Player.name))
+
 # --- NIVEL 4: EL TORNEO ---
 class Tournament(Base):
     __tablename__ = "tournaments"
+    # "El torneo activo del club": en cada mensaje y en cada vista
+    __table_args__ = (Index("ix_tournaments_club_status", "club_id", "status"),)
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
@@ -67,10 +88,18 @@ class Tournament(Base):
     club = relationship("Club", back_populates="tournaments")
     
     matches = relationship("Match", back_populates="tournament")
+    enrollments = relationship("Enrollment", back_populates="tournament")
 
 # --- NIVEL 5: LOS PARTIDOS ---
 class Match(Base):
     __tablename__ = "matches"
+    # Cuadros del torneo (y sus pendientes), partido entre dos jugadores y
+    # amistosos duplicados recientes
+    __table_args__ = (
+        Index("ix_matches_torneo_terminado", "tournament_id", "is_finished"),
+        Index("ix_matches_jugadores", "player_1_id", "player_2_id"),
+        Index("ix_matches_ganador_fecha", "winner_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -82,5 +111,73 @@ class Match(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     is_finished = Column(Boolean, default=True)
     
+    # Bloqueo optimista: cada cambio de resultado sube la versión
+    version = Column(Integer, nullable=False, default=0)
+    
     tournament_id = Column(Integer, ForeignKey("tournaments.id"), nullable=True)
-    tournament = relationship("Tournament", back_populates="matches")
\ No newline at end of file
+    tournament = relationship("Tournament", back_populates="matches")
+
+    # Posición en el cuadro (ver brackets.py): "principal", "consolacion" o
+    # "grupo A"...; ronda desde 1 y orden dentro de la ronda. Al terminar, el
+    # ganador pasa a next_match (como jugador 1 o 2) y el perdedor, si hay
+    # cuadro de consolación, a loser_match.
+    bracket = Column(String, nullable=True)
+    round = Column(Integer, nullable=True)
+    slot = Column(Integer, nullable=True)
+    next_match_id = Column(Integer, ForeignKey("matches.id"), nullable=True)
+    next_position = Column(Integer, nullable=True)
+    loser_match_id = Column(Integer, ForeignKey("matches.id"), nullable=True)
+    loser_position = Column(Integer, nullable=True)
+
+    # Programación (scheduler.py): cancha y hora de inicio en UTC, como timestamp
+    court = Column(Integer, nullable=True)
+    scheduled_at = Column(DateTime, nullable=True)
+
+# --- NIVEL 6: MENSAJES ENTRANTES (WEBHOOK) ---
+# Guardamos cada mensaje de Meta antes de procesarlo: sirve para
+# deduplicar reintentos (wa_message_id es único) y para no perder nada
+# si el servidor se cae con mensajes en la cola.
+class InboundMessage(Base):
+    __tablename__ = "inbound_messages"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    wa_message_id = Column(String, unique=True, index=True)
+    phone_number = Column(String, index=True)
+    body = Column(String)
+    status = Column(String, default="pending")  # pending | done | error
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+
+# --- NIVEL 7: HISTORIAL DE PUNTOS (INMUTABLE) ---
+# Una fila por jugador y partido: cuánto tenía, cuánto quedó. Nunca se
+# actualiza ni se borra; sirve para auditar y para recalcular el ranking.
+class RatingHistory(Base):
+    __tablename__ = "rating_history"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    player_id = Column(Integer, ForeignKey("players.id"), index=True)
+    match_id = Column(Integer, ForeignKey("matches.id"), index=True)
+    elo_before = Column(Integer)
+    elo_after = Column(Integer)
+    delta = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --- NIVEL 8: INSCRIPCIONES A TORNEOS ---
+# Antes vivían en smart_data["inscritos"] (una lista JSON que se reescribía
+# entera en cada inscripción y perdía inscritos con dos altas a la vez).
+# Ahora es una fila por (torneo, jugador): la restricción única hace que
+# inscribir sea un INSERT idempotente y contar sea un COUNT indexado.
+class Enrollment(Base):
+    __tablename__ = "enrollments"
+    __table_args__ = (UniqueConstraint("tournament_id", "player_id", name="uq_enrollment_torneo_jugador"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tournament_id = Column(Integer, ForeignKey("tournaments.id"), nullable=False)
+    player_id = Column(Integer, ForeignKey("players.id"), nullable=False, index=True)
+    seed = Column(Integer, nullable=True)   # cabeza de serie (None = por Elo)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    tournament = relationship("Tournament", back_populates="enrollments")
+
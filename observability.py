@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import bisect
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+# --- OBSERVABILIDAD: ETAPAS, SQL, IA, LAG DEL LOOP Y /metrics ---
+# Hasta ahora solo había prints ("📩 De ...", "🤖 IA: ..."): no se sabía si
+# una respuesta lenta venía de la BD, del LLM o de Graph API.
+#
+#   - tramo("etapa"): mide una etapa del mensaje (club, contexto, decisión,
+#     llm, acción, envío, difusión...) en un histograma por etapa y, si el
+#     mensaje está en una traza, la anota con su inicio y duración.
+#   - traza(mensaje_id): una fracción OBS_TRAZAS_MUESTRA de los mensajes
+#     imprime al final UNA línea JSON con todas sus etapas y cuántas
+#     sentencias SQL hizo y cuánto tardaron. La traza viaja en un
+#     ContextVar (MessageQueue.run_sync la pasa a los hilos del executor).
+#   - instrumentar_engine: tiempo de cada sentencia por motor y tipo.
+#   - registrar_uso_openai: tokens y costo estimado (OPENAI_PRECIO_*_1K).
+#   - VigilanteLoop: cada OBS_LAG_INTERVALO mide cuánto se atrasa un sleep.
+#   - PerfiladorMuestreo: perfil estadístico bajo demanda (/debug/perfil):
+#     muestrea las pilas de todos los hilos y devuelve "pilas colapsadas"
+#     (flamegraph.pl, speedscope). Solo con OBS_PERFIL=1.
+# Todo sale en /metrics (formato de texto de Prometheus) desde `registro`.
+#
+# Con OBS_METRICAS=0 los tramos no miden nada (salvo mensajes en traza), no
+# se escuchan los eventos del engine y no arranca el vigilante del loop.
+
+OBS_METRICAS = os.getenv("OBS_METRICAS", "1") != "0"
+OBS_TRAZAS_MUESTRA = float(os.getenv("OBS_TRAZAS_MUESTRA", "0"))     # 0.01 = 1 de cada 100 mensajes
+OBS_LAG_INTERVALO = float(os.getenv("OBS_LAG_INTERVALO", "0.5"))
+OBS_PERFIL = os.getenv("OBS_PERFIL", "0") == "1"
+OBS_PERFIL_INTERVALO_MS = float(os.getenv("OBS_PERFIL_INTERVALO_MS", "10"))
+OBS_PERFIL_MAX_SEGUNDOS = float(os.getenv("OBS_PERFIL_MAX_SEGUNDOS", "60"))
+# Precio por 1K tokens (USD) del modelo que usa ai_service
+OPENAI_PRECIO_ENTRADA_1K = float(os.getenv("OPENAI_PRECIO_ENTRADA_1K", "0.001"))
+OPENAI_PRECIO_SALIDA_1K = float(os.getenv("OPENAI_PRECIO_SALIDA_1K", "0.002"))
+
+SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SEGUNDOS_SQL = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SEGUNDOS_LAG = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+# --- MÉTRICAS (SIN prometheus_client) ---
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.valores: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def sumar(self, *etiquetas, valor=1):
+        with self.lock:
+            self.valores[etiquetas] = self.valores.get(etiquetas, 0) + valor
+
+    def exportar(self):
+        with self.lock:
+            filas = sorted(self.valores.items())
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        for etiquetas, valor in filas:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=SEGUNDOS):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.limites = tuple(limites)
+        self.series: dict[tuple, list] = {}   # etiquetas -> [cuentas por cubeta (+Inf al final), suma]
+        self.lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        i = bisect.bisect_left(self.limites, valor)
+        with self.lock:
+            serie = self.series.get(etiquetas)
+            if serie is None:
+                serie = self.series[etiquetas] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        with self.lock:
+            filas = sorted((k, (list(c), s)) for k, (c, s) in self.series.items())
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        for etiquetas, (cuentas, suma) in filas:
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + (float("inf"),), cuentas):
+                acumulado += cuenta
+                le = "+Inf" if limite == float("inf") else _numero(float(limite))
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas + ('le',), etiquetas + (le,))} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(suma)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}"
+
+
+class Funcion:
+    """Métrica que se lee al exportar: número, o {tupla de etiquetas: número}."""
+
+    def __init__(self, nombre, ayuda, leer, etiquetas=(), tipo="gauge"):
+        self.nombre, self.ayuda, self.leer, self.etiquetas, self.tipo = nombre, ayuda, leer, tuple(etiquetas), tipo
+
+    def exportar(self):
+        try:
+            valores = self.leer()
+        except Exception as e:
+            print(f"❌ Métrica {self.nombre}: {e}")
+            return
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} {self.tipo}"
+        for etiquetas, valor in sorted(valores.items()):
+            if valor is not None:
+                yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+
+
+class Registro:
+    def __init__(self):
+        self.metricas: dict[str, object] = {}
+
+    def _agregar(self, metrica):
+        # Registrar dos veces el mismo nombre devuelve la que ya estaba (recargas, benchmarks)
+        return self.metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=SEGUNDOS):
+        return self._agregar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def funcion(self, nombre, ayuda, leer, etiquetas=(), tipo="gauge"):
+        self.metricas[nombre] = Funcion(nombre, ayuda, leer, etiquetas, tipo)
+        return self.metricas[nombre]
+
+    def exportar(self):
+        lineas = [linea for metrica in self.metricas.values() for linea in metrica.exportar()]
+        return "\n".join(lineas) + "\n"
+
+# Instancia global para usar en todo el proyecto
+registro = Registro()
+
+ETAPAS = registro.histograma("alejandro_etapa_segundos", "Duración de cada etapa del procesamiento", ("etapa",))
+SQL = registro.histograma("alejandro_sql_segundos", "Duración de cada sentencia SQL", ("motor", "tipo"), SEGUNDOS_SQL)
+LAG = registro.histograma("alejandro_loop_lag_segundos", "Atraso del event loop", limites=SEGUNDOS_LAG)
+MENSAJES = registro.contador("alejandro_mensajes_total", "Mensajes de WhatsApp procesados", ("resultado",))
+IA_LLAMADAS = registro.contador("alejandro_openai_llamadas_total", "Llamadas a OpenAI", ("resultado",))
+IA_TOKENS = registro.contador("alejandro_openai_tokens_total", "Tokens de OpenAI", ("tipo",))
+IA_COSTO = registro.contador("alejandro_openai_costo_usd_total", "Costo estimado de OpenAI en USD")
+WHATSAPP = registro.contador("alejandro_whatsapp_envios_total", "Envíos a Graph API", ("estado",))
+
+
+# --- TRAZAS Y TRAMOS ---
+_traza: contextvars.ContextVar[dict | None] = contextvars.ContextVar("traza", default=None)
+
+@contextmanager
+def traza(mensaje_id, **atributos):
+    """Abre la traza de un mensaje (solo si sale sorteado) e imprime su línea JSON al cerrar."""
+    if not OBS_TRAZAS_MUESTRA or random.random() >= OBS_TRAZAS_MUESTRA:
+        yield None
+        return
+    actual = {"traza": mensaje_id, **atributos, "inicio": time.perf_counter(), "etapas": [],
+              "sql": {"sentencias": 0, "ms": 0.0}}
+    ficha = _traza.set(actual)
+    try:
+        yield actual
+    finally:
+        _traza.reset(ficha)
+        actual["total_ms"] = round((time.perf_counter() - actual.pop("inicio")) * 1000, 2)
+        actual["sql"]["ms"] = round(actual["sql"]["ms"], 2)
+        print(f"🧭 {json.dumps(actual, ensure_ascii=False, default=str)}")
+
+def contexto_de_traza():
+    # Para seguir la traza en otra tarea del loop: copia del contexto solo si hay traza
+    return contextvars.copy_context() if _traza.get() is not None else None
+
+def _anotar(actual, etapa, t0, duracion, error=None):
+    tramo_ = {"etapa": etapa, "desde_ms": round((t0 - actual["inicio"]) * 1000, 2),
+              "ms": round(duracion * 1000, 2)}
+    if error:
+        tramo_["error"] = error
+    actual["etapas"].append(tramo_)
+
+@contextmanager
+def tramo(etapa):
+    actual = _traza.get()
+    if not OBS_METRICAS and actual is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duracion = time.perf_counter() - t0
+        if OBS_METRICAS:
+            ETAPAS.observar(duracion, etapa)
+        if actual is not None:
+            _anotar(actual, etapa, t0, duracion, error)
+
+def observar_etapa(etapa, segundos):
+    # Etapas que no se pueden envolver en un with (p.ej. la espera en la cola)
+    if OBS_METRICAS:
+        ETAPAS.observar(segundos, etapa)
+    actual = _traza.get()
+    if actual is not None:
+        _anotar(actual, etapa, time.perf_counter() - segundos, segundos)
+
+
+# --- SQL POR EVENTOS DEL ENGINE ---
+_TIPOS_SQL = {"select", "insert", "update", "delete", "with"}
+
+def instrumentar_engine(engine, nombre):
+    if not OBS_METRICAS:
+        return
+    from sqlalchemy import event
+
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("obs_inicio", []).append(time.perf_counter())
+
+    def despues(conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - conn.info["obs_inicio"].pop()
+        tipo = statement.lstrip()[:6].lower().rstrip()
+        SQL.observar(duracion, nombre, tipo if tipo in _TIPOS_SQL else "otro")
+        actual = _traza.get()
+        if actual is not None:
+            actual["sql"]["sentencias"] += 1
+            actual["sql"]["ms"] += duracion * 1000
+
+    def fallo(contexto_error):
+        # Si la sentencia falla no hay after_cursor_execute: sacar su inicio de la pila
+        conn = contexto_error.connection
+        if conn is not None and conn.info.get("obs_inicio"):
+            conn.info["obs_inicio"].pop()
+
+    event.listen(engine, "before_cursor_execute", antes)
+    event.listen(engine, "after_cursor_execute", despues)
+    event.listen(engine, "handle_error", fallo)
+
+
+# --- OPENAI ---
+def registrar_uso_openai(usage, error=False):
+    IA_LLAMADAS.sumar("error" if error else "ok")
+    if usage is None:
+        return
+    entrada = getattr(usage, "prompt_tokens", 0) or 0
+    salida = getattr(usage, "completion_tokens", 0) or 0
+    IA_TOKENS.sumar("entrada", valor=entrada)
+    IA_TOKENS.sumar("salida", valor=salida)
+    IA_COSTO.sumar(valor=entrada / 1000 * OPENAI_PRECIO_ENTRADA_1K + salida / 1000 * OPENAI_PRECIO_SALIDA_1K)
+    actual = _traza.get()
+    if actual is not None:
+        actual["tokens"] = {"entrada": entrada, "salida": salida}
+
+
+# --- LAG DEL EVENT LOOP ---
+class VigilanteLoop:
+    def __init__(self, intervalo=OBS_LAG_INTERVALO):
+        self.intervalo = intervalo
+        self.tarea = None
+        self.ultimo = 0.0
+        self.maximo = 0.0
+
+    async def start(self):
+        if OBS_METRICAS and self.intervalo > 0 and self.tarea is None:
+            self.tarea = asyncio.create_task(self._vigilar())
+
+    async def stop(self):
+        if self.tarea:
+            self.tarea.cancel()
+            await asyncio.gather(self.tarea, return_exceptions=True)
+            self.tarea = None
+
+    async def _vigilar(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            self.ultimo = max(0.0, time.perf_counter() - t0 - self.intervalo)
+            self.maximo = max(self.maximo, self.ultimo)
+            LAG.observar(self.ultimo)
+
+vigilante_loop = VigilanteLoop()
+registro.funcion("alejandro_loop_lag_ultimo_segundos", "Último atraso medido del event loop",
+                 lambda: vigilante_loop.ultimo)
+
+
+# --- PERFIL POR MUESTREO ---
+class PerfiladorMuestreo:
+    def __init__(self, intervalo_ms=OBS_PERFIL_INTERVALO_MS):
+        self.intervalo = intervalo_ms / 1000
+        self.lock = threading.Lock()   # un perfil a la vez
+
+    def capturar(self, segundos):
+        """
+        Bloquea `segundos` (llamar desde un hilo). Devuelve las pilas colapsadas
+        "hilo;archivo:funcion;... cuenta", una por línea, de más a menos vista.
+        """
+        segundos = min(max(segundos, 0.1), OBS_PERFIL_MAX_SEGUNDOS)
+        propio = threading.get_ident()
+        nombres = {t.ident: t.name for t in threading.enumerate()}
+        pilas = Counter()
+        with self.lock:
+            fin = time.perf_counter() + segundos
+            while time.perf_counter() < fin:
+                for ident, frame in sys._current_frames().items():
+                    if ident == propio:
+                        continue
+                    marcos = []
+                    while frame is not None:
+                        codigo = frame.f_code
+                        marcos.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                        frame = frame.f_back
+                    pilas[";".join([nombres.get(ident, str(ident))] + marcos[::-1])] += 1
+                time.sleep(self.intervalo)
+        return "\n".join(f"{pila} {cuenta}" for pila, cuenta in pilas.most_common()) + "\n"
+
+perfilador = PerfiladorMuestreo()
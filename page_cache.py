@@ -0,0 +1,97 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- CACHÉ DE PÁGINAS RENDERIZADAS (TVs) ---
+# El HTML de /club/{id} solo cambia cuando cambia la seq del club (cada
+# escritura la sube, ver live_updates.py). Así que se renderiza una vez por
+# (club, formato, modo) y seq, se guarda ya comprimido (gzip y, si está
+# instalado, brotli) y se sirve con un ETag fuerte por codificación (cada
+# cuerpo es otra representación: sufijo -gz / -br): una TV que recarga sin
+# cambios recibe un 304 sin cuerpo. Siempre con Vary: Accept-Encoding.
+#
+# La entrada también guarda la vista con la que se renderizó: si la vista se
+# recalcula (VISTA_TTL) aunque la seq sea la misma, se vuelve a renderizar.
+# Expulsión LRU por número de entradas.
+
+PAGINAS_MAX = int(os.getenv("PAGINAS_MAX", "512"))
+PAGINAS_NIVEL_GZIP = int(os.getenv("PAGINAS_NIVEL_GZIP", "6"))
+PAGINAS_NIVEL_BROTLI = int(os.getenv("PAGINAS_NIVEL_BROTLI", "9"))
+SUFIJOS_ETAG = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+try:
+    import brotli   # opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+
+class Pagina:
+    def __init__(self, cuerpo: bytes, tipo, estado):
+        self.estado = estado
+        self.tipo = tipo
+        self.cuerpos = {"identity": cuerpo, "gzip": gzip.compress(cuerpo, PAGINAS_NIVEL_GZIP, mtime=0)}
+        if brotli is not None:
+            self.cuerpos["br"] = brotli.compress(cuerpo, quality=PAGINAS_NIVEL_BROTLI)
+        base = hashlib.sha1(cuerpo).hexdigest()[:20]
+        self.etags = {nombre: f'"{base}{SUFIJOS_ETAG[nombre]}"' for nombre in self.cuerpos}
+
+    def codificacion(self, accept_encoding):
+        # La más chica que el cliente acepte (sin pesos q=: las TVs no los mandan)
+        aceptadas = {parte.split(";")[0].strip() for parte in (accept_encoding or "").lower().split(",")}
+        for nombre in ("br", "gzip"):
+            if nombre in aceptadas and nombre in self.cuerpos:
+                return nombre
+        return "identity"
+
+    def coincide(self, if_none_match, codificacion="identity"):
+        # Se compara con el ETag del cuerpo que se serviría
+        if not if_none_match:
+            return False
+        etiquetas = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+        return self.etags[codificacion] in etiquetas or "*" in etiquetas
+
+
+class CachePaginas:
+    def __init__(self, maximo=PAGINAS_MAX):
+        self.maximo = maximo
+        self.paginas: OrderedDict[tuple, Pagina] = OrderedDict()
+        self.lock = threading.Lock()
+        self.contadores = {"aciertos": 0, "renders": 0, "expulsiones": 0, "no_modificado": 0}
+
+    # 1. Buscar sin renderizar (rápido, se puede llamar desde el event loop)
+    def buscar(self, clave, estado):
+        with self.lock:
+            pagina = self.paginas.get(clave)
+            if pagina is None or pagina.estado is not estado:
+                return None
+            self.paginas.move_to_end(clave)
+            self.contadores["aciertos"] += 1
+            return pagina
+
+    # 2. Renderizar y guardar (en un hilo: Jinja + brotli no deben frenar el loop)
+    def guardar(self, clave, estado, render, tipo="text/html; charset=utf-8"):
+        pagina = Pagina(render().encode(), tipo, estado)
+        with self.lock:
+            self.contadores["renders"] += 1
+            self.paginas[clave] = pagina
+            self.paginas.move_to_end(clave)
+            while len(self.paginas) > self.maximo:
+                self.paginas.popitem(last=False)
+                self.contadores["expulsiones"] += 1
+        return pagina
+
+    def no_modificado(self):
+        with self.lock:
+            self.contadores["no_modificado"] += 1
+
+    def descartar(self):
+        with self.lock:
+            self.paginas.clear()
+
+    def metricas(self):
+        return {"paginas": len(self.paginas), "brotli": brotli is not None, **self.contadores}
+
+# Instancia global para usar en todo el proyecto
+paginas = CachePaginas()
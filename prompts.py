@@ -33,7 +33,7 @@ def obtener_system_prompt(contexto_actual, rol_usuario):
 
     5. GESTIÓN DE TORNEOS:
        - "Crea un torneo": Extrae nombre y categoría.
-       - "Genera los cuadros": Acción generar_cuadros.
+       - "Genera los cuadros": Acción generar_cuadros (eliminación directa con consolación, salvo que pidan grupos o "sin consolación").
 
     ### FORMATO DE RESPUESTA (JSON PURO)
     Tu salida debe ser SIEMPRE un JSON estructurado.
@@ -51,6 +51,7 @@ def obtener_system_prompt(contexto_actual, rol_usuario):
     - "crear_jugador": {{ "nombre": "...", "categoria": "..." }}
     - "crear_torneo": {{ "nombre": "...", "categoria": "..." }} (SOLO ADMIN)
     - "inscribir_en_torneo": {{ "nombre_jugador": "..." }}
-    - "generar_cuadros": {{ }} (SOLO ADMIN)
+    - "generar_cuadros": {{ "formato": "eliminacion" o "grupos", "consolacion": true/false }} (SOLO ADMIN)
+    - "configurar_sede": {{ "canchas": 4, "apertura": "07:00", "cierre": "22:00", "duracion": 45, "descanso": 30 }} (SOLO ADMIN, solo los campos que mencionen)
     - "registrar_partido": {{ "ganador": "...", "perdedor": "...", "score": "..." }}
     """
\ No newline at end of file
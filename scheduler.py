@@ -0,0 +1,272 @@
+import os
+import heapq
+from datetime import datetime, timedelta, time as hora
+from zoneinfo import ZoneInfo
+from sqlalchemy import update
+from sqlalchemy.orm import Session, aliased
+from models import Club, Match, Player, Tournament
+from brackets import PRINCIPAL, CONSOLACION
+
+# --- PROGRAMACIÓN DE PARTIDOS (CANCHA Y HORA) ---
+# Todos los partidos pendientes de los torneos en juego de un club se
+# reparten en sus canchas con un greedy de intervalos (list scheduling):
+#   - un partido está "listo" cuando ya se programaron los partidos de los
+#     que salen sus jugadores (next_match/loser_match de brackets.py)
+#   - su hora más temprana = fin de esos partidos + descanso, y para los
+#     jugadores ya conocidos, fin de su último partido + descanso (un
+#     jugador puede estar en varios torneos del club a la vez)
+#   - de los listos (montículo), el de hora más temprana (y ronda más baja)
+#     toma la cancha que se libera primero, dentro del horario del club
+# O(P log P + P·C) con P partidos y C canchas: cientos de partidos en milisegundos.
+#
+# Reprogramar es incremental: los partidos en juego y los terminados quedan
+# fijos (con su hora real de fin), solo se recalcula lo que falta y solo se
+# escriben las filas que cambian (un UPDATE executemany). Lo ya anunciado
+# conserva su hora y su cancha mientras se pueda: se atrasa si hace falta y
+# solo se adelanta si gana PROGRAMACION_ADELANTAR_MINUTOS. Se llama en la
+# misma transacción que genera los cuadros o registra un resultado de
+# torneo: si un partido termina tarde, se corre solo lo que depende de él.
+#
+# Las horas se guardan en UTC (como los timestamps) y el horario del club es
+# local (CLUB_ZONA_HORARIA).
+
+CLUB_ZONA_HORARIA = ZoneInfo(os.getenv("CLUB_ZONA_HORARIA", "America/Bogota"))
+CANCHAS_POR_CLUB = int(os.getenv("CANCHAS_POR_CLUB", "4"))
+HORA_APERTURA = os.getenv("HORA_APERTURA", "07:00")
+HORA_CIERRE = os.getenv("HORA_CIERRE", "22:00")
+PARTIDO_MINUTOS = int(os.getenv("PARTIDO_MINUTOS", "45"))
+DESCANSO_MINUTOS = int(os.getenv("DESCANSO_MINUTOS", "30"))
+PROGRAMACION_BLOQUE_MINUTOS = int(os.getenv("PROGRAMACION_BLOQUE_MINUTOS", "5"))
+PROGRAMACION_ADELANTAR_MINUTOS = int(os.getenv("PROGRAMACION_ADELANTAR_MINUTOS", "30"))
+
+
+def _hora(texto):
+    horas, minutos = texto.strip().split(":")
+    return hora(int(horas), int(minutos))
+
+def a_local(momento):
+    # UTC naive (como lo guarda la BD) -> hora local naive del club
+    return momento.replace(tzinfo=ZoneInfo("UTC")).astimezone(CLUB_ZONA_HORARIA).replace(tzinfo=None)
+
+def a_utc(momento):
+    return momento.replace(tzinfo=CLUB_ZONA_HORARIA).astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+
+# Datos de la acción configurar_sede -> columnas del club (ValueError si algo no cuadra)
+def columnas_sede(datos):
+    columnas = {}
+    for clave, columna in (("canchas", "courts"), ("duracion", "match_minutes"), ("descanso", "rest_minutes")):
+        if datos.get(clave) not in (None, ""):
+            valor = int(datos[clave])
+            if valor < (0 if clave == "descanso" else 1):
+                raise ValueError(f"{clave} inválido: {valor}")
+            columnas[columna] = valor
+    for clave, columna in (("apertura", "opens_at"), ("cierre", "closes_at")):
+        if datos.get(clave):
+            columnas[columna] = _hora(str(datos[clave])).strftime("%H:%M")
+    return columnas
+
+
+class Sede:
+    """Canchas, horario, duración y descanso de un club (columnas del club o valores por defecto)."""
+
+    def __init__(self, canchas=None, apertura=None, cierre=None, duracion=None, descanso=None,
+                 bloque=PROGRAMACION_BLOQUE_MINUTOS, adelantar=PROGRAMACION_ADELANTAR_MINUTOS):
+        self.canchas = max(1, canchas or CANCHAS_POR_CLUB)
+        self.apertura = _hora(apertura or HORA_APERTURA)
+        self.cierre = _hora(cierre or HORA_CIERRE)
+        self.duracion = timedelta(minutes=duracion or PARTIDO_MINUTOS)
+        self.descanso = timedelta(minutes=DESCANSO_MINUTOS if descanso is None else descanso)
+        self.bloque = max(1, bloque)
+        self.adelantar = timedelta(minutes=adelantar)
+
+    @classmethod
+    def del_club(cls, club):
+        # club: un Club o una fila con las mismas columnas
+        return cls(club.courts, club.opens_at, club.closes_at, club.match_minutes, club.rest_minutes)
+
+    def texto(self):
+        return (f"{self.canchas} canchas, de {self.apertura:%H:%M} a {self.cierre:%H:%M}, partidos de "
+                f"{int(self.duracion.total_seconds() // 60)} min y {int(self.descanso.total_seconds() // 60)} de descanso")
+
+    def en_horario(self, momento):
+        # Redondear al bloque y mover a la próxima apertura si el partido no cabe hoy
+        sobra = (momento.minute % self.bloque) * 60 + momento.second + momento.microsecond / 1e6
+        if sobra:
+            momento += timedelta(seconds=self.bloque * 60 - sobra)
+        abre = datetime.combine(momento.date(), self.apertura)
+        if momento < abre:
+            return abre
+        if momento + self.duracion > datetime.combine(momento.date(), self.cierre):
+            return abre + timedelta(days=1)
+        return momento
+
+
+# --- EL ALGORITMO (PURO, EN HORA LOCAL) ---
+def planificar(partidos, sede: Sede, ahora):
+    """
+    partidos: dicts {"id", "p1", "p2", "siguiente", "perdedor", "terminado",
+    "fin" (terminados), "inicio", "cancha", "orden"}, horas locales.
+    Devuelve {match_id: (inicio, cancha)} para los que todavía no empezaron.
+    """
+    canchas = {c: ahora for c in range(1, sede.canchas + 1)}
+    fin, disponible = {}, {}
+
+    def ocupar(jugador, hasta):
+        if jugador is not None and hasta > disponible.get(jugador, ahora):
+            disponible[jugador] = hasta
+
+    # 1. Lo fijo: terminados (hora real) y en juego (ocupan su cancha; si se
+    # pasaron de la hora, se asume que terminan ya). Un partido cuya hora ya
+    # pasó NO está en juego si le falta un jugador, si alguno de sus jugadores
+    # o su cancha terminó otro partido después de esa hora (p.ej. el anterior
+    # se alargó) o si su cancha sigue ocupada por uno anterior sin terminar.
+    ultimo_fin = {}
+    for p in partidos:
+        if p["terminado"]:
+            for clave in (p["p1"], p["p2"], ("cancha", p["cancha"])):
+                ultimo_fin[clave] = max(ultimo_fin.get(clave, p["fin"] or ahora), p["fin"] or ahora)
+    en_juego, ocupadas = set(), set()
+    for p in sorted((p for p in partidos if not p["terminado"] and p["inicio"] is not None and p["inicio"] <= ahora),
+                    key=lambda p: (p["inicio"], p["id"])):
+        if (p["cancha"] in canchas and p["cancha"] not in ocupadas and p["p1"] is not None and p["p2"] is not None
+                and all(ultimo_fin.get(clave, p["inicio"]) <= p["inicio"]
+                        for clave in (p["p1"], p["p2"], ("cancha", p["cancha"])))):
+            en_juego.add(p["id"])
+            ocupadas.add(p["cancha"])
+    pendientes = {}
+    for p in partidos:
+        if p["terminado"]:
+            fin[p["id"]] = p["fin"] or ahora
+        elif p["id"] in en_juego:
+            fin[p["id"]] = max(p["inicio"] + sede.duracion, ahora)
+            canchas[p["cancha"]] = max(canchas[p["cancha"]], fin[p["id"]])
+        else:
+            pendientes[p["id"]] = p
+            continue
+        ocupar(p["p1"], fin[p["id"]] + sede.descanso)
+        ocupar(p["p2"], fin[p["id"]] + sede.descanso)
+
+    # 2. Dependencias del cuadro: de qué partidos pendientes salen los jugadores
+    desde = {pid: ahora for pid in pendientes}
+    faltan = {pid: 0 for pid in pendientes}
+    for p in partidos:
+        for destino in (p["siguiente"], p["perdedor"]):
+            if destino in pendientes:
+                if p["id"] in pendientes:
+                    faltan[destino] += 1
+                else:
+                    desde[destino] = max(desde[destino], fin[p["id"]] + sede.descanso)
+
+    def mas_temprano(p):
+        return max([desde[p["id"]]] + [disponible.get(j, ahora) for j in (p["p1"], p["p2"]) if j is not None])
+
+    def objetivo(p):
+        # Orden de la fila: lo ya anunciado, a su hora (si todavía se puede) y
+        # antes que lo que se tuvo que mover a esa misma hora
+        temprano = mas_temprano(p)
+        if p["inicio"] is not None and p["inicio"] >= temprano:
+            return p["inicio"], 0
+        return temprano, 1
+
+    listos = [(*objetivo(p), p["orden"], pid) for pid, p in pendientes.items() if faltan[pid] == 0]
+    heapq.heapify(listos)
+
+    # 3. Greedy: el listo más temprano a la cancha que se libera primero
+    plan = {}
+    while listos:
+        temprano, movido, orden, pid = heapq.heappop(listos)
+        p = pendientes[pid]
+        actual = objetivo(p)
+        if actual > (temprano, movido):
+            # Un jugador quedó ocupado después (otro torneo): vuelve a la fila
+            heapq.heappush(listos, (*actual, orden, pid))
+            continue
+        cancha = min(canchas, key=lambda c: (canchas[c], c))   # pocas canchas: sin montículo
+        inicio = sede.en_horario(max(mas_temprano(p), canchas[cancha]))
+        # Se conserva la hora anunciada si adelantarlo no gana al menos sede.adelantar
+        if p["inicio"] is not None and inicio <= p["inicio"] < inicio + sede.adelantar:
+            inicio = sede.en_horario(p["inicio"])
+        # Y su cancha, aunque haya que esperarla un poco (si no, le quita el turno a otra)
+        if p["cancha"] in canchas:
+            en_la_suya = sede.en_horario(max(inicio, canchas[p["cancha"]]))
+            if en_la_suya < inicio + sede.adelantar:
+                cancha, inicio = p["cancha"], en_la_suya
+        termina = inicio + sede.duracion
+        canchas[cancha] = termina
+        plan[pid] = (inicio, cancha)
+        ocupar(p["p1"], termina + sede.descanso)
+        ocupar(p["p2"], termina + sede.descanso)
+        for destino in (p["siguiente"], p["perdedor"]):
+            if destino in pendientes:
+                desde[destino] = max(desde[destino], termina + sede.descanso)
+                faltan[destino] -= 1
+                if faltan[destino] == 0:
+                    heapq.heappush(listos, (*objetivo(pendientes[destino]), pendientes[destino]["orden"], destino))
+    return plan
+
+
+def _orden(torneo_id, cuadro, ronda, slot, match_id):
+    # Desempate entre listos a la misma hora: rondas bajas primero, el principal antes
+    prioridad = 0 if cuadro in (None, PRINCIPAL) else 1 if cuadro == CONSOLACION else 2
+    return (ronda or 1, prioridad, torneo_id, slot or 0, match_id)
+
+
+# --- CON LA BD ---
+def reprogramar(db: Session, club_id, ahora=None):
+    """
+    Recalcula cancha y hora de los partidos pendientes del club, sin commit.
+    Una consulta + un UPDATE con las filas que cambiaron. Devuelve cuántas.
+    """
+    ahora_utc = ahora or datetime.utcnow()
+    db.flush()   # sin autoflush: el estado del torneo o la sede recién cambiados tienen que verse
+    # Partidos de los torneos en juego + la sede del club en la misma consulta
+    filas = (db.query(Match.id, Match.tournament_id, Match.player_1_id, Match.player_2_id, Match.next_match_id,
+                      Match.loser_match_id, Match.is_finished, Match.timestamp, Match.scheduled_at, Match.court,
+                      Match.bracket, Match.round, Match.slot, Club.courts, Club.opens_at, Club.closes_at,
+                      Club.match_minutes, Club.rest_minutes)
+             .join(Tournament, Match.tournament_id == Tournament.id).join(Club, Tournament.club_id == Club.id)
+             .filter(Tournament.club_id == club_id, Tournament.status == "playing").all())
+    if not filas:
+        return 0
+    sede = Sede.del_club(filas[0])
+    partidos = [{"id": f.id, "p1": f.player_1_id, "p2": f.player_2_id, "siguiente": f.next_match_id,
+                 "perdedor": f.loser_match_id, "terminado": bool(f.is_finished),
+                 "fin": a_local(f.timestamp) if f.is_finished and f.timestamp else None,
+                 "inicio": a_local(f.scheduled_at) if f.scheduled_at else None, "cancha": f.court,
+                 "orden": _orden(f.tournament_id, f.bracket, f.round, f.slot, f.id)} for f in filas]
+    plan = planificar(partidos, sede, a_local(ahora_utc))
+
+    actuales = {f.id: (f.scheduled_at, f.court) for f in filas}
+    cambios = []
+    for match_id, (inicio, cancha) in plan.items():
+        inicio = a_utc(inicio)
+        if actuales[match_id] != (inicio, cancha):
+            cambios.append({"id": match_id, "scheduled_at": inicio, "court": cancha})
+    if cambios:
+        db.execute(update(Match), cambios)
+    return len(cambios)
+
+
+# --- LO QUE PINTA /programacion (partidos.html) ---
+def vista_programacion(db: Session, club_id, ahora=None):
+    ahora = ahora or datetime.utcnow()
+    j1, j2 = aliased(Player), aliased(Player)
+    filas = (db.query(Match, j1.name, j2.name)
+             .join(Tournament, Match.tournament_id == Tournament.id)
+             .outerjoin(j1, Match.player_1_id == j1.id).outerjoin(j2, Match.player_2_id == j2.id)
+             .filter(Tournament.club_id == club_id, Tournament.status == "playing", Match.scheduled_at != None)
+             .order_by(Match.scheduled_at, Match.court, Match.id))
+    partidos = []
+    for m, n1, n2 in filas:
+        if m.is_finished:
+            estado = "finalizado"
+        else:
+            estado = "pendiente" if m.scheduled_at <= ahora else "programado"   # pendiente = en juego
+        inicio = a_local(m.scheduled_at)
+        partidos.append({"id": m.id, "hora": inicio.strftime("%H:%M"), "dia": inicio.strftime("%d/%m"),
+                         "cancha": m.court, "estado": estado,
+                         "jugador_1_id": m.player_1_id, "jugador_2_id": m.player_2_id,
+                         "jugador_1_nombre": n1 or "Por definir", "jugador_2_nombre": n2 or "Por definir",
+                         "ganador_id": m.winner_id, "marcador": m.score if m.is_finished else None})
+    return partidos
@@ -1,14 +1,19 @@
 import os
-import requests
+import asyncio
 from dotenv import load_dotenv
+import http_transport
+from observability import WHATSAPP
 
 # Cargar variables de entorno
 load_dotenv()
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+# Se puede apuntar a fake_servers.py para pruebas/benchmarks sin internet
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com").rstrip("/")
+ENVIOS_CONCURRENTES = int(os.getenv("ENVIOS_CONCURRENTES", "10"))
 
-def enviar_whatsapp(telefono_destino, mensaje):
-    url = f"https://graph.facebook.com/v21.0/{PHONE_NUMBER_ID}/messages"
+async def enviar_whatsapp(telefono_destino, mensaje):
+    url = f"{GRAPH_API_URL}/v21.0/{PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {WHATSAPP_TOKEN}",
         "Content-Type": "application/json"
@@ -21,7 +26,64 @@ def enviar_whatsapp(telefono_destino, mensaje):
     }
     try:
         print(f"📤 Intentando enviar a {telefono_destino}...")
-        response = requests.post(url, headers=headers, json=data)
+        response = await http_transport.post("graph", url, headers=headers, json=data)
         print(f"👉 Facebook Status: {response.status_code}")
+        WHATSAPP.sumar(str(response.status_code))
+        return response.status_code < 400
     except Exception as e:
-        print(f"❌ Error crítico enviando WhatsApp: {e}")
\ No newline at end of file
+        WHATSAPP.sumar("error")
+        print(f"❌ Error crítico enviando WhatsApp: {e}")
+        return False
+
+
+# --- COLA DE ENVÍOS (NOTIFICACIONES MASIVAS) ---
+# Para avisar a todo un torneo: los mensajes se encolan y varios "carteros"
+# los despachan en paralelo. El límite real hacia Graph lo pone http_transport.
+class ColaEnvios:
+    def __init__(self, carteros=ENVIOS_CONCURRENTES):
+        self.carteros = carteros
+        self.cola: asyncio.Queue | None = None
+        self.tareas: list[asyncio.Task] = []
+        self.contadores = {"enviados": 0, "fallidos": 0}
+
+    async def start(self):
+        if self.tareas:
+            return
+        self.cola = asyncio.Queue()
+        self.tareas = [asyncio.create_task(self._cartero()) for _ in range(self.carteros)]
+
+    async def stop(self):
+        for t in self.tareas:
+            t.cancel()
+        await asyncio.gather(*self.tareas, return_exceptions=True)
+        self.tareas = []
+
+    async def encolar(self, telefono, mensaje):
+        if not self.tareas:
+            await self.start()
+        await self.cola.put((telefono, mensaje))
+
+    async def notificar(self, avisos):
+        # avisos: lista de (telefono, mensaje)
+        for telefono, mensaje in avisos:
+            await self.encolar(telefono, mensaje)
+
+    async def esperar(self):
+        if self.cola is not None:
+            await self.cola.join()
+
+    async def _cartero(self):
+        while True:
+            telefono, mensaje = await self.cola.get()
+            try:
+                ok = await enviar_whatsapp(telefono, mensaje)
+                self.contadores["enviados" if ok else "fallidos"] += 1
+            finally:
+                self.cola.task_done()
+
+    def metricas(self):
+        pendientes = self.cola.qsize() if self.cola is not None else 0
+        return {"pendientes": pendientes, "carteros": self.carteros, **self.contadores}
+
+# Instancia global para usar en todo el proyecto
+cola_envios = ColaEnvios()